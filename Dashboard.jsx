@@ -36,6 +36,97 @@ const Dashboard = () => {
     fetchStats();
   }, []);
 
+  // Status changes and counters are pushed by the server instead of polled
+  useEffect(() => {
+    let events = null;
+    let retryTimer = null;
+    let closed = false;
+    let reconnecting = false;
+
+    const retry = () => {
+      if (!closed) {
+        retryTimer = setTimeout(connect, 5000);
+      }
+    };
+
+    // EventSource cannot send headers, so the API key is traded for a short-lived stream token
+    const connect = async () => {
+      try {
+        const apiKey = localStorage.getItem('apiKey');
+        const response = await fetch('/api/monitoring/events/token', {
+          method: 'POST',
+          headers: {
+            'X-API-Key': apiKey,
+          },
+        });
+        if (!response.ok) {
+          throw new Error(`Stream token request failed: ${response.status}`);
+        }
+        const { token } = await response.json();
+        if (closed) {
+          return;
+        }
+        events = new EventSource(`/api/monitoring/events?token=${encodeURIComponent(token)}`);
+      } catch (error) {
+        console.error('Error opening status stream:', error);
+        retry();
+        return;
+      }
+
+      events.addEventListener('open', () => {
+        // Transitions may have happened while disconnected
+        if (reconnecting) {
+          reconnecting = false;
+          fetchWebsites();
+          fetchStats();
+        }
+      });
+
+      events.addEventListener('status', (event) => {
+        const change = JSON.parse(event.data);
+        setWebsites((current) => {
+          if (!current.some((website) => website.id === change.website_id)) {
+            fetchWebsites();
+            return current;
+          }
+          return current.map((website) => (
+            website.id === change.website_id
+              ? { ...website, current_status: change.status, last_checked: change.last_checked }
+              : website
+          ));
+        });
+      });
+
+      events.addEventListener('counts', (event) => {
+        const counts = JSON.parse(event.data);
+        setStats((current) => ({ ...current, ...counts }));
+      });
+
+      // Events were dropped while the tab was slow or disconnected
+      events.addEventListener('resync', () => {
+        fetchWebsites();
+        fetchStats();
+      });
+
+      // The browser's own reconnect would reuse an expired token; open a fresh stream instead
+      events.onerror = () => {
+        events.close();
+        reconnecting = true;
+        retry();
+      };
+    };
+
+    connect();
+
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (events) {
+        events.close();
+      }
+    };
+  }, []);
+
   const fetchWebsites = async () => {
     try {
       const apiKey = localStorage.getItem('apiKey');
@@ -94,7 +185,6 @@ const Dashboard = () => {
       if (response.ok) {
         toast.success('Website added successfully!');
         fetchWebsites();
-        fetchStats();
         setShowAddModal(false);
       } else {
         toast.error(data.error || 'Failed to add website');
@@ -119,8 +209,7 @@ const Dashboard = () => {
 
       if (response.ok) {
         toast.success('Website deleted successfully!');
-        fetchWebsites();
-        fetchStats();
+        setWebsites((current) => current.filter((website) => website.id !== websiteId));
       } else {
         toast.error('Failed to delete website');
       }
@@ -141,9 +230,14 @@ const Dashboard = () => {
       });
 
       if (response.ok) {
+        const result = await response.json();
         toast.success('Website checked successfully!');
-        fetchWebsites();
-        fetchStats();
+        // The check is written in the background, so apply the result locally
+        setWebsites((current) => current.map((website) => (
+          website.id === websiteId
+            ? { ...website, current_status: result.status, last_checked: new Date().toISOString() }
+            : website
+        )));
       } else {
         toast.error('Failed to check website');
       }
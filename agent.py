@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+UptimePro Probe Agent
+Probes its assigned websites from a remote location and pushes results to the API in batches
+
+Usage:
+    DATABASE_URL=... python agent.py register --name eu-west-1 --location EU-West
+    python agent.py run --api https://uptimepro.example.com --key <agent key>
+"""
+
+import argparse
+import gzip
+import heapq
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import requests
+
+# Add the project root to the path so the src package resolves like it does for main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.probe import ProbeEngine, ProbeRateLimiter, PROBE_CONCURRENCY
+from src.scheduler import next_check_time
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+AGENT_PUSH_INTERVAL = float(os.getenv('AGENT_PUSH_INTERVAL', 2.0))  # seconds between result pushes
+AGENT_PUSH_BATCH = int(os.getenv('AGENT_PUSH_BATCH', 5000))  # results per push
+AGENT_OUTBOX_SIZE = int(os.getenv('AGENT_OUTBOX_SIZE', 200000))  # undelivered results kept while the API is away
+AGENT_HTTP_TIMEOUT = 30
+AGENT_RETRY_MAX = 60  # seconds between push or pull attempts while the API is failing
+
+
+def encode_result(website_id, result):
+    """One NDJSON line in the shape /api/agents/results expects"""
+    status = result['status']
+    return json.dumps({
+        'website_id': website_id,
+        'checked_at': result['started_at'],
+        'status': status,
+        'response_time': result.get('response_time'),
+        'status_code': result.get('status_code'),
+        'error_message': result.get('status_message') if status != 'up' else None,
+        'dns_time': result.get('dns_time'),
+        'connect_time': result.get('connect_time'),
+        'tls_time': result.get('tls_time'),
+        'ttfb': result.get('ttfb'),
+        'bytes_received': result.get('bytes_received')
+    }, separators=(',', ':'))
+
+
+class Outbox:
+    """Bounded FIFO of encoded results waiting to be pushed; drops the oldest when full"""
+
+    def __init__(self, maxsize=AGENT_OUTBOX_SIZE):
+        self._lines = deque(maxlen=maxsize)
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._lines)
+
+    def put(self, line):
+        with self._lock:
+            if len(self._lines) == self._lines.maxlen:
+                self.dropped += 1
+            self._lines.append(line)
+
+    def take(self, limit):
+        with self._lock:
+            count = min(limit, len(self._lines))
+            return [self._lines.popleft() for _ in range(count)]
+
+    def give_back(self, lines):
+        """Return an undelivered batch to the front, still bounded"""
+        with self._lock:
+            room = self._lines.maxlen - len(self._lines)
+            if room < len(lines):
+                self.dropped += len(lines) - room
+                lines = lines[len(lines) - room:] if room else []
+            self._lines.extendleft(reversed(lines))
+
+
+class Agent:
+    """Pulls its share of websites from the API, probes them on schedule and pushes results.
+
+    Assignments are refreshed every `refresh_interval` seconds (the API
+    says how often); checks use the same phase-offset slots as the central
+    worker. Results are pushed from their own thread as gzipped NDJSON in
+    batches of up to `push_batch`, every `push_interval` seconds or sooner
+    when a full batch is waiting. While the API is unreachable results
+    queue in a bounded outbox and are sent once it is back.
+    """
+
+    def __init__(self, api_url, api_key, concurrency=PROBE_CONCURRENCY, push_interval=AGENT_PUSH_INTERVAL,
+                 push_batch=AGENT_PUSH_BATCH, outbox_size=AGENT_OUTBOX_SIZE):
+        self.api_url = api_url.rstrip('/')
+        self.http = requests.Session()
+        self.http.headers.update({'X-Agent-Key': api_key, 'Accept-Encoding': 'gzip'})
+        self.probe_engine = ProbeEngine(concurrency=concurrency, limiter=ProbeRateLimiter())
+        self.push_interval = push_interval
+        self.push_batch = push_batch
+        self.outbox = Outbox(outbox_size)
+        self.location = None
+        self.refresh_interval = 60.0
+        self.websites = {}  # website_id -> (url, check_interval)
+        self._queue = []  # heap of (deadline, website_id)
+        self._deadlines = {}  # website_id -> its live heap entry's deadline
+        self._next_refresh = 0.0
+        self._stopping = threading.Event()
+        self._wakeup = threading.Event()  # set when a full batch is waiting, or on stop
+        self._backoff = push_interval
+        self._pusher = None
+        self.pushed = 0
+        self.rejected = 0
+        self.probed = 0
+
+    def refresh(self):
+        """Replace the assignment list, scheduling websites that are new to this agent"""
+        response = self.http.get(f'{self.api_url}/api/agents/assignments', timeout=AGENT_HTTP_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+
+        self.location = data['location']
+        self.refresh_interval = float(data.get('refresh_interval', self.refresh_interval))
+        websites = {website_id: (url, interval) for website_id, url, interval in data['websites']}
+        now = datetime.utcnow()
+        for website_id, (url, interval) in websites.items():
+            if website_id not in self._deadlines:
+                self.schedule(website_id, next_check_time(website_id, interval, now))
+        self.websites = websites
+        logger.info(f"Agent in {self.location} has {len(websites)} websites "
+                    f"(share {data['share'] + 1} of {data['agents']})")
+
+    def schedule(self, website_id, deadline):
+        self._deadlines[website_id] = deadline
+        heapq.heappush(self._queue, (deadline, website_id))
+
+    def pop_due(self, now):
+        due = []
+        while self._queue and self._queue[0][0] <= now:
+            deadline, website_id = heapq.heappop(self._queue)
+            if self._deadlines.get(website_id) != deadline:
+                continue  # superseded entry
+            del self._deadlines[website_id]
+            if website_id in self.websites:  # dropped from the assignment since it was queued
+                due.append(website_id)
+        return due
+
+    def seconds_until_next(self, now):
+        if not self._queue:
+            return self.refresh_interval
+        return max(0.0, (self._queue[0][0] - now).total_seconds())
+
+    def run_cycle(self):
+        now = datetime.utcnow()
+        due = self.pop_due(now)
+        if not due:
+            return
+
+        def on_result(website_id, result):
+            self.outbox.put(encode_result(website_id, result))
+            self.probed += 1
+            if len(self.outbox) >= self.push_batch:
+                self._wakeup.set()
+
+        self.probe_engine.run([(website_id, self.websites[website_id][0]) for website_id in due], on_result)
+        finished = datetime.utcnow()
+        for website_id in due:
+            if website_id in self.websites and website_id not in self._deadlines:
+                self.schedule(website_id, next_check_time(website_id, self.websites[website_id][1], finished))
+
+    def push(self):
+        """Send one batch from the outbox; returns the number of results sent"""
+        lines = self.outbox.take(self.push_batch)
+        if not lines:
+            return 0
+        body = gzip.compress(('\n'.join(lines) + '\n').encode(), compresslevel=5)
+        try:
+            response = self.http.post(f'{self.api_url}/api/agents/results', data=body, timeout=AGENT_HTTP_TIMEOUT,
+                                      headers={'Content-Type': 'application/x-ndjson', 'Content-Encoding': 'gzip'})
+            response.raise_for_status()
+        except Exception:
+            self.outbox.give_back(lines)
+            raise
+        self.rejected += response.json().get('rejected', 0)
+        self.pushed += len(lines)
+        return len(lines)
+
+    def _drain(self):
+        """Push until less than a full batch is left; returns the seconds to wait before the next round"""
+        try:
+            while self.push() >= self.push_batch:
+                pass
+            self._backoff = self.push_interval
+        except Exception as e:
+            logger.error(f"Failed to push results: {str(e)}")
+            self._backoff = min(AGENT_RETRY_MAX, max(self.push_interval, self._backoff * 2))
+        return self._backoff
+
+    def _push_loop(self):
+        wait = self.push_interval
+        while not self._stopping.is_set():
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+            wait = self._drain()
+        self._drain()
+
+    def run(self, duration=None):
+        """Probe until interrupted, or for `duration` seconds; pushes what is left before returning"""
+        self._pusher = threading.Thread(target=self._push_loop, name='agent-push', daemon=True)
+        self._pusher.start()
+        stop_at = time.monotonic() + duration if duration else None
+        retry = 1.0
+
+        while stop_at is None or time.monotonic() < stop_at:
+            try:
+                if time.monotonic() >= self._next_refresh:
+                    self.refresh()
+                    self._next_refresh = time.monotonic() + self.refresh_interval
+                    retry = 1.0
+                self.run_cycle()
+
+                wait = min(self.seconds_until_next(datetime.utcnow()),
+                           max(0.0, self._next_refresh - time.monotonic()))
+                if stop_at is not None:
+                    wait = min(wait, max(0.0, stop_at - time.monotonic()))
+                time.sleep(wait)
+
+            except KeyboardInterrupt:
+                logger.info("Agent stopped by user")
+                break
+
+            except Exception as e:
+                logger.error(f"Agent cycle failed: {str(e)}")
+                time.sleep(retry)
+                retry = min(AGENT_RETRY_MAX, retry * 2)
+                self._next_refresh = time.monotonic()  # pull again once the API answers
+
+        self._stopping.set()
+        self._wakeup.set()
+        self._pusher.join(timeout=AGENT_HTTP_TIMEOUT)
+        self.probe_engine.shutdown()
+
+    def stats(self):
+        return {
+            'location': self.location,
+            'websites': len(self.websites),
+            'probed': self.probed,
+            'pushed': self.pushed,
+            'rejected': self.rejected,
+            'outbox': len(self.outbox),
+            'dropped': self.outbox.dropped
+        }
+
+
+def register_agent(session, name, location):
+    """Create a ProbeAgent row and return its key"""
+    from src.models.website import ProbeAgent
+
+    agent = ProbeAgent(name=name, location=location)
+    session.add(agent)
+    session.commit()
+    return agent.api_key
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='UptimePro probe agent')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    register = commands.add_parser('register', help='create an agent in DATABASE_URL and print its key')
+    register.add_argument('--name', required=True)
+    register.add_argument('--location', required=True, help='stored on every check the agent reports')
+
+    run = commands.add_parser('run', help='probe assigned websites and push the results')
+    run.add_argument('--api', default=os.getenv('AGENT_API_URL'), help='API base URL')
+    run.add_argument('--key', default=os.getenv('AGENT_KEY'), help='agent key from `register`')
+    run.add_argument('--concurrency', type=int, default=int(os.getenv('AGENT_CONCURRENCY', PROBE_CONCURRENCY)))
+
+    args = parser.parse_args()
+
+    if args.command == 'register':
+        from sqlalchemy.orm import Session
+        from src import database
+        from src.models.user import db
+
+        engine = database.create_engine()
+        db.metadata.create_all(engine)
+        with Session(engine) as session:
+            print(register_agent(session, args.name, args.location))
+    else:
+        if not args.api or not args.key:
+            parser.error('--api and --key (or AGENT_API_URL and AGENT_KEY) are required')
+        Agent(args.api, args.key, concurrency=args.concurrency).run()
@@ -0,0 +1,232 @@
+from flask import Blueprint, Response, request, jsonify, g
+from src.models.user import db
+from src.models.website import Website, ProbeAgent
+from src.metrics import require_scrape_access
+from src.check_writer import check_writer
+from datetime import datetime, timedelta
+from functools import wraps
+import gzip
+import json
+import math
+import os
+import threading
+import time
+import zlib
+
+agents_bp = Blueprint('agents', __name__)
+
+AGENT_REFRESH_INTERVAL = float(os.getenv('AGENT_REFRESH_INTERVAL', 60))  # seconds between assignment pulls
+AGENT_LIVE_WINDOW = float(os.getenv('AGENT_LIVE_WINDOW', 180))  # agents not seen for this long lose their share
+AGENT_MAX_BATCH_BYTES = int(os.getenv('AGENT_MAX_BATCH_BYTES', 16 * 1024 * 1024))  # decompressed NDJSON
+AGENT_MAX_BATCH_ROWS = int(os.getenv('AGENT_MAX_BATCH_ROWS', 50000))
+AGENT_MAX_CLOCK_SKEW = 300  # seconds a result may claim to be from the future
+AGENT_MAX_RESULT_AGE = 86400  # seconds; older results are rejected rather than rewriting settled rollups
+AGENT_KEY_CACHE_TTL = 60  # seconds
+
+CHECK_FIELDS = ('response_time', 'status_code', 'dns_time', 'connect_time', 'tls_time', 'ttfb', 'bytes_received')
+
+# X-Agent-Key -> (expires, agent id, location); agents are few and keys rarely change
+_agent_keys = {}
+_agent_keys_lock = threading.Lock()
+
+
+def authenticate_agent(api_key):
+    now = time.monotonic()
+    with _agent_keys_lock:
+        entry = _agent_keys.get(api_key)
+    if entry is not None and entry[0] > now:
+        return entry[1], entry[2]
+
+    row = db.session.query(ProbeAgent.id, ProbeAgent.location).filter(
+        ProbeAgent.api_key == api_key,
+        ProbeAgent.is_active == True
+    ).first()
+    if row is None:
+        return None
+    with _agent_keys_lock:
+        _agent_keys[api_key] = (now + AGENT_KEY_CACHE_TTL, row.id, row.location)
+    return row.id, row.location
+
+
+def require_agent_key(view):
+    """Reject requests without a valid X-Agent-Key; otherwise expose the agent as g.agent_id and g.agent_location"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        api_key = request.headers.get('X-Agent-Key')
+        if not api_key:
+            return jsonify({'error': 'Agent key required'}), 401
+
+        agent = authenticate_agent(api_key)
+        if agent is None:
+            return jsonify({'error': 'Invalid agent key'}), 401
+
+        g.agent_id, g.agent_location = agent
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def read_batch_lines():
+    """Request body as NDJSON lines, gunzipped if sent with Content-Encoding: gzip; None if too large"""
+    if request.content_length and request.content_length > AGENT_MAX_BATCH_BYTES:
+        return None
+    body = request.get_data(cache=False)
+    if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+        decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        body = decompressor.decompress(body, AGENT_MAX_BATCH_BYTES + 1)
+        if len(body) > AGENT_MAX_BATCH_BYTES or decompressor.unconsumed_tail:
+            return None
+    return body.splitlines()
+
+
+def decode_lines(lines):
+    """Decode NDJSON lines in one json.loads call, falling back to line by line (None for bad lines)"""
+    lines = [line for line in lines if line.strip()]
+    try:
+        return json.loads(b'[' + b','.join(lines) + b']')
+    except ValueError:
+        items = []
+        for line in lines:
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append(None)
+        return items
+
+
+def parse_result(item, location, now):
+    """One decoded result -> UptimeCheck mapping, or None if it is malformed or out of range"""
+    try:
+        website_id = int(item['website_id'])
+        checked_at = float(item['checked_at'])
+        status = item['status']
+    except (ValueError, KeyError, TypeError, OverflowError):
+        return None
+    if status not in ('up', 'down') or not math.isfinite(checked_at):
+        return None
+    if checked_at > now + AGENT_MAX_CLOCK_SKEW or checked_at < now - AGENT_MAX_RESULT_AGE:
+        return None
+
+    check = {
+        'website_id': website_id,
+        'timestamp': datetime.utcfromtimestamp(checked_at),
+        'status': status,
+        'error_message': str(item['error_message'])[:1000] if item.get('error_message') else None,
+        'location': location
+    }
+    for field in CHECK_FIELDS:
+        value = item.get(field)
+        if isinstance(value, float) and not math.isfinite(value):
+            return None
+        check[field] = int(value) if isinstance(value, (int, float)) else None
+    return check
+
+
+@agents_bp.route('/assignments', methods=['GET'])
+@require_agent_key
+def get_assignments():
+    """Websites this agent should probe: its share of active websites among live agents in its location"""
+    try:
+        now = datetime.utcnow()
+        db.session.query(ProbeAgent).filter_by(id=g.agent_id).update({'last_seen_at': now})
+        db.session.commit()
+
+        live_ids = [agent_id for (agent_id,) in db.session.query(ProbeAgent.id).filter(
+            ProbeAgent.location == g.agent_location,
+            ProbeAgent.is_active == True,
+            ProbeAgent.last_seen_at >= now - timedelta(seconds=AGENT_LIVE_WINDOW)
+        ).order_by(ProbeAgent.id)]
+        share = live_ids.index(g.agent_id)
+
+        websites = db.session.query(Website.id, Website.url, Website.check_interval).filter(
+            Website.is_active == True,
+            Website.id % len(live_ids) == share
+        ).all()
+
+        payload = json.dumps({
+            'agent_id': g.agent_id,
+            'location': g.agent_location,
+            'share': share,
+            'agents': len(live_ids),
+            'refresh_interval': AGENT_REFRESH_INTERVAL,
+            'websites': [[website_id, url, check_interval] for website_id, url, check_interval in websites]
+        }).encode()
+
+        response = Response(payload, mimetype='application/json')
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response.set_data(gzip.compress(payload, compresslevel=5))
+            response.headers['Content-Encoding'] = 'gzip'
+            response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@agents_bp.route('/results', methods=['POST'])
+@require_agent_key
+def ingest_results():
+    """Store a batch of NDJSON probe results (optionally gzipped) as checks from the agent's location.
+
+    Results for unknown or paused websites and malformed lines are counted
+    as rejected. The batch is committed together with whatever other
+    ingest requests buffered meanwhile (one transaction for all of them);
+    if that commit fails the rows stay buffered for the writer's next
+    attempt and the response is 202 rather than asking the agent to resend.
+    """
+    lines = read_batch_lines()
+    if lines is None:
+        return jsonify({'error': f'Batch larger than {AGENT_MAX_BATCH_BYTES} bytes'}), 413
+    if len(lines) > AGENT_MAX_BATCH_ROWS:
+        return jsonify({'error': f'Batch larger than {AGENT_MAX_BATCH_ROWS} results'}), 413
+
+    now = time.time()
+    location = g.agent_location
+    checks = []
+    rejected = 0
+    for item in decode_lines(lines):
+        check = parse_result(item, location, now)
+        if check is None:
+            rejected += 1
+        else:
+            checks.append(check)
+
+    try:
+        if checks:
+            website_ids = {check['website_id'] for check in checks}
+            known = {website_id for (website_id,) in db.session.query(Website.id).filter(
+                Website.id.in_(website_ids),
+                Website.is_active == True
+            )}
+            db.session.rollback()  # end the read transaction before the writer's own
+            if len(known) < len(website_ids):
+                accepted = [check for check in checks if check['website_id'] in known]
+                rejected += len(checks) - len(accepted)
+                checks = accepted
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+    check_writer.add_many(checks)
+    try:
+        check_writer.flush()
+    except Exception:
+        return jsonify({'accepted': len(checks), 'rejected': rejected, 'buffered': True}), 202
+
+    return jsonify({'accepted': len(checks), 'rejected': rejected})
+
+
+@agents_bp.route('/stats', methods=['GET'])
+@require_scrape_access
+def get_agent_stats():
+    """Registered agents per location, how many are live, and write throughput of this process"""
+    since = datetime.utcnow() - timedelta(seconds=AGENT_LIVE_WINDOW)
+    locations = {}
+    for location, last_seen_at in db.session.query(ProbeAgent.location, ProbeAgent.last_seen_at).filter(
+        ProbeAgent.is_active == True
+    ):
+        entry = locations.setdefault(location, {'agents': 0, 'live': 0})
+        entry['agents'] += 1
+        if last_seen_at is not None and last_seen_at >= since:
+            entry['live'] += 1
+    return jsonify({'locations': locations, 'writer': check_writer.stats()})
@@ -0,0 +1,376 @@
+"""
+UptimePro Alert Dispatcher
+Delivers down alerts off the probe loop over pooled SMTP and HTTP connections
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import queue
+import random
+import smtplib
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+ALERT_WORKERS = int(os.getenv('ALERT_WORKERS', 4))  # delivery threads, i.e. concurrent sends
+ALERT_QUEUE_SIZE = int(os.getenv('ALERT_QUEUE_SIZE', 10000))
+ALERT_MAX_ATTEMPTS = int(os.getenv('ALERT_MAX_ATTEMPTS', 5))
+ALERT_RETRY_BASE = float(os.getenv('ALERT_RETRY_BASE', 2.0))  # seconds; doubled after every failure
+ALERT_RETRY_MAX = float(os.getenv('ALERT_RETRY_MAX', 300.0))
+ALERT_HTTP_TIMEOUT = float(os.getenv('ALERT_HTTP_TIMEOUT', 10))
+SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', 2))
+SMTP_IDLE_CHECK = float(os.getenv('SMTP_IDLE_CHECK', 30))  # NOOP connections idle longer than this before reuse
+SMS_GATEWAY_URL = os.getenv('SMS_GATEWAY_URL')
+SMS_GATEWAY_TOKEN = os.getenv('SMS_GATEWAY_TOKEN')
+
+CHANNELS = ('email', 'sms', 'webhook')
+LATENCY_WINDOW = 1000  # deliveries kept for the latency percentiles
+
+
+class AlertJob:
+    """One notification to one endpoint, with its delivery bookkeeping"""
+
+    __slots__ = ('channel', 'endpoint', 'website', 'error_message', 'occurred_at', 'enqueued_at', 'attempts')
+
+    def __init__(self, channel, endpoint, website, error_message, occurred_at=None):
+        self.channel = channel
+        self.endpoint = endpoint
+        self.website = website  # plain dict snapshot: id, name, url, user_id
+        self.error_message = error_message
+        self.occurred_at = occurred_at or datetime.utcnow()
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+
+class SMTPPool:
+    """A small pool of logged-in SMTP connections reused across messages.
+
+    STARTTLS and login happen once per connection instead of once per
+    alert. A connection that sat idle for more than `idle_check` seconds is
+    probed with NOOP before reuse, and any connection that errors is
+    dropped so the next acquire opens a fresh one.
+    """
+
+    def __init__(self, server, port, username, password, size=SMTP_POOL_SIZE, idle_check=SMTP_IDLE_CHECK,
+                 timeout=ALERT_HTTP_TIMEOUT):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.idle_check = idle_check
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.connects = 0
+        self.reuses = 0
+
+    @property
+    def configured(self):
+        return bool(self.username and self.password)
+
+    def _connect(self):
+        server = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        server.starttls()
+        server.login(self.username, self.password)
+        self.connects += 1
+        return server
+
+    def _checkout(self):
+        while True:
+            try:
+                server, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - released_at < self.idle_check:
+                self.reuses += 1
+                return server
+            try:
+                if server.noop()[0] == 250:
+                    self.reuses += 1
+                    return server
+            except smtplib.SMTPException:
+                pass
+            except OSError:
+                pass
+            self._discard(server)
+
+    def _discard(self, server):
+        try:
+            server.close()
+        except Exception:
+            pass
+
+    def send(self, message):
+        with self._slots:
+            server = self._checkout()
+            try:
+                server.send_message(message)
+            except Exception:
+                self._discard(server)
+                raise
+            self._idle.put((server, time.monotonic()))
+
+    def close(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                server.quit()
+            except Exception:
+                self._discard(server)
+
+
+class AlertDispatcher:
+    """Queue of alert deliveries drained by a pool of delivery threads.
+
+    `enqueue` never blocks on I/O: jobs go onto a bounded queue and
+    `workers` threads deliver them concurrently, email through an
+    SMTPPool and webhooks/SMS through one keep-alive HTTP session. A failed
+    delivery is retried after ALERT_RETRY_BASE * 2**attempt seconds
+    (with jitter, capped at ALERT_RETRY_MAX) up to `max_attempts` times;
+    retries wait on a deadline heap so they do not hold a delivery thread.
+    Alerts for a channel with no credentials (SMTP login, SMS gateway) are
+    skipped with a warning at enqueue time rather than retried. `stats`
+    reports per-channel counts and enqueue-to-delivery latency.
+    """
+
+    def __init__(self, smtp_pool=None, workers=ALERT_WORKERS, max_attempts=ALERT_MAX_ATTEMPTS,
+                 retry_base=ALERT_RETRY_BASE, retry_max=ALERT_RETRY_MAX, queue_size=ALERT_QUEUE_SIZE,
+                 sms_gateway_url=SMS_GATEWAY_URL, sms_gateway_token=SMS_GATEWAY_TOKEN):
+        self.smtp_pool = smtp_pool
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.sms_gateway_url = sms_gateway_url
+        self.sms_gateway_token = sms_gateway_token
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._retries = []  # heap of (due monotonic time, seq, job)
+        self._retry_seq = itertools.count()
+        self._retry_cond = threading.Condition()
+        self._threads = []
+        self._stopping = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._counts = {channel: {'sent': 0, 'retried': 0, 'failed': 0, 'dropped': 0, 'skipped': 0}
+                        for channel in CHANNELS}
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.http.mount('http://', adapter)
+        self.http.mount('https://', adapter)
+        self.http.headers.update({'User-Agent': 'UptimePro-Alerts/1.0'})
+
+    def _count(self, channel, outcome):
+        with self._stats_lock:
+            self._counts.setdefault(channel, {'sent': 0, 'retried': 0, 'failed': 0, 'dropped': 0, 'skipped': 0})[outcome] += 1
+
+    def configured(self, channel):
+        """Whether `channel` has what it needs to send; webhooks need nothing"""
+        if channel == 'email':
+            return self.smtp_pool is not None and self.smtp_pool.configured
+        if channel == 'sms':
+            return bool(self.sms_gateway_url)
+        return True
+
+    def enqueue(self, channel, endpoint, website, error_message, occurred_at=None):
+        """Queue one alert; returns False if its channel is not configured or the queue is full"""
+        if not self.configured(channel):
+            self._count(channel, 'skipped')
+            logger.warning(f"{channel} alerts not configured, skipping alert for website {website['id']}")
+            return False
+        job = AlertJob(channel, endpoint, website, error_message, occurred_at)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._count(channel, 'dropped')
+            logger.error(f"Alert queue full, dropping {channel} alert for website {website['id']}")
+            return False
+        return True
+
+    def pending(self):
+        with self._retry_cond:
+            retrying = len(self._retries)
+        return self._queue.qsize() + retrying
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'alerts-{n}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._run_retries, name='alerts-retry', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout=10.0):
+        """Deliver what is already queued (up to `timeout` seconds), then stop"""
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self._stopping.set()
+        with self._retry_cond:
+            self._retry_cond.notify_all()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+        if self.smtp_pool is not None:
+            self.smtp_pool.close()
+        self.http.close()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                job = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self._attempt(job)
+            finally:
+                self._queue.task_done()
+
+    def _run_retries(self):
+        with self._retry_cond:
+            while not self._stopping.is_set():
+                if not self._retries:
+                    self._retry_cond.wait()
+                    continue
+                wait = self._retries[0][0] - time.monotonic()
+                if wait > 0:
+                    self._retry_cond.wait(wait)
+                    continue
+                _, _, job = heapq.heappop(self._retries)
+                try:
+                    self._queue.put_nowait(job)
+                except queue.Full:
+                    self._count(job.channel, 'dropped')
+                    logger.error(f"Alert queue full, dropping retry of {job.channel} alert")
+
+    def _attempt(self, job):
+        job.attempts += 1
+        try:
+            self.deliver(job)
+        except Exception as e:
+            if job.attempts >= self.max_attempts:
+                self._count(job.channel, 'failed')
+                logger.error(f"Giving up on {job.channel} alert to {job.endpoint} after "
+                             f"{job.attempts} attempts: {str(e)}")
+                return
+            delay = min(self.retry_max, self.retry_base * 2 ** (job.attempts - 1))
+            delay *= random.uniform(0.8, 1.2)
+            self._count(job.channel, 'retried')
+            logger.warning(f"{job.channel} alert to {job.endpoint} failed ({str(e)}), "
+                           f"retrying in {delay:.1f}s")
+            with self._retry_cond:
+                heapq.heappush(self._retries, (time.monotonic() + delay, next(self._retry_seq), job))
+                self._retry_cond.notify()
+            return
+
+        latency = time.monotonic() - job.enqueued_at
+        with self._stats_lock:
+            self._counts[job.channel]['sent'] += 1
+            self._latencies.append(latency)
+        logger.info(f"Alert sent via {job.channel} to {job.endpoint} for website {job.website['name']} "
+                    f"({latency * 1000:.0f}ms after enqueue)")
+
+    def deliver(self, job):
+        """Send one job on its channel; raises on failure so it can be retried"""
+        if job.channel == 'email':
+            self._send_email(job)
+        elif job.channel == 'webhook':
+            self._send_webhook(job)
+        elif job.channel == 'sms':
+            self._send_sms(job)
+        else:
+            raise ValueError(f"Unknown alert channel: {job.channel}")
+
+    def _send_email(self, job):
+        if self.smtp_pool is None or not self.smtp_pool.configured:
+            raise RuntimeError('Email credentials not configured')
+        website = job.website
+        msg = MIMEMultipart()
+        msg['From'] = self.smtp_pool.username
+        msg['To'] = job.endpoint
+        msg['Subject'] = f"🚨 Website Down Alert: {website['name']}"
+
+        body = f"""
+        <html>
+        <body>
+            <h2>Website Down Alert</h2>
+            <p>Your website <strong>{website['name']}</strong> is currently down.</p>
+
+            <table border="1" cellpadding="10" cellspacing="0">
+                <tr><td><strong>Website:</strong></td><td>{website['name']}</td></tr>
+                <tr><td><strong>URL:</strong></td><td><a href="{website['url']}">{website['url']}</a></td></tr>
+                <tr><td><strong>Error:</strong></td><td>{job.error_message}</td></tr>
+                <tr><td><strong>Time:</strong></td><td>{job.occurred_at.strftime('%Y-%m-%d %H:%M:%S')} UTC</td></tr>
+            </table>
+
+            <p>We'll continue monitoring and notify you when it's back online.</p>
+
+            <p>Best regards,<br>UptimePro Team</p>
+        </body>
+        </html>
+        """
+
+        msg.attach(MIMEText(body, 'html'))
+        self.smtp_pool.send(msg)
+
+    def _payload(self, job):
+        return {
+            'event': 'website.down',
+            'website_id': job.website['id'],
+            'name': job.website['name'],
+            'url': job.website['url'],
+            'error': job.error_message,
+            'timestamp': job.occurred_at.isoformat()
+        }
+
+    def _send_webhook(self, job):
+        response = self.http.post(job.endpoint, json=self._payload(job), timeout=ALERT_HTTP_TIMEOUT)
+        response.raise_for_status()
+
+    def _send_sms(self, job):
+        if not self.sms_gateway_url:
+            raise RuntimeError('SMS gateway not configured')
+        headers = {}
+        if self.sms_gateway_token:
+            headers['Authorization'] = f'Bearer {self.sms_gateway_token}'
+        message = f"UptimePro: {job.website['name']} is down ({job.error_message})"
+        response = self.http.post(self.sms_gateway_url, json={'to': job.endpoint, 'message': message},
+                                  headers=headers, timeout=ALERT_HTTP_TIMEOUT)
+        response.raise_for_status()
+
+    def stats(self):
+        with self._stats_lock:
+            counts = {channel: dict(values) for channel, values in self._counts.items()}
+            latencies = sorted(self._latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+        stats = {
+            'queued': self._queue.qsize(),
+            'pending': self.pending(),
+            'channels': counts,
+            'latency_ms': {'p50': percentile(0.5), 'p95': percentile(0.95), 'max': percentile(1.0)}
+        }
+        if self.smtp_pool is not None:
+            stats['smtp'] = {'connects': self.smtp_pool.connects, 'reuses': self.smtp_pool.reuses}
+        return stats
@@ -0,0 +1,220 @@
+"""
+UptimePro API Authentication
+X-API-Key lookup shared by every blueprint, backed by a bounded TTL/LRU cache
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from src.models.user import db, User
+from src.models.website import Subscription
+
+API_KEY_CACHE_SIZE = int(os.getenv('API_KEY_CACHE_SIZE', 10000))
+API_KEY_CACHE_TTL = float(os.getenv('API_KEY_CACHE_TTL', 60))  # seconds
+
+# Limits applied to users that have no Subscription row
+FREE_PLAN_LIMITS = {
+    'plan': 'free',
+    'max_websites': 5,
+    'min_check_interval': 1800,
+    'history_days': 7,
+    'email_alerts': True,
+    'sms_alerts': False,
+    'api_access': False,
+    'expires_at': None
+}
+
+
+class ApiUser:
+    """Detached snapshot of a user and their plan limits, safe to share between requests"""
+
+    __slots__ = ('user_id', 'username', 'api_key', 'has_subscription', 'subscription')
+
+    def __init__(self, user, subscription):
+        self.user_id = user.id
+        self.username = user.username
+        self.api_key = user.api_key
+        self.has_subscription = subscription is not None
+        if subscription is None:
+            self.subscription = dict(FREE_PLAN_LIMITS)
+        else:
+            self.subscription = {
+                'plan': subscription.plan,
+                'max_websites': subscription.max_websites,
+                'min_check_interval': subscription.min_check_interval,
+                'history_days': subscription.history_days,
+                'email_alerts': subscription.email_alerts,
+                'sms_alerts': subscription.sms_alerts,
+                'api_access': subscription.api_access,
+                'expires_at': subscription.expires_at
+            }
+
+    @property
+    def plan(self):
+        return self.subscription['plan']
+
+    def __repr__(self):
+        return f'<ApiUser {self.username} ({self.plan})>'
+
+
+class ApiKeyCache:
+    """LRU map of API key -> ApiUser whose entries expire after `ttl` seconds.
+
+    Entries are dropped once a change to the user or their subscription is
+    committed in this process (see the session events below). A lookup that
+    read the row before such a commit does not store its result, so the old
+    row cannot be cached again. Changes made by other processes are not
+    seen here; staleness across processes is bounded only by the TTL, so
+    keep it short.
+    """
+
+    def __init__(self, maxsize=API_KEY_CACHE_SIZE, ttl=API_KEY_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # api_key -> (expires, ApiUser)
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.generation = 0  # bumped by every invalidation
+
+    def get(self, api_key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(api_key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._remove(api_key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(api_key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, api_user, generation=None):
+        """Cache api_user, unless an invalidation happened since `generation` was read"""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if api_user.api_key in self._entries:
+                self._remove(api_user.api_key)
+            self._entries[api_user.api_key] = (time.monotonic() + self.ttl, api_user)
+            self._keys_by_user.setdefault(api_user.user_id, set()).add(api_user.api_key)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self.generation += 1
+            for api_key in self._keys_by_user.pop(user_id, ()):
+                if self._entries.pop(api_key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def _remove(self, api_key):
+        _, api_user = self._entries.pop(api_key)
+        keys = self._keys_by_user.get(api_user.user_id)
+        if keys is not None:
+            keys.discard(api_key)
+            if not keys:
+                del self._keys_by_user[api_user.user_id]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+api_key_cache = ApiKeyCache()
+
+
+def authenticate(api_key):
+    """Resolve an API key to an ApiUser, hitting the DB (one query) only on a cache miss"""
+    api_user = api_key_cache.get(api_key)
+    if api_user is not None:
+        return api_user
+    generation = api_key_cache.generation
+
+    row = db.session.query(User, Subscription).outerjoin(
+        Subscription, Subscription.user_id == User.id
+    ).filter(User.api_key == api_key).first()
+    if row is None:
+        return None
+
+    api_user = ApiUser(*row)
+    api_key_cache.put(api_user, generation)
+    return api_user
+
+
+def require_api_key(view):
+    """Reject requests without a valid X-API-Key; otherwise expose the caller as g.api_user"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        api_key = request.headers.get('X-API-Key')
+        if not api_key:
+            return jsonify({'error': 'API key required'}), 401
+
+        api_user = authenticate(api_key)
+        if api_user is None:
+            return jsonify({'error': 'Invalid API key'}), 401
+
+        g.api_user = api_user
+        return view(*args, **kwargs)
+    return wrapper
+
+
+# Plan upgrades, key rotation and deletions must not be served from a stale entry. Mapper
+# events fire at flush time, before commit, so they only note the user; the cache entry is
+# dropped once the session commits, when other requests can no longer read the old row.
+def _note_invalidation(target, user_id):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('api_key_invalidations', set()).add(user_id)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user(mapper, connection, target):
+    _note_invalidation(target, target.id)
+
+
+@event.listens_for(Subscription, 'after_insert')
+@event.listens_for(Subscription, 'after_update')
+@event.listens_for(Subscription, 'after_delete')
+def _invalidate_subscription(mapper, connection, target):
+    _note_invalidation(target, target.user_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_invalidations(session):
+    for user_id in session.info.pop('api_key_invalidations', ()):
+        api_key_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('api_key_invalidations', None)
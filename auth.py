@@ -1,6 +1,9 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 from src.models.user import db, User
 from src.models.website import Subscription
+from src.api_auth import require_api_key, api_key_cache
+from src.metrics import require_scrape_access
+from src.response_cache import cached_response
 from datetime import datetime, timedelta
 import re
 
@@ -87,41 +90,35 @@ def login():
     })
 
 @auth_bp.route('/profile', methods=['GET'])
+@require_api_key
+@cached_response('profile')
 def get_profile():
     """Get user profile"""
-    api_key = request.headers.get('X-API-Key')
-    if not api_key:
-        return jsonify({'error': 'API key required'}), 401
-    
-    user = User.query.filter_by(api_key=api_key).first()
+    api_user = g.api_user
+    user = db.session.get(User, api_user.user_id)
     if not user:
         return jsonify({'error': 'Invalid API key'}), 401
     
-    subscription = user.subscription
+    subscription = api_user.subscription
     return jsonify({
         'user': user.to_dict(),
         'subscription': {
-            'plan': subscription.plan if subscription else 'free',
-            'max_websites': subscription.max_websites if subscription else 5,
-            'min_check_interval': subscription.min_check_interval if subscription else 1800,
-            'history_days': subscription.history_days if subscription else 7,
-            'email_alerts': subscription.email_alerts if subscription else True,
-            'sms_alerts': subscription.sms_alerts if subscription else False,
-            'api_access': subscription.api_access if subscription else False,
-            'expires_at': subscription.expires_at.isoformat() if subscription and subscription.expires_at else None
+            'plan': subscription['plan'],
+            'max_websites': subscription['max_websites'],
+            'min_check_interval': subscription['min_check_interval'],
+            'history_days': subscription['history_days'],
+            'email_alerts': subscription['email_alerts'],
+            'sms_alerts': subscription['sms_alerts'],
+            'api_access': subscription['api_access'],
+            'expires_at': subscription['expires_at'].isoformat() if subscription['expires_at'] else None
         }
     })
 
 @auth_bp.route('/subscription/upgrade', methods=['POST'])
+@require_api_key
 def upgrade_subscription():
     """Upgrade user subscription"""
-    api_key = request.headers.get('X-API-Key')
-    if not api_key:
-        return jsonify({'error': 'API key required'}), 401
-    
-    user = User.query.filter_by(api_key=api_key).first()
-    if not user:
-        return jsonify({'error': 'Invalid API key'}), 401
+    api_user = g.api_user
     
     data = request.get_json()
     plan = data.get('plan')
@@ -159,10 +156,10 @@ def upgrade_subscription():
     
     config = plan_configs[plan]
     
-    # Update or create subscription
-    subscription = user.subscription
+    # Update or create subscription; the API key cache entry is dropped on flush
+    subscription = Subscription.query.filter_by(user_id=api_user.user_id).first()
     if not subscription:
-        subscription = Subscription(user_id=user.id)
+        subscription = Subscription(user_id=api_user.user_id)
         db.session.add(subscription)
     
     subscription.plan = plan
@@ -187,6 +184,12 @@ def upgrade_subscription():
         }
     })
 
+@auth_bp.route('/cache/stats', methods=['GET'])
+@require_scrape_access
+def get_auth_cache_stats():
+    """API key cache hit/miss statistics for this process"""
+    return jsonify(api_key_cache.stats())
+
 @auth_bp.route('/pricing', methods=['GET'])
 def get_pricing():
     """Get pricing information"""
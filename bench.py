@@ -0,0 +1,698 @@
+#!/usr/bin/env python3
+"""
+UptimePro Benchmarks
+Performance measurements against a scratch database
+
+Usage:
+    python bench.py stats --websites 1000 --checks 10000000
+    python bench.py recent --websites 10000
+    python bench.py api --websites 100 --requests 2000
+    python bench.py worker --websites 2000 --duration 120
+    python bench.py agents --agents 4 --synthetic --duration 30
+    python bench.py db --writers 2 --readers 4 --duration 20
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the project root to the path so the src package resolves like it does for main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from src import database
+from src.models.user import db, User
+from src.models.website import Website, UptimeCheck, Subscription
+from src.rollups import apply_checks
+from src.routes.monitoring import compute_dashboard_stats
+from src.recent_checks import CheckRing, RecentChecks
+from src.response_cache import response_cache
+
+SITES_PER_USER = 25
+
+# Read endpoints the dashboard polls, relative to the app root
+API_ENDPOINTS = {
+    'websites': '/api/monitoring/websites',
+    'dashboard_stats': '/api/monitoring/dashboard/stats',
+    'profile': '/api/auth/profile'
+}
+
+
+def scratch_url(database_url=None):
+    """The benchmark database URL; a throwaway SQLite file by default"""
+    if database_url is None:
+        path = os.path.join(tempfile.mkdtemp(prefix='uptimepro-bench-'), 'bench.db')
+        database_url = f'sqlite:///{path}'
+    return database_url
+
+
+def scratch_engine(database_url=None):
+    """Engine for the benchmark database"""
+    engine = database.create_engine(scratch_url(database_url))
+    db.metadata.create_all(engine)
+    return engine
+
+
+def seed_websites(session, count, plan='business', check_interval=60, url_for=None):
+    """Create `count` websites spread over users of SITES_PER_USER each; url_for(n) overrides the URL"""
+    website_ids = []
+    user_ids = []
+    for offset in range(0, count, SITES_PER_USER):
+        user = User(username=f'bench{offset}', email=f'bench{offset}@example.com')
+        session.add(user)
+        session.flush()
+        session.add(Subscription(user_id=user.id, plan=plan, max_websites=SITES_PER_USER))
+        user_ids.append(user.id)
+        for n in range(min(SITES_PER_USER, count - offset)):
+            website = Website(
+                user_id=user.id,
+                name=f'site{offset + n}',
+                url=url_for(offset + n) if url_for else f'http://127.0.0.1/{offset + n}',
+                check_interval=check_interval
+            )
+            session.add(website)
+            session.flush()
+            website_ids.append(website.id)
+    session.commit()
+    return user_ids, website_ids
+
+
+def generate_checks(website_ids, count, now, days, up_ratio=0.99):
+    span = days * 86400
+    for _ in range(count):
+        up = random.random() < up_ratio
+        yield {
+            'website_id': random.choice(website_ids),
+            'timestamp': now - timedelta(seconds=random.random() * span),
+            'status': 'up' if up else 'down',
+            'response_time': random.randint(20, 900) if up else 0,
+            'status_code': 200 if up else 503,
+            'error_message': None if up else 'HTTP 503',
+            'location': 'US-East'
+        }
+
+
+def insert_checks(session, rows):
+    """Insert raw checks and their rollups the way CheckWriter does, minus the buffering"""
+    session.execute(insert(UptimeCheck.__table__), rows)
+    apply_checks(session, rows)
+    session.commit()
+
+
+def legacy_dashboard_stats(session, user_id):
+    """The original per-website, full-row implementation, kept for comparison"""
+    websites = session.query(Website).filter_by(user_id=user_id).all()
+    since_24h = datetime.utcnow() - timedelta(hours=24)
+    total_checks = 0
+    up_checks = 0
+    for website in websites:
+        checks = session.query(UptimeCheck).filter(
+            UptimeCheck.website_id == website.id,
+            UptimeCheck.timestamp >= since_24h
+        ).all()
+        total_checks += len(checks)
+        up_checks += len([c for c in checks if c.status == 'up'])
+    return (up_checks / total_checks * 100) if total_checks > 0 else 100
+
+
+def history_window(session, website_id, days):
+    since = datetime.utcnow() - timedelta(days=days)
+    return session.query(UptimeCheck.timestamp, UptimeCheck.status).filter(
+        UptimeCheck.website_id == website_id,
+        UptimeCheck.timestamp >= since
+    ).order_by(UptimeCheck.timestamp.desc()).limit(100).all()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def checkpoints(total):
+    """10k, 100k, 1M, ... up to and including the total"""
+    points = []
+    point = 10000
+    while point < total:
+        points.append(point)
+        point *= 10
+    points.append(total)
+    return points
+
+
+def bench_stats(args):
+    random.seed(args.seed)
+    engine = scratch_engine(args.database_url)
+    now = datetime.utcnow()
+
+    with Session(engine) as session:
+        user_ids, website_ids = seed_websites(session, args.websites)
+
+        written = 0
+        for target in checkpoints(args.checks):
+            while written < target:
+                batch = min(args.batch_size, target - written)
+                insert_checks(session, list(generate_checks(website_ids, batch, now, args.days)))
+                written += batch
+
+            user_id = random.choice(user_ids)
+            website_id = random.choice(website_ids)
+            result = {
+                'benchmark': 'stats',
+                'websites': args.websites,
+                'checks': written,
+                'dashboard_stats_ms': timed(lambda: compute_dashboard_stats(session, user_id), args.repeat),
+                'history_ms': timed(lambda: history_window(session, website_id, args.days), args.repeat)
+            }
+            if written <= args.legacy_limit:
+                result['legacy_dashboard_stats_ms'] = timed(
+                    lambda: legacy_dashboard_stats(session, user_id), args.repeat
+                )
+            print(json.dumps(result), flush=True)
+
+
+def bench_recent(args):
+    """Memory held by full ring buffers for every website"""
+    random.seed(args.seed)
+    now = time.time()
+
+    tracemalloc.start()
+    rings = {}
+    for website_id in range(args.websites):
+        ring = CheckRing(args.capacity)
+        for n in range(args.capacity):
+            up = random.random() < 0.99
+            ring.append(now - (args.capacity - n) * 60, up, random.randint(20, 900), 200 if up else 503)
+        rings[website_id] = ring
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for website_id in range(args.websites):
+        rings[website_id].latest(args.read_limit)
+    read_ms = (time.perf_counter() - start) * 1000
+
+    budgeted = RecentChecks(capacity=args.capacity)
+    print(json.dumps({
+        'benchmark': 'recent',
+        'websites': args.websites,
+        'capacity_per_site': args.capacity,
+        'ring_bytes': budgeted.ring_bytes,
+        'array_bytes': budgeted.ring_bytes * args.websites,
+        'traced_bytes': traced,
+        'sites_within_default_budget': budgeted.max_sites,
+        'read_us_per_site': round(read_ms * 1000 / args.websites, 2)
+    }), flush=True)
+
+
+def bench_app(database_url):
+    """Flask app with the API blueprints on the benchmark database"""
+    from flask import Flask
+    from src.routes.auth import auth_bp
+    from src.routes.monitoring import monitoring_bp
+    from src.routes.agents import agents_bp
+
+    app = Flask('uptimepro-bench')
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(monitoring_bp, url_prefix='/api/monitoring')
+    app.register_blueprint(agents_bp, url_prefix='/api/agents')
+    database.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def requests_per_second(client, path, headers, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        response = client.get(path, headers=headers)
+        if response.status_code not in (200, 304):
+            raise RuntimeError(f'{path} returned {response.status_code}')
+    return round(count / (time.perf_counter() - start), 1)
+
+
+def bench_api(args):
+    """Requests per second on the polled read endpoints without and with the response cache"""
+    random.seed(args.seed)
+    app = bench_app(scratch_url(args.database_url))
+    now = datetime.utcnow()
+
+    with app.app_context():
+        user_ids, website_ids = seed_websites(db.session, args.websites)
+        insert_checks(db.session, list(generate_checks(website_ids[:SITES_PER_USER], args.checks, now, 1)))
+        api_key = db.session.get(User, user_ids[0]).api_key
+
+    client = app.test_client()
+    headers = {'X-API-Key': api_key}
+    for name, path in API_ENDPOINTS.items():
+        response_cache.enabled = False
+        uncached = requests_per_second(client, path, headers, args.requests)
+
+        response_cache.enabled = True
+        response_cache.clear()
+        etag = client.get(path, headers=headers).headers['ETag']
+        cached = requests_per_second(client, path, headers, args.requests)
+        conditional = requests_per_second(client, path, dict(headers, **{'If-None-Match': etag}), args.requests)
+
+        print(json.dumps({
+            'benchmark': 'api',
+            'endpoint': name,
+            'websites_per_user': min(SITES_PER_USER, args.websites),
+            'requests': args.requests,
+            'uncached_rps': uncached,
+            'cached_rps': cached,
+            'not_modified_rps': conditional
+        }), flush=True)
+
+
+class ProbeFarmHandler(BaseHTTPRequestHandler):
+    """Stand-in website; the first path segment picks the behaviour (ok, error, timeout, slowbody)"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        config = self.server.farm_config
+        behaviour = self.path.split('/')[1]
+        time.sleep(config['latency'] * random.uniform(0.5, 1.5))
+
+        if behaviour == 'timeout':
+            time.sleep(config['hang'])
+            self.close_connection = True
+            return
+        if behaviour == 'error':
+            body = b'unavailable'
+            self.send_response(503)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        body = b'x' * config['body_bytes']
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            if behaviour == 'slowbody':
+                # Dribble the page out in ten pieces over slow_body seconds
+                step = max(1, len(body) // 10)
+                for start in range(0, len(body), step):
+                    self.wfile.write(body[start:start + step])
+                    self.wfile.flush()
+                    time.sleep(config['slow_body'] / 10)
+            else:
+                self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the probe stopped reading at its byte cap
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_probe_farm(config, servers, ready):
+    """Serve the farm on 127.0.0.1..127.0.0.N (distinct hosts for per-host pools and rate caps)"""
+    addresses = []
+    for n in range(servers):
+        server = ThreadingHTTPServer((f'127.0.0.{n + 1}', 0), ProbeFarmHandler)
+        server.daemon_threads = True
+        server.farm_config = config
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        addresses.append(server.server_address)
+    ready.put(addresses)
+    while True:
+        time.sleep(3600)
+
+
+def bench_worker(args):
+    """Sustained checks per second, scheduling lag and write latency of one UptimeWorker"""
+    from src.probe import ProbeRateLimiter, dns_stats, pool_stats
+    from src.worker import UptimeWorker
+
+    random.seed(args.seed)
+    logging.getLogger().setLevel(logging.WARNING)  # the worker logs every check at INFO
+
+    # The farm gets its own process so serving it does not compete with the worker for the GIL
+    ready = multiprocessing.Queue()
+    farm = multiprocessing.Process(target=run_probe_farm, daemon=True, args=({
+        'latency': args.latency_ms / 1000,
+        'hang': args.probe_timeout + 1,
+        'slow_body': args.slow_body_ms / 1000,
+        'body_bytes': args.body_bytes
+    }, args.servers, ready))
+    farm.start()
+    addresses = ready.get(timeout=30)
+
+    behaviours = ['ok', 'error', 'timeout', 'slowbody']
+    weights = [max(0.0, 1 - args.error_rate - args.timeout_rate - args.slow_body_rate),
+               args.error_rate, args.timeout_rate, args.slow_body_rate]
+
+    def url_for(n):
+        host, port = addresses[n % len(addresses)]
+        return f'http://{host}:{port}/{random.choices(behaviours, weights)[0]}/{n}'
+
+    database_url = scratch_url(args.database_url)
+    engine = scratch_engine(database_url)
+    with Session(engine) as session:
+        seed_websites(session, args.websites, check_interval=args.interval, url_for=url_for)
+    engine.dispose()
+
+    worker = UptimeWorker(worker_id='bench', database_url=database_url)
+    worker.probe_engine.timeout = args.probe_timeout
+    worker.probe_engine.limiter = ProbeRateLimiter(rate=args.rate, host_rate=args.host_rate)
+    selects = []
+
+    @event.listens_for(worker.engine, 'before_cursor_execute')
+    def count_selects(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            selects.append(1)
+
+    try:
+        start = time.monotonic()
+        worker.run(duration=args.duration)
+        elapsed = time.monotonic() - start
+    finally:
+        farm.terminate()
+
+    writes = worker.check_writer.stats()
+    lag = worker.scheduling_lag.stats()
+    registry = worker.registry.stats()
+    print(json.dumps({
+        'benchmark': 'worker',
+        'websites': args.websites,
+        'interval': args.interval,
+        'concurrency': worker.probe_engine.concurrency,
+        'duration': round(elapsed, 3),
+        'checks': writes['rows_written'],
+        'checks_per_second': round(writes['rows_written'] / elapsed, 2) if elapsed > 0 else 0.0,
+        'lag_p50_s': lag['p50'],
+        'lag_p99_s': lag['p99'],
+        'lag_max_s': lag['max'],
+        'flushes': writes['flushes'],
+        'flush_ms_p50': writes['flush_ms_p50'],
+        'flush_ms_p99': writes['flush_ms_p99'],
+        'pool_hit_rate': pool_stats()['hit_rate'],
+        'dns_hit_rate': dns_stats()['hit_rate'],
+        'db_selects': len(selects),
+        'registry_websites': registry['websites'],
+        'registry_kb': round(registry['approx_bytes'] / 1024, 1),
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }), flush=True)
+
+
+def run_synthetic_agent(api_url, api_key, website_ids, batch_size, duration, seed, results):
+    """Push batches of made-up results as fast as the API accepts them; reports (rows, push latencies)"""
+    import gzip
+    import requests
+
+    rng = random.Random(seed)
+    http = requests.Session()
+    headers = {'X-Agent-Key': api_key, 'Content-Type': 'application/x-ndjson', 'Content-Encoding': 'gzip'}
+    rows = 0
+    latencies = []
+    stop_at = time.monotonic() + duration
+    while time.monotonic() < stop_at:
+        now = time.time()
+        lines = []
+        for _ in range(batch_size):
+            up = rng.random() < 0.99
+            lines.append(json.dumps({
+                'website_id': rng.choice(website_ids),
+                'checked_at': now - rng.random() * 60,
+                'status': 'up' if up else 'down',
+                'response_time': rng.randint(20, 900) if up else 0,
+                'status_code': 200 if up else 503,
+                'error_message': None if up else 'HTTP 503'
+            }, separators=(',', ':')))
+        body = gzip.compress(('\n'.join(lines) + '\n').encode(), compresslevel=5)
+        start = time.perf_counter()
+        response = http.post(f'{api_url}/api/agents/results', data=body, headers=headers, timeout=60)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        rows += response.json()['accepted']
+    results.put((rows, latencies))
+
+
+def run_probe_agent(api_url, api_key, concurrency, duration, results):
+    from src.agent import Agent
+
+    logging.getLogger().setLevel(logging.WARNING)
+    agent = Agent(api_url, api_key, concurrency=concurrency, push_interval=1.0)
+    agent.run(duration=duration)
+    results.put(agent.stats())
+
+
+def bench_agents(args):
+    """Ingest throughput of /api/agents/results with several agent processes pushing at once"""
+    from werkzeug.serving import make_server
+    from src.agent import register_agent
+    from src.check_writer import check_writer
+
+    random.seed(args.seed)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    farm = None
+    addresses = []
+    if not args.synthetic:
+        ready = multiprocessing.Queue()
+        farm = multiprocessing.Process(target=run_probe_farm, daemon=True, args=({
+            'latency': args.latency_ms / 1000, 'hang': 0, 'slow_body': 0, 'body_bytes': 2000
+        }, args.servers, ready))
+        farm.start()
+        addresses = ready.get(timeout=30)
+
+    def url_for(n):
+        host, port = addresses[n % len(addresses)]
+        return f'http://{host}:{port}/ok/{n}'
+
+    app = bench_app(scratch_url(args.database_url))
+    with app.app_context():
+        _, website_ids = seed_websites(db.session, args.websites, check_interval=args.interval,
+                                       url_for=url_for if addresses else None)
+        keys = [register_agent(db.session, f'bench-agent-{n}', f'bench-{n % args.locations}')
+                for n in range(args.agents)]
+    check_writer.init_app(app)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f'http://127.0.0.1:{server.server_port}'
+
+    results = multiprocessing.Queue()
+    if args.synthetic:
+        processes = [multiprocessing.Process(target=run_synthetic_agent, args=(
+            api_url, key, website_ids, args.batch_size, args.duration, args.seed + n, results
+        )) for n, key in enumerate(keys)]
+    else:
+        processes = [multiprocessing.Process(target=run_probe_agent, args=(
+            api_url, key, args.concurrency, args.duration, results
+        )) for key in keys]
+
+    written_before = check_writer.stats()['rows_written']
+    start = time.monotonic()
+    for process in processes:
+        process.start()
+    reports = [results.get(timeout=args.duration + 120) for _ in processes]
+    elapsed = time.monotonic() - start
+    for process in processes:
+        process.join()
+    check_writer.stop()
+    server.shutdown()
+    if farm is not None:
+        farm.terminate()
+
+    written = check_writer.stats()['rows_written'] - written_before
+    report = {
+        'benchmark': 'agents',
+        'mode': 'synthetic' if args.synthetic else 'probe',
+        'agents': args.agents,
+        'locations': args.locations,
+        'websites': args.websites,
+        'duration': round(elapsed, 3),
+        'rows_written': written,
+        'rows_per_second': round(written / elapsed, 1) if elapsed > 0 else 0.0
+    }
+    if args.synthetic:
+        latencies = sorted(latency for _, agent_latencies in reports for latency in agent_latencies)
+        report.update({
+            'batch_size': args.batch_size,
+            'pushes': len(latencies),
+            'push_ms_p50': round(statistics.median(latencies) * 1000, 1) if latencies else None,
+            'push_ms_p99': round(latencies[int(len(latencies) * 0.99)] * 1000, 1) if latencies else None
+        })
+    else:
+        report.update({
+            'probed': sum(agent['probed'] for agent in reports),
+            'pushed': sum(agent['pushed'] for agent in reports),
+            'rejected': sum(agent['rejected'] for agent in reports)
+        })
+    writes = check_writer.stats()
+    report.update({'flushes': writes['flushes'], 'flush_ms_p50': writes['flush_ms_p50'],
+                   'flush_ms_p99': writes['flush_ms_p99']})
+    print(json.dumps(report), flush=True)
+
+
+def run_db_client(role, database_url, settings, user_ids, website_ids, batch_size, duration, seed, results):
+    """One writer (check batches plus rollups, like a CheckWriter flush) or reader (dashboard stats) process"""
+    for name, value in settings.items():
+        setattr(database, name, value)
+    rng = random.Random(seed)
+    engine = database.create_engine(database_url, pool_size=2, max_overflow=0)
+    operations = 0
+    errors = 0
+    latencies = []
+    stop_at = time.monotonic() + duration
+    with Session(engine) as session:
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            try:
+                if role == 'writer':
+                    now = datetime.utcnow()
+                    rows = [dict(check, timestamp=now) for check in generate_checks(website_ids, batch_size, now, 0)]
+                    insert_checks(session, rows)
+                else:
+                    compute_dashboard_stats(session, rng.choice(user_ids))
+                    session.rollback()  # end the read transaction like the API's per-request session
+            except Exception:
+                session.rollback()
+                errors += 1  # "database is locked" and friends
+                continue
+            latencies.append(time.perf_counter() - start)
+            operations += 1
+    engine.dispose()
+    results.put((role, operations, errors, latencies))
+
+
+def bench_db(args):
+    """Writer and reader throughput from separate processes, default SQLite settings vs the shared ones"""
+    modes = {
+        'legacy': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_BUSY_TIMEOUT': 5.0},
+        'tuned': {}
+    }
+    for mode, settings in modes.items():
+        if args.database_url and mode == 'legacy':
+            continue  # the legacy pragmas only mean something for a scratch SQLite file
+        random.seed(args.seed)
+        database_url = scratch_url(args.database_url)
+        engine = scratch_engine(database_url)
+        with Session(engine) as session:
+            user_ids, website_ids = seed_websites(session, args.websites)
+            now = datetime.utcnow()
+            insert_checks(session, list(generate_checks(website_ids, args.checks, now, 1)))
+        engine.dispose()
+
+        results = multiprocessing.Queue()
+        roles = ['writer'] * args.writers + ['reader'] * args.readers
+        processes = [multiprocessing.Process(target=run_db_client, args=(
+            role, database_url, settings, user_ids, website_ids, args.batch_size, args.duration, args.seed + n, results
+        )) for n, role in enumerate(roles)]
+        for process in processes:
+            process.start()
+        reports = [results.get(timeout=args.duration + 120) for _ in processes]
+        for process in processes:
+            process.join()
+
+        report = {'benchmark': 'db', 'mode': mode, 'backend': engine.dialect.name, 'duration': args.duration}
+        for role in ('writer', 'reader'):
+            mine = [entry for entry in reports if entry[0] == role]
+            operations = sum(entry[1] for entry in mine)
+            latencies = sorted(latency for entry in mine for latency in entry[3])
+            report.update({
+                f'{role}s': len(mine),
+                f'{role}_ops_per_second': round(operations / args.duration, 1),
+                f'{role}_errors': sum(entry[2] for entry in mine),
+                f'{role}_ms_p50': round(statistics.median(latencies) * 1000, 2) if latencies else None,
+                f'{role}_ms_p99': round(latencies[int(len(latencies) * 0.99)] * 1000, 2) if latencies else None
+            })
+        report['checks_written_per_second'] = round(report['writer_ops_per_second'] * args.batch_size, 1)
+        print(json.dumps(report), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='UptimePro benchmarks')
+    parser.add_argument('--database-url', help='benchmark against this database instead of a scratch SQLite file')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per measurement (median reported)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    stats = commands.add_parser('stats', help='dashboard stats and history latency as the check table grows')
+    stats.add_argument('--websites', type=int, default=1000)
+    stats.add_argument('--checks', type=int, default=10000000)
+    stats.add_argument('--days', type=int, default=7, help='spread checks over this many days')
+    stats.add_argument('--batch-size', type=int, default=50000)
+    stats.add_argument('--legacy-limit', type=int, default=1000000,
+                       help='skip the N+1 baseline above this many checks')
+    stats.set_defaults(func=bench_stats)
+
+    recent = commands.add_parser('recent', help='ring buffer memory and read cost per website')
+    recent.add_argument('--websites', type=int, default=10000)
+    recent.add_argument('--capacity', type=int, default=120)
+    recent.add_argument('--read-limit', type=int, default=60)
+    recent.set_defaults(func=bench_recent)
+
+    api = commands.add_parser('api', help='requests per second on polled endpoints, uncached vs ETag cache')
+    api.add_argument('--websites', type=int, default=100)
+    api.add_argument('--checks', type=int, default=20000, help='checks in the last day for the measured user')
+    api.add_argument('--requests', type=int, default=2000, help='requests per endpoint and mode')
+    api.set_defaults(func=bench_api)
+
+    worker = commands.add_parser('worker', help='UptimeWorker throughput against a local stand-in server farm')
+    worker.add_argument('--websites', type=int, default=2000)
+    worker.add_argument('--interval', type=int, default=60, help='check_interval of every website (seconds)')
+    worker.add_argument('--duration', type=float, default=120, help='seconds to run the worker for')
+    worker.add_argument('--servers', type=int, default=8, help='farm hosts (127.0.0.1 .. 127.0.0.N)')
+    worker.add_argument('--latency-ms', type=float, default=50, help='mean response latency')
+    worker.add_argument('--error-rate', type=float, default=0.02, help='fraction of websites answering 503')
+    worker.add_argument('--timeout-rate', type=float, default=0.01, help='fraction of websites that never answer')
+    worker.add_argument('--slow-body-rate', type=float, default=0.05, help='fraction of websites with slow bodies')
+    worker.add_argument('--slow-body-ms', type=float, default=2000, help='time to send a slow body')
+    worker.add_argument('--body-bytes', type=int, default=20000)
+    worker.add_argument('--probe-timeout', type=float, default=5)
+    worker.add_argument('--rate', type=float, default=0, help='global probe rate cap (0 = none)')
+    worker.add_argument('--host-rate', type=float, default=0, help='per-host probe rate cap (0 = none)')
+    worker.set_defaults(func=bench_worker)
+
+    agents = commands.add_parser('agents', help='result ingest throughput with several local agent processes')
+    agents.add_argument('--agents', type=int, default=4)
+    agents.add_argument('--locations', type=int, default=2, help='agents are spread over this many locations')
+    agents.add_argument('--websites', type=int, default=2000)
+    agents.add_argument('--duration', type=float, default=30, help='seconds each agent runs for')
+    agents.add_argument('--synthetic', action='store_true',
+                        help='push made-up results back to back instead of probing a local farm')
+    agents.add_argument('--batch-size', type=int, default=5000, help='results per push (synthetic)')
+    agents.add_argument('--interval', type=int, default=60, help='check_interval of every website (probe mode)')
+    agents.add_argument('--concurrency', type=int, default=100, help='probes in flight per agent (probe mode)')
+    agents.add_argument('--servers', type=int, default=8, help='farm hosts (probe mode)')
+    agents.add_argument('--latency-ms', type=float, default=50, help='farm response latency (probe mode)')
+    agents.set_defaults(func=bench_agents)
+
+    concurrency = commands.add_parser('db', help='writer and reader throughput side by side from separate processes')
+    concurrency.add_argument('--writers', type=int, default=2, help='processes writing check batches')
+    concurrency.add_argument('--readers', type=int, default=4, help='processes computing dashboard stats')
+    concurrency.add_argument('--websites', type=int, default=1000)
+    concurrency.add_argument('--checks', type=int, default=100000, help='checks seeded before measuring')
+    concurrency.add_argument('--batch-size', type=int, default=500, help='checks per write transaction')
+    concurrency.add_argument('--duration', type=float, default=20)
+    concurrency.set_defaults(func=bench_db)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+UptimePro Check Tail
+Delivers UptimeCheck rows committed by any process to in-memory listeners in the API
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from sqlalchemy import func
+
+from src.models.website import Website, UptimeCheck
+
+logger = logging.getLogger(__name__)
+
+CHECK_TAIL_INTERVAL = float(os.getenv('CHECK_TAIL_INTERVAL', 1.0))  # seconds between DB tails
+CHECK_TAIL_GAP_TIMEOUT = float(os.getenv('CHECK_TAIL_GAP_TIMEOUT', 60))  # seconds a skipped id is looked for again
+CHECK_TAIL_BATCH = 10000  # rows read past the watermark per tail
+CHECK_TAIL_MAX_GAPS = 10000
+CHECK_TAIL_GAP_CHUNK = 500  # ids per IN (...) lookup
+
+
+class CheckTail:
+    """Reads UptimeCheck rows by id past a watermark and hands them to listeners.
+
+    This is how the API process sees checks written by the worker, probe
+    agents and other API processes. Ids are not handed out in commit order
+    on PostgreSQL: a transaction holding a lower id can commit after one
+    holding a higher id, and a plain `id > watermark` tail would step over
+    it for good. So every id the watermark passes without a row is kept as
+    a gap and looked up again on each tail until its row shows up or
+    `gap_timeout` seconds pass (rolled-back inserts leave ids that never
+    fill). Only a transaction committing more than `gap_timeout` seconds
+    after a later one is missed.
+
+    Listeners get CheckWriter-style check mappings plus the owner's
+    `user_id`, on the tail thread; checks this process wrote itself arrive
+    here too, after their listeners already saw them. Rows are read where
+    the read endpoints read, so a check is only announced once a body read
+    afterwards can show it.
+    """
+
+    def __init__(self, interval=CHECK_TAIL_INTERVAL, gap_timeout=CHECK_TAIL_GAP_TIMEOUT, batch=CHECK_TAIL_BATCH):
+        self.interval = interval
+        self.gap_timeout = gap_timeout
+        self.batch = batch
+        self.session_scope = None
+        self._listeners = []
+        self._watermark = None  # highest UptimeCheck.id read
+        self._gaps = OrderedDict()  # id passed without a row -> monotonic deadline
+        self._thread = None
+        self.rows = 0
+        self.gaps_filled = 0
+        self.gaps_expired = 0
+
+    def add_listener(self, listener):
+        """Call `listener(checks)` with the mappings of every batch of rows tailed"""
+        self._listeners.append(listener)
+
+    def init_app(self, app):
+        """Tail through read_session (the replica, if configured) on a background thread"""
+        from src.database import read_session
+
+        @contextmanager
+        def app_session_scope():
+            with app.app_context():
+                yield read_session
+
+        self.session_scope = app_session_scope
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='check-tail', daemon=True)
+            self._thread.start()
+
+    def _query(self, session):
+        return session.query(
+            UptimeCheck.id,
+            UptimeCheck.website_id,
+            Website.user_id,
+            UptimeCheck.timestamp,
+            UptimeCheck.status,
+            UptimeCheck.response_time,
+            UptimeCheck.status_code,
+            UptimeCheck.location
+        ).join(Website, Website.id == UptimeCheck.website_id)
+
+    def poll(self, session):
+        """Read rows committed since the last call and deliver them; returns how many"""
+        if self._watermark is None:
+            self._watermark = session.query(func.max(UptimeCheck.id)).scalar() or 0
+            return 0
+
+        now = time.monotonic()
+        while self._gaps and next(iter(self._gaps.values())) < now:
+            self._gaps.popitem(last=False)
+            self.gaps_expired += 1
+
+        rows = []
+        gap_ids = list(self._gaps)
+        for start in range(0, len(gap_ids), CHECK_TAIL_GAP_CHUNK):
+            found = self._query(session).filter(
+                UptimeCheck.id.in_(gap_ids[start:start + CHECK_TAIL_GAP_CHUNK])
+            ).all()
+            for row in found:
+                del self._gaps[row.id]
+            self.gaps_filled += len(found)
+            rows.extend(found)
+
+        for row in self._query(session).filter(
+            UptimeCheck.id > self._watermark
+        ).order_by(UptimeCheck.id).limit(self.batch):
+            for missing in range(max(self._watermark + 1, row.id - CHECK_TAIL_MAX_GAPS), row.id):
+                self._gaps[missing] = now + self.gap_timeout
+            self._watermark = row.id
+            rows.append(row)
+        while len(self._gaps) > CHECK_TAIL_MAX_GAPS:
+            self._gaps.popitem(last=False)
+            self.gaps_expired += 1
+
+        if not rows:
+            return 0
+        checks = [{
+            'website_id': row.website_id,
+            'user_id': row.user_id,
+            'timestamp': row.timestamp,
+            'status': row.status,
+            'response_time': row.response_time,
+            'status_code': row.status_code,
+            'location': row.location
+        } for row in rows]
+        self.rows += len(checks)
+        for listener in self._listeners:
+            try:
+                listener(checks)
+            except Exception as e:
+                logger.error(f"Check tail listener failed: {str(e)}")
+        return len(checks)
+
+    def _run(self):
+        while True:
+            try:
+                with self.session_scope() as session:
+                    self.poll(session)
+            except Exception as e:
+                logger.error(f"Check tail failed: {str(e)}")
+            time.sleep(self.interval)
+
+    def stats(self):
+        return {
+            'watermark': self._watermark,
+            'rows': self.rows,
+            'gaps': len(self._gaps),
+            'gaps_filled': self.gaps_filled,
+            'gaps_expired': self.gaps_expired
+        }
+
+
+# Tail of checks written by other processes for the API process, started in main.py
+check_tail = CheckTail()
@@ -0,0 +1,301 @@
+"""
+UptimePro Check Writer
+Write-behind buffer that persists check results in batches
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from sqlalchemy import bindparam, insert
+
+from src.models.website import Website, UptimeCheck, HOME_LOCATION
+from src.rollups import apply_checks
+from src.metrics import checks_written, db_commit_duration
+
+logger = logging.getLogger(__name__)
+
+CHECK_WRITER_MAX_BATCH = int(os.getenv('CHECK_WRITER_MAX_BATCH', 500))
+CHECK_WRITER_MAX_DELAY = float(os.getenv('CHECK_WRITER_MAX_DELAY', 1.0))  # seconds
+CHECK_WRITER_MAX_RETRIES = int(os.getenv('CHECK_WRITER_MAX_RETRIES', 10))  # failed flushes before a batch is dropped
+CHECK_WRITER_RETRY_MAX_DELAY = 30  # seconds; cap on the backoff between failed flushes
+WEBSITE_LOOKUP_CHUNK = 500  # website ids per existence check
+FLUSH_TIMING_WINDOW = 1000  # flushes kept for the latency percentiles
+
+
+def update_statuses(session, updates):
+    """Write Website status mappings with plain UPDATEs, one executemany per set of columns.
+
+    Unlike bulk_update_mappings this does not insist that every row
+    matched, so a website deleted concurrently cannot fail the batch.
+    """
+    table = Website.__table__
+    groups = {}
+    for mapping in updates:
+        groups.setdefault(tuple(sorted(mapping)), []).append(mapping)
+    for columns, rows in groups.items():
+        statement = table.update().where(table.c.id == bindparam('b_id')).values(
+            {column: bindparam(f'b_{column}') for column in columns if column != 'id'}
+        )
+        session.execute(statement, [{f'b_{key}': value for key, value in row.items()} for row in rows])
+
+
+class CheckWriter:
+    """Buffers UptimeCheck rows and Website status updates and flushes them together.
+
+    Each flush is one transaction: a bulk insert of every buffered check,
+    the matching uptime rollup upserts and a bulk update of the latest
+    status per website. Checks for websites deleted while they sat in the
+    buffer are discarded at flush time. A failed flush is retried with
+    backoff; after `max_retries` consecutive failures the batch is dropped
+    (and logged) so one bad batch cannot wedge the writer. A flush happens when
+    `max_batch` checks are buffered or the oldest buffered check is
+    `max_delay` seconds old, whichever comes first. Callers that need the
+    status a website is about to have (e.g. to detect an up -> down
+    transition before the flush) can ask `current_status`.
+
+    `session_scope` is a callable returning a context manager that yields a
+    SQLAlchemy session; `init_app` wires one up for the Flask app. With
+    `mark_updated` the status updates also bump Website.updated_at, so
+    checks made outside the worker reach its registry.
+    """
+
+    def __init__(self, session_scope=None, max_batch=CHECK_WRITER_MAX_BATCH, max_delay=CHECK_WRITER_MAX_DELAY,
+                 mark_updated=False, max_retries=CHECK_WRITER_MAX_RETRIES):
+        self.session_scope = session_scope
+        self.mark_updated = mark_updated
+        self.max_retries = max_retries
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._checks = []
+        self._updates = {}  # website_id -> latest status update
+        self._oldest = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._listeners = []
+        self._failures = 0  # consecutive failed flushes
+        self._retry_at = 0.0  # monotonic time before which a failed batch is not retried
+        self.flushes = 0
+        self.rows_written = 0
+        self.discarded = 0  # checks for websites deleted before the flush
+        self.dropped = 0  # checks given up on after max_retries failed flushes
+        self._flush_seconds = deque(maxlen=FLUSH_TIMING_WINDOW)
+
+    def init_app(self, app):
+        """Flush through Flask-SQLAlchemy and start the background flush thread"""
+        from src.models.user import db
+
+        @contextmanager
+        def app_session_scope():
+            with app.app_context():
+                yield db.session
+
+        self.session_scope = app_session_scope
+        self.start()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._checks)
+
+    def add_listener(self, listener):
+        """Call listener(checks) with each batch of check mappings once it is committed"""
+        self._listeners.append(listener)
+
+    def add(self, website_id, result, checked_at, next_check_at=None, location=None):
+        """Buffer one check result; flushes inline once the batch is full"""
+        status = result['status']
+        check = {
+            'website_id': website_id,
+            'timestamp': checked_at,
+            'status': status,
+            'response_time': result.get('response_time'),
+            'status_code': result.get('status_code'),
+            'error_message': result.get('error_message'),
+            'dns_time': result.get('dns_time'),
+            'connect_time': result.get('connect_time'),
+            'tls_time': result.get('tls_time'),
+            'ttfb': result.get('ttfb'),
+            'bytes_received': result.get('bytes_received'),
+            'location': location or HOME_LOCATION  # every row carries the same keys for one executemany
+        }
+
+        update = {
+            'id': website_id,
+            'current_status': status,
+            'last_checked': checked_at
+        }
+        if next_check_at is not None:
+            update['next_check_at'] = next_check_at
+        if self.mark_updated:
+            update['updated_at'] = checked_at
+
+        with self._lock:
+            self._checks.append(check)
+            self._updates[website_id] = update
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._checks) >= self.max_batch and time.monotonic() >= self._retry_at
+
+        if full:
+            try:
+                self.flush()
+            except Exception:
+                pass  # already logged; the batch stays buffered for the next attempt
+
+    def add_many(self, checks):
+        """Buffer ready-made check mappings (e.g. from probe agents) that leave Website status alone"""
+        if not checks:
+            return
+        with self._lock:
+            self._checks.extend(checks)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def current_status(self, website_id, default=None):
+        """Status buffered for a website but not yet flushed, else `default`"""
+        with self._lock:
+            update = self._updates.get(website_id)
+        return update['current_status'] if update else default
+
+    def is_due(self):
+        with self._lock:
+            if not self._checks or time.monotonic() < self._retry_at:
+                return False
+            return (len(self._checks) >= self.max_batch or
+                    time.monotonic() - self._oldest >= self.max_delay)
+
+    def maybe_flush(self):
+        if self.is_due():
+            return self.flush()
+        return 0
+
+    def flush(self):
+        """Write everything buffered in one transaction; returns the number of checks written"""
+        with self._flush_lock:
+            with self._lock:
+                checks, updates = self._checks, self._updates
+                self._checks, self._updates, self._oldest = [], {}, None
+            if not checks:
+                return 0
+
+            start_time = time.perf_counter()
+            try:
+                with self.session_scope() as session:
+                    try:
+                        checks, updates = self._drop_deleted(session, checks, updates)
+                        if checks:
+                            session.execute(insert(UptimeCheck.__table__), checks)
+                            apply_checks(session, checks)
+                            update_statuses(session, updates.values())
+                        session.commit()
+                    except Exception:
+                        session.rollback()
+                        raise
+            except Exception as e:
+                self._failures += 1
+                if self._failures >= self.max_retries:
+                    logger.error(f"Dropping {len(checks)} checks after {self._failures} failed flushes: {str(e)}")
+                    self.dropped += len(checks)
+                    self._failures = 0
+                    self._retry_at = 0.0
+                else:
+                    logger.error(f"Failed to flush {len(checks)} checks: {str(e)}")
+                    self._requeue(checks, updates)
+                    backoff = min(CHECK_WRITER_RETRY_MAX_DELAY, self.max_delay * 2 ** (self._failures - 1))
+                    self._retry_at = time.monotonic() + backoff
+                raise
+
+            self._failures = 0
+            self._retry_at = 0.0
+            if not checks:
+                return 0
+
+            duration = time.perf_counter() - start_time
+            self._flush_seconds.append(duration)
+            db_commit_duration.observe(duration)
+            checks_written.inc(amount=len(checks))
+            self.flushes += 1
+            self.rows_written += len(checks)
+            for listener in self._listeners:
+                try:
+                    listener(checks)
+                except Exception as e:
+                    logger.error(f"Check writer listener failed: {str(e)}")
+            return len(checks)
+
+    def stats(self):
+        """Flush counts and transaction latency percentiles (ms) over recent flushes"""
+        durations = sorted(self._flush_seconds)
+
+        def percentile(p):
+            if not durations:
+                return None
+            return round(durations[min(len(durations) - 1, int(p * len(durations)))] * 1000, 2)
+
+        return {
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'buffered': len(self),
+            'discarded': self.discarded,
+            'dropped': self.dropped,
+            'flush_ms_p50': percentile(0.5),
+            'flush_ms_p99': percentile(0.99),
+            'flush_ms_max': percentile(1.0)
+        }
+
+    def _drop_deleted(self, session, checks, updates):
+        """Leave out checks and status updates for websites that no longer exist"""
+        website_ids = list({check['website_id'] for check in checks})
+        existing = set()
+        for offset in range(0, len(website_ids), WEBSITE_LOOKUP_CHUNK):
+            existing.update(website_id for (website_id,) in session.query(Website.id).filter(
+                Website.id.in_(website_ids[offset:offset + WEBSITE_LOOKUP_CHUNK])
+            ))
+        if len(existing) == len(website_ids):
+            return checks, updates
+
+        kept = [check for check in checks if check['website_id'] in existing]
+        logger.warning(f"Discarding {len(checks) - len(kept)} checks for deleted websites")
+        self.discarded += len(checks) - len(kept)
+        return kept, {website_id: update for website_id, update in updates.items() if website_id in existing}
+
+    def _requeue(self, checks, updates):
+        """Put a failed batch back in front of anything buffered since"""
+        with self._lock:
+            self._checks = checks + self._checks
+            for website_id, update in updates.items():
+                self._updates.setdefault(website_id, update)
+            self._oldest = time.monotonic()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='check-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flush thread and write out whatever is left"""
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        interval = max(0.05, self.max_delay / 4)
+        while not self._stopping.wait(interval):
+            try:
+                self.maybe_flush()
+            except Exception:
+                pass  # already logged; the batch stays buffered for the next attempt
+
+
+# Write-behind buffer for the API process, bound to the app in main.py; its checks are manual
+# ones the worker did not make, so they go through the updated_at change feed
+check_writer = CheckWriter(mark_updated=True)
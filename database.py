@@ -0,0 +1,134 @@
+"""
+UptimePro Database
+Engine settings shared by the API and the worker: SQLite WAL, pool sizes and read/write sessions
+"""
+
+import os
+import sqlite3
+
+import sqlalchemy
+from flask.globals import app_ctx
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, scoped_session
+
+from src.models.user import db
+
+DEFAULT_DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'database', 'app.db')
+
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))  # connections kept open per process
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))  # extra connections under bursts
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))  # seconds to wait for a pooled connection
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # seconds; below server-side idle timeouts
+
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', 15))  # seconds a writer waits for the lock
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')  # NORMAL loses no commits on app crashes in WAL
+SQLITE_CACHE_KB = int(os.getenv('SQLITE_CACHE_KB', 64000))  # page cache per connection
+
+
+def normalize_url(url):
+    """Accept the postgres:// spelling some hosts hand out"""
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def database_url():
+    """DATABASE_URL, or the SQLite file next to the app; the API and the worker share it"""
+    return normalize_url(os.getenv('DATABASE_URL', f'sqlite:///{DEFAULT_DATABASE_PATH}'))
+
+
+def database_read_url():
+    """DATABASE_READ_URL (e.g. a PostgreSQL replica), else None to read from the primary"""
+    url = os.getenv('DATABASE_READ_URL')
+    return normalize_url(url) if url else None
+
+
+def is_sqlite_memory(url):
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW):
+    """create_engine keyword arguments for `url`.
+
+    SQLite gets a busy timeout on the driver so a writer waits for the lock
+    instead of failing with "database is locked", and connections usable
+    from the pool's threads. Server databases get pre-ping and recycling so
+    connections dropped by the server or a proxy are replaced transparently.
+    """
+    url = make_url(url)
+    if is_sqlite_memory(url):
+        return {}
+
+    options = {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': DB_POOL_TIMEOUT
+    }
+    if url.get_backend_name() == 'sqlite':
+        options['connect_args'] = {'timeout': SQLITE_BUSY_TIMEOUT, 'check_same_thread': False}
+    else:
+        options['pool_pre_ping'] = True
+        options['pool_recycle'] = DB_POOL_RECYCLE
+    return options
+
+
+def create_engine(url=None, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW):
+    """Engine for processes outside Flask (worker, agent registration, benchmarks)"""
+    url = url or database_url()
+    _ensure_sqlite_directory(url)
+    return sqlalchemy.create_engine(url, **engine_options(url, pool_size, max_overflow))
+
+
+def _ensure_sqlite_directory(url):
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and not is_sqlite_memory(url):
+        directory = os.path.dirname(os.path.abspath(url.database))
+        os.makedirs(directory, exist_ok=True)
+
+
+@event.listens_for(Engine, 'connect')
+def _configure_sqlite(dbapi_connection, connection_record):
+    """WAL lets readers run alongside the single writer; applied to every SQLite connection in the process"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f'PRAGMA journal_mode={SQLITE_JOURNAL_MODE}')  # persistent; in-memory databases answer 'memory'
+        cursor.execute(f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}')
+        cursor.execute(f'PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT * 1000)}')
+        cursor.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_KB}')
+    finally:
+        cursor.close()
+
+
+def _read_bind():
+    engines = db.engines
+    return engines['read'] if 'read' in engines else db.engine
+
+
+# Session for read-only endpoints, one per app context. It is never used for
+# writes, so on SQLite it never holds the write lock, and with
+# DATABASE_READ_URL set its queries go to the replica (which may lag slightly).
+read_session = scoped_session(
+    lambda: Session(bind=_read_bind(), autoflush=False, expire_on_commit=False),
+    scopefunc=lambda: id(app_ctx._get_current_object())
+)
+
+
+def init_app(app):
+    """Point Flask-SQLAlchemy at the shared database settings and set up read_session"""
+    url = app.config.setdefault('SQLALCHEMY_DATABASE_URI', database_url())
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(url))
+    app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
+    read_url = database_read_url()
+    if read_url:
+        app.config.setdefault('SQLALCHEMY_BINDS', {}).setdefault('read', dict(engine_options(read_url), url=read_url))
+    _ensure_sqlite_directory(url)
+    db.init_app(app)
+
+    @app.teardown_appcontext
+    def _remove_read_session(exc):
+        read_session.remove()
@@ -0,0 +1,125 @@
+"""
+UptimePro DNS Cache
+In-process, TTL-bounded cache of host name resolutions for probes
+"""
+
+import ipaddress
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import dns.resolver
+except ImportError:  # dnspython is optional; without it records live for DNS_CACHE_TTL
+    dns = None
+
+DNS_CACHE_SIZE = int(os.getenv('DNS_CACHE_SIZE', 10000))  # host names
+DNS_CACHE_TTL = float(os.getenv('DNS_CACHE_TTL', 60))  # seconds; used when the record TTL is unknown
+DNS_CACHE_MAX_TTL = float(os.getenv('DNS_CACHE_MAX_TTL', 300))  # cap on record TTLs
+DNS_NEGATIVE_TTL = float(os.getenv('DNS_NEGATIVE_TTL', 5))  # seconds a failed lookup is remembered
+
+
+class DNSCache:
+    """LRU map of host -> (expires, [(family, address), ...]) or a cached failure.
+
+    With dnspython installed, A/AAAA answers are kept for their own TTL
+    (capped at `max_ttl`); otherwise, or when the resolver cannot answer
+    (e.g. names only in /etc/hosts), the system resolver is used and the
+    result kept for `ttl` seconds. Failed lookups are remembered for
+    `negative_ttl` seconds so a site that is down does not cost a full
+    resolver timeout on every probe. IP literals are never cached.
+    """
+
+    def __init__(self, maxsize=DNS_CACHE_SIZE, ttl=DNS_CACHE_TTL, max_ttl=DNS_CACHE_MAX_TTL,
+                 negative_ttl=DNS_NEGATIVE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def _lookup(self, host):
+        """Resolve `host`; returns (addresses, ttl)"""
+        if dns is not None:
+            addresses = []
+            ttls = []
+            for rdtype, family in (('A', socket.AF_INET), ('AAAA', socket.AF_INET6)):
+                try:
+                    answer = dns.resolver.resolve(host, rdtype)
+                except Exception:
+                    continue
+                ttls.append(answer.rrset.ttl)
+                addresses.extend((family, record.address) for record in answer)
+            if addresses:
+                return addresses, min(min(ttls), self.max_ttl)
+
+        infos = socket.getaddrinfo(host, None, 0, socket.SOCK_STREAM)
+        addresses = []
+        for family, _, _, _, sockaddr in infos:
+            if (family, sockaddr[0]) not in addresses:
+                addresses.append((family, sockaddr[0]))
+        return addresses, self.ttl
+
+    def resolve(self, host):
+        """[(family, address), ...] for `host`; raises socket.gaierror if it does not resolve"""
+        try:
+            address = ipaddress.ip_address(host.strip('[]'))
+            return [(socket.AF_INET6 if address.version == 6 else socket.AF_INET, str(address))]
+        except ValueError:
+            pass
+
+        key = host.lower()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                if isinstance(entry[1], Exception):
+                    raise entry[1]
+                return entry[1]
+            self.misses += 1
+
+        try:
+            addresses, ttl = self._lookup(host)
+            value = addresses
+        except socket.gaierror as e:
+            value, ttl = e, self.negative_ttl
+
+        with self._lock:
+            if isinstance(value, Exception):
+                self.failures += 1
+            self._entries[key] = (now + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hosts': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'failures': self.failures,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'resolver': 'dnspython' if dns is not None else 'system'
+            }
+
+
+# Shared by every probe connection in this process
+dns_cache = DNSCache()
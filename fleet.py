@@ -0,0 +1,157 @@
+"""
+UptimePro Worker Fleet
+Splits websites between worker processes with time-bounded shard leases in the shared DB
+"""
+
+import logging
+import math
+import os
+import socket
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+
+from src.models.website import Website, WorkerNode, ShardLease
+
+logger = logging.getLogger(__name__)
+
+WORKER_SHARDS = int(os.getenv('WORKER_SHARDS', 64))
+WORKER_LEASE_TTL = float(os.getenv('WORKER_LEASE_TTL', 30))  # seconds
+LEASE_SAFETY_MARGIN = 0.2  # fraction of the TTL a lease is given up early by its owner
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class ShardCoordinator:
+    """Keeps this worker's share of the Website.id % num_shards shards leased.
+
+    Every `heartbeat` a worker records itself as alive, renews the leases it
+    holds, releases any beyond its fair share (num_shards / live workers)
+    and claims free or expired shards up to that share. Claims are
+    compare-and-set UPDATEs, so two workers can never hold the same shard.
+    An owner stops treating a lease as valid LEASE_SAFETY_MARGIN before it
+    expires, so a stalled worker has stopped probing before anyone else can
+    claim its shards. A dead worker's shards move once its leases run out.
+    """
+
+    def __init__(self, session, worker_id=None, num_shards=WORKER_SHARDS, lease_ttl=WORKER_LEASE_TTL):
+        self.session = session
+        self.worker_id = worker_id or default_worker_id()
+        self.num_shards = num_shards
+        self.lease_ttl = lease_ttl
+        self.owned = frozenset()
+        self.valid_until = None
+        self.last_heartbeat = None
+
+    def _ensure_shards(self):
+        existing = {shard for (shard,) in self.session.query(ShardLease.shard)}
+        missing = [ShardLease(shard=shard) for shard in range(self.num_shards) if shard not in existing]
+        if missing:
+            self.session.add_all(missing)
+            try:
+                self.session.commit()
+            except Exception:
+                self.session.rollback()  # another worker created them first
+
+    def heartbeat_due(self, now=None):
+        now = now or datetime.utcnow()
+        if self.last_heartbeat is None:
+            return True
+        return (now - self.last_heartbeat).total_seconds() >= self.lease_ttl / 3
+
+    def seconds_until_heartbeat(self, now=None):
+        now = now or datetime.utcnow()
+        if self.last_heartbeat is None:
+            return 0.0
+        return max(0.0, self.lease_ttl / 3 - (now - self.last_heartbeat).total_seconds())
+
+    def heartbeat(self, now=None):
+        """Renew, release and claim leases; returns (gained, lost) shard sets"""
+        now = now or datetime.utcnow()
+        if self.last_heartbeat is None:
+            self._ensure_shards()
+        expires_at = now + timedelta(seconds=self.lease_ttl)
+        live_after = now - timedelta(seconds=self.lease_ttl)
+
+        node = self.session.get(WorkerNode, self.worker_id)
+        if node is None:
+            node = WorkerNode(id=self.worker_id, hostname=socket.gethostname(), started_at=now)
+            self.session.add(node)
+        node.heartbeat_at = now
+        self.session.flush()
+
+        live_workers = self.session.query(WorkerNode).filter(WorkerNode.heartbeat_at >= live_after).count()
+        fair_share = math.ceil(self.num_shards / max(1, live_workers))
+
+        # Renew everything we still hold
+        self.session.query(ShardLease).filter(
+            ShardLease.owner == self.worker_id,
+            ShardLease.expires_at >= now
+        ).update({'expires_at': expires_at}, synchronize_session=False)
+        held = sorted(shard for (shard,) in self.session.query(ShardLease.shard).filter(
+            ShardLease.owner == self.worker_id,
+            ShardLease.expires_at >= now
+        ))
+
+        # Give back the excess so newly joined workers can pick it up
+        excess = held[fair_share:]
+        if excess:
+            self.session.query(ShardLease).filter(
+                ShardLease.shard.in_(excess),
+                ShardLease.owner == self.worker_id
+            ).update({'owner': None, 'expires_at': None}, synchronize_session=False)
+            held = held[:fair_share]
+
+        # Claim free or expired shards up to our fair share
+        if len(held) < fair_share:
+            candidates = [shard for (shard,) in self.session.query(ShardLease.shard).filter(
+                or_(ShardLease.owner.is_(None), ShardLease.expires_at < now)
+            ).order_by(ShardLease.shard)]
+            for shard in candidates:
+                if len(held) >= fair_share:
+                    break
+                claimed = self.session.query(ShardLease).filter(
+                    ShardLease.shard == shard,
+                    or_(ShardLease.owner.is_(None), ShardLease.expires_at < now)
+                ).update({'owner': self.worker_id, 'expires_at': expires_at}, synchronize_session=False)
+                if claimed:
+                    held.append(shard)
+
+        self.session.commit()
+
+        previous = self.owned
+        self.owned = frozenset(held)
+        self.valid_until = now + timedelta(seconds=self.lease_ttl * (1 - LEASE_SAFETY_MARGIN))
+        self.last_heartbeat = now
+
+        gained, lost = self.owned - previous, previous - self.owned
+        if gained or lost:
+            logger.info(f"Worker {self.worker_id} owns {len(self.owned)}/{self.num_shards} shards "
+                        f"({live_workers} live workers, +{len(gained)} -{len(lost)})")
+        return gained, lost
+
+    def leases_valid(self, now=None):
+        now = now or datetime.utcnow()
+        return self.valid_until is not None and now < self.valid_until
+
+    def owns_shard(self, shard, now=None):
+        return shard in self.owned and self.leases_valid(now)
+
+    def owns(self, website_id, now=None):
+        return self.owns_shard(website_id % self.num_shards, now)
+
+    def website_filter(self):
+        """SQL criterion restricting Website rows to the shards this worker holds"""
+        return (Website.id % self.num_shards).in_(sorted(self.owned))
+
+    def release_all(self):
+        """Hand every shard back immediately, e.g. on clean shutdown"""
+        self.session.query(ShardLease).filter(
+            ShardLease.owner == self.worker_id
+        ).update({'owner': None, 'expires_at': None}, synchronize_session=False)
+        self.session.query(WorkerNode).filter(WorkerNode.id == self.worker_id).delete(synchronize_session=False)
+        self.session.commit()
+        self.owned = frozenset()
+        self.valid_until = None
@@ -6,10 +6,20 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from src.models.user import db
-from src.models.website import Website, UptimeCheck, Alert, Subscription
+from src import database
+from src import schema
+from src.models.website import Website, UptimeCheck, Alert, Subscription, ProbeAgent
+from src.check_writer import check_writer
+from src.check_tail import check_tail
+from src.recent_checks import recent_checks
+from src.status_events import status_broker
+from src.response_cache import response_cache
+from src import metrics
+from src.profiling import request_profiler
 from src.routes.user import user_bp
 from src.routes.auth import auth_bp
 from src.routes.monitoring import monitoring_bp
+from src.routes.agents import agents_bp
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
@@ -21,14 +31,34 @@ CORS(app, origins="*")
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(monitoring_bp, url_prefix='/api/monitoring')
+app.register_blueprint(agents_bp, url_prefix='/api/agents')
 
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+# Database configuration shared with the worker (DATABASE_URL, WAL on SQLite, pool sizes, read replica)
+database.init_app(app)
 
 with app.app_context():
     db.create_all()
+    schema.upgrade(db.engine)
+
+# Batched writes of manual check results
+check_writer.add_listener(recent_checks.feed)
+check_writer.add_listener(status_broker.feed)
+check_writer.init_app(app)
+
+# Checks written by the worker, probe agents and other API processes
+check_tail.add_listener(recent_checks.feed)
+check_tail.add_listener(status_broker.feed)
+check_tail.add_listener(response_cache.feed)
+check_tail.init_app(app)
+
+# Status stream fan-out; signs the tokens streams connect with
+status_broker.init_app(app)
+
+# Request latency and query counts, served at /metrics
+metrics.init_app(app)
+
+# Opt-in per-route profiling and slow logs (PROFILE_REQUESTS=true), served at /api/monitoring/profile/*
+request_profiler.init_app(app)
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
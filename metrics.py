@@ -0,0 +1,267 @@
+"""
+UptimePro Metrics
+Minimal in-process metric registry rendered in the Prometheus text format
+"""
+
+import hmac
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() != 'false'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # scrapers send "Authorization: Bearer <token>"; unset: loopback only
+METRICS_HOST = os.getenv('METRICS_HOST', '0.0.0.0' if METRICS_TOKEN else '127.0.0.1')  # worker metrics server
+LOOPBACK_ADDRS = ('127.0.0.1', '::1')
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LAG_BUCKETS = (0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base for a named metric family; label values are passed positionally in `labelnames` order"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+                for labels, value in items]
+
+    def render(self):
+        return self.header() + self.samples()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """A settable value, or one read from `function` at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set_function(self, function):
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            try:
+                self.set(self._function())
+            except Exception:
+                pass
+        return super().samples()
+
+
+class Histogram(Metric):
+    """Cumulative bucket counts plus sum and count per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._values.items()]
+        lines = []
+        for labels, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {_format_value(total)}')
+            lines.append(f'{self.name}_count{label_text} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# Probes (worker and API manual checks)
+probe_duration = registry.register(Histogram(
+    'uptimepro_probe_duration_seconds', 'Wall time of one website probe', ('status',)))
+probes_in_flight = registry.register(Gauge(
+    'uptimepro_probes_in_flight', 'Probes currently running'))
+
+# Worker scheduling
+scheduler_queue_depth = registry.register(Gauge(
+    'uptimepro_scheduler_queue_depth', 'Websites queued in the worker scheduler'))
+scheduling_lag = registry.register(Histogram(
+    'uptimepro_scheduling_lag_seconds', 'Probe start time minus its scheduled deadline', buckets=LAG_BUCKETS))
+
+# Writes
+db_commit_duration = registry.register(Histogram(
+    'uptimepro_db_commit_seconds', 'Duration of one batched check-write transaction'))
+checks_written = registry.register(Counter(
+    'uptimepro_checks_written_total', 'Check rows committed by the batched writer'))
+
+# Alerts
+alert_queue_depth = registry.register(Gauge(
+    'uptimepro_alert_queue_depth', 'Alerts waiting for delivery, including scheduled retries'))
+
+# API
+http_request_duration = registry.register(Histogram(
+    'uptimepro_http_request_duration_seconds', 'API request latency', ('endpoint', 'method', 'status')))
+http_request_queries = registry.register(Histogram(
+    'uptimepro_http_request_queries', 'SQL statements issued per API request', ('endpoint',), buckets=COUNT_BUCKETS))
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g._metrics_queries = g.get('_metrics_queries', 0) + 1
+
+
+def scrape_allowed(authorization, remote_addr):
+    """The one access policy for /metrics, the stats routes and the worker's metrics port.
+
+    Operational figures cover every customer, so end-user API keys do not
+    open them: with METRICS_TOKEN set a scraper must send it as a bearer
+    token, and without it only loopback clients are served.
+    """
+    if METRICS_TOKEN:
+        return hmac.compare_digest(authorization or '', f'Bearer {METRICS_TOKEN}')
+    return remote_addr in LOOPBACK_ADDRS
+
+
+def require_scrape_access(view):
+    """Flask views for operators only, under scrape_allowed"""
+    @wraps(view)
+    def decorated(*args, **kwargs):
+        if not scrape_allowed(request.headers.get('Authorization'), request.remote_addr):
+            return Response('Forbidden\n', status=403, content_type='text/plain')
+        return view(*args, **kwargs)
+    return decorated
+
+
+def init_app(app):
+    """Time every request, count its SQL statements and serve /metrics to scrapers"""
+    if not METRICS_ENABLED:
+        return
+
+    event.listen(Engine, 'before_cursor_execute', _count_query)
+
+    @app.before_request
+    def _start_request_timer():
+        g._metrics_start = time.perf_counter()
+        g._metrics_queries = 0
+
+    @app.after_request
+    def _observe_request(response):
+        start = g.get('_metrics_start')
+        if start is not None:
+            endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            http_request_duration.observe(time.perf_counter() - start, endpoint, request.method, response.status_code)
+            http_request_queries.observe(g.get('_metrics_queries', 0), endpoint)
+        return response
+
+    @app.route('/metrics')
+    @require_scrape_access
+    def metrics():
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if not scrape_allowed(self.headers.get('Authorization'), self.client_address[0]):
+            self.send_error(403)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host=METRICS_HOST):
+    """Serve the registry on its own thread, for processes without a Flask app (the worker)"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
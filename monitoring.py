@@ -1,45 +1,128 @@
-from flask import Blueprint, request, jsonify
-from src.models.user import db, User
+from flask import Blueprint, Response, current_app, request, jsonify, g, stream_with_context
+from src.models.user import db
+from src.database import read_session
+from src.api_auth import authenticate, require_api_key
 from src.models.website import Website, UptimeCheck, Alert, Subscription
-import requests
+from src.probe import PhaseTimer, ProbeEngine, dns_stats, fetch, pool_stats
+from src.check_writer import check_writer
+from src.check_tail import check_tail
+from src.recent_checks import recent_checks
+from src.status_events import status_broker, STATUS_STREAM_KEEPALIVE, STATUS_STREAM_TOKEN_TTL
+from src.response_cache import cached_response, response_cache
+from src.scheduler import next_check_time
+from src.profiling import request_profiler, require_local_profiler
+from src.metrics import require_scrape_access
+from src.rollups import latency_percentiles, uptime_series, uptime_summary, GRANULARITIES
+from sqlalchemy import and_, case, func, or_, select
+import base64
+import csv
+import io
+import json
+import queue
 import time
 from datetime import datetime, timedelta
+from urllib.parse import urlsplit, urlunsplit
 import threading
 
 monitoring_bp = Blueprint('monitoring', __name__)
 
-def check_website_status(url):
+MAX_HISTORY_PAGE = 1000
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_FIELDS = ('timestamp', 'status', 'response_time', 'status_code', 'error_message',
+                 'dns_time', 'connect_time', 'tls_time', 'ttfb', 'bytes_received')
+MAX_BULK_WEBSITES = 1000
+BULK_CHECK_CONCURRENCY = 50
+BULK_CHECK_TIMEOUT = 10
+MAX_BULK_CHECK_WAIT = 100  # websites checked per request without ?stream=1
+LATENCY_WINDOWS = {'day': 1, 'week': 7, 'month': 30}  # days
+
+def check_to_dict(check):
+    return {
+        'timestamp': check.timestamp.isoformat(),
+        'status': check.status,
+        'response_time': check.response_time,
+        'status_code': check.status_code,
+        'error_message': check.error_message,
+        'dns_time': check.dns_time,
+        'connect_time': check.connect_time,
+        'tls_time': check.tls_time,
+        'ttfb': check.ttfb,
+        'bytes_received': check.bytes_received
+    }
+
+def encode_history_cursor(check):
+    """Opaque keyset cursor pointing just past `check` in newest-first order"""
+    raw = f'{check.timestamp.isoformat()}|{check.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_history_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        timestamp, check_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(check_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def normalize_url(url):
+    """Canonical form used to spot duplicate websites; None if the URL is unusable"""
+    url = (url or '').strip()
+    if not url:
+        return None
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    parts = urlsplit(url)
+    if not parts.netloc:
+        return None
+    path = '' if parts.path == '/' else parts.path
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ''))
+
+def check_website_status(url, timeout=BULK_CHECK_TIMEOUT):
     """Check website status and return results"""
     if not url.startswith(('http://', 'https://')):
         url = 'https://' + url
     
     start_time = time.time()
+    timer = PhaseTimer()
     try:
-        response = requests.get(url, timeout=10, allow_redirects=True)
+        with timer:
+            response, bytes_received = fetch(url, timeout)
         response_time = int((time.time() - start_time) * 1000)
         
         if response.status_code == 200:
-            return {
+            result = {
                 'status': 'up',
                 'response_time': response_time,
                 'status_code': response.status_code,
-                'error_message': None
+                'error_message': None,
+                'bytes_received': bytes_received
             }
         else:
-            return {
+            result = {
                 'status': 'down',
                 'response_time': response_time,
                 'status_code': response.status_code,
-                'error_message': f'HTTP {response.status_code}'
+                'error_message': f'HTTP {response.status_code}',
+                'bytes_received': bytes_received
             }
     except Exception as e:
         response_time = int((time.time() - start_time) * 1000)
-        return {
+        result = {
             'status': 'down',
             'response_time': response_time,
             'status_code': None,
-            'error_message': str(e)
+            'error_message': str(e),
+            'bytes_received': None
         }
+    result.update(timer.to_dict())
+    return result
+
+# Shared by bulk checks; at most BULK_CHECK_CONCURRENCY probes in flight per process
+bulk_probe_engine = ProbeEngine(
+    concurrency=BULK_CHECK_CONCURRENCY,
+    timeout=BULK_CHECK_TIMEOUT,
+    probe=check_website_status
+)
 
 @monitoring_bp.route('/check', methods=['POST'])
 def check_website():
@@ -53,18 +136,26 @@ def check_website():
     result = check_website_status(url)
     return jsonify(result)
 
+@monitoring_bp.route('/pool/stats', methods=['GET'])
+@require_scrape_access
+def get_pool_stats():
+    """Connection pool hit/miss statistics for manual checks served by this process"""
+    return jsonify(pool_stats())
+
+@monitoring_bp.route('/dns/stats', methods=['GET'])
+@require_scrape_access
+def get_dns_stats():
+    """DNS cache hit/miss statistics for manual checks served by this process"""
+    return jsonify(dns_stats())
+
 @monitoring_bp.route('/websites', methods=['GET'])
+@require_api_key
+@cached_response('websites')
 def get_websites():
     """Get all websites for authenticated user"""
-    api_key = request.headers.get('X-API-Key')
-    if not api_key:
-        return jsonify({'error': 'API key required'}), 401
-    
-    user = User.query.filter_by(api_key=api_key).first()
-    if not user:
-        return jsonify({'error': 'Invalid API key'}), 401
+    api_user = g.api_user
     
-    websites = Website.query.filter_by(user_id=user.id).all()
+    websites = read_session.query(Website).filter_by(user_id=api_user.user_id).all()
     return jsonify([{
         'id': w.id,
         'name': w.name,
@@ -76,15 +167,10 @@ def get_websites():
     } for w in websites])
 
 @monitoring_bp.route('/websites', methods=['POST'])
+@require_api_key
 def add_website():
     """Add a new website to monitor"""
-    api_key = request.headers.get('X-API-Key')
-    if not api_key:
-        return jsonify({'error': 'API key required'}), 401
-    
-    user = User.query.filter_by(api_key=api_key).first()
-    if not user:
-        return jsonify({'error': 'Invalid API key'}), 401
+    api_user = g.api_user
     
     data = request.get_json()
     name = data.get('name')
@@ -95,30 +181,30 @@ def add_website():
         return jsonify({'error': 'Name and URL are required'}), 400
     
     # Check subscription limits
-    subscription = user.subscription
-    if not subscription:
+    subscription = api_user.subscription
+    if not api_user.has_subscription:
         # Create free subscription
-        subscription = Subscription(
-            user_id=user.id,
+        db.session.add(Subscription(
+            user_id=api_user.user_id,
             plan='free',
             max_websites=5,
             min_check_interval=1800,
             history_days=7
-        )
-        db.session.add(subscription)
+        ))
     
-    website_count = Website.query.filter_by(user_id=user.id).count()
-    if website_count >= subscription.max_websites:
-        return jsonify({'error': f'Maximum {subscription.max_websites} websites allowed for {subscription.plan} plan'}), 403
+    website_count = Website.query.filter_by(user_id=api_user.user_id).count()
+    if website_count >= subscription['max_websites']:
+        return jsonify({'error': f"Maximum {subscription['max_websites']} websites allowed for {subscription['plan']} plan"}), 403
     
-    if check_interval < subscription.min_check_interval:
-        check_interval = subscription.min_check_interval
+    if check_interval < subscription['min_check_interval']:
+        check_interval = subscription['min_check_interval']
     
     website = Website(
-        user_id=user.id,
+        user_id=api_user.user_id,
         name=name,
         url=url,
-        check_interval=check_interval
+        check_interval=check_interval,
+        next_check_at=datetime.utcnow()
     )
     
     db.session.add(website)
@@ -132,18 +218,98 @@ def add_website():
         'message': 'Website added successfully'
     }), 201
 
+@monitoring_bp.route('/websites/bulk', methods=['POST'])
+@require_api_key
+def add_websites_bulk():
+    """Validate, deduplicate and add many websites in one transaction"""
+    api_user = g.api_user
+    
+    data = request.get_json() or {}
+    items = data.get('websites')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'websites must be a non-empty list'}), 400
+    if len(items) > MAX_BULK_WEBSITES:
+        return jsonify({'error': f'At most {MAX_BULK_WEBSITES} websites per request'}), 400
+    
+    subscription = api_user.subscription
+    if not api_user.has_subscription:
+        # Create free subscription
+        db.session.add(Subscription(
+            user_id=api_user.user_id,
+            plan='free',
+            max_websites=5,
+            min_check_interval=1800,
+            history_days=7
+        ))
+    
+    # The limit counts rows; the normalized URL set is only for deduplication (stored URLs may repeat or not normalize)
+    website_count = Website.query.filter_by(user_id=api_user.user_id).count()
+    existing = {normalize_url(url) for (url,) in db.session.query(Website.url).filter_by(user_id=api_user.user_id)}
+    available = subscription['max_websites'] - website_count
+    limit_reason = f"Maximum {subscription['max_websites']} websites allowed for {subscription['plan']} plan"
+    
+    now = datetime.utcnow()
+    websites = []
+    skipped = []
+    seen = set(existing)
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            item = {'url': item}
+        if not isinstance(item, dict):
+            skipped.append({'index': index, 'url': None, 'reason': 'invalid entry'})
+            continue
+        url = normalize_url(item.get('url'))
+        if url is None:
+            skipped.append({'index': index, 'url': item.get('url'), 'reason': 'invalid URL'})
+            continue
+        if url in seen:
+            skipped.append({'index': index, 'url': url, 'reason': 'duplicate'})
+            continue
+        if len(websites) >= available:
+            skipped.append({'index': index, 'url': url, 'reason': limit_reason})
+            continue
+        name = item.get('name')
+        if name is not None and not isinstance(name, str):
+            skipped.append({'index': index, 'url': url, 'reason': 'invalid name'})
+            continue
+        try:
+            check_interval = int(item.get('check_interval', 1800))
+        except (TypeError, ValueError):
+            skipped.append({'index': index, 'url': url, 'reason': 'invalid check_interval'})
+            continue
+        
+        seen.add(url)
+        websites.append(Website(
+            user_id=api_user.user_id,
+            name=(name or urlsplit(url).netloc)[:100],
+            url=url,
+            check_interval=max(check_interval, subscription['min_check_interval']),
+            next_check_at=now
+        ))
+    
+    if websites:
+        db.session.add_all(websites)
+        db.session.flush()
+        created = [{
+            'id': website.id,
+            'name': website.name,
+            'url': website.url,
+            'check_interval': website.check_interval
+        } for website in websites]
+        db.session.commit()
+    else:
+        db.session.rollback()
+        created = []
+    
+    return jsonify({'created': created, 'skipped': skipped}), 201 if created else 200
+
 @monitoring_bp.route('/websites/<int:website_id>', methods=['DELETE'])
+@require_api_key
 def delete_website(website_id):
     """Delete a website"""
-    api_key = request.headers.get('X-API-Key')
-    if not api_key:
-        return jsonify({'error': 'API key required'}), 401
+    api_user = g.api_user
     
-    user = User.query.filter_by(api_key=api_key).first()
-    if not user:
-        return jsonify({'error': 'Invalid API key'}), 401
-    
-    website = Website.query.filter_by(id=website_id, user_id=user.id).first()
+    website = Website.query.filter_by(id=website_id, user_id=api_user.user_id).first()
     if not website:
         return jsonify({'error': 'Website not found'}), 404
     
@@ -152,108 +318,438 @@ def delete_website(website_id):
     
     return jsonify({'message': 'Website deleted successfully'})
 
+@monitoring_bp.route('/websites/<int:website_id>', methods=['PUT'])
+@require_api_key
+def update_website(website_id):
+    """Update a website's name, URL, check interval or active flag"""
+    api_user = g.api_user
+
+    website = Website.query.filter_by(id=website_id, user_id=api_user.user_id).first()
+    if not website:
+        return jsonify({'error': 'Website not found'}), 404
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'A JSON object body is required'}), 400
+    if 'name' in data and not (isinstance(data['name'], str) and data['name'].strip()):
+        return jsonify({'error': 'Name must be a non-empty string'}), 400
+    if 'url' in data and not (isinstance(data['url'], str) and data['url'].strip()):
+        return jsonify({'error': 'URL must be a non-empty string'}), 400
+    if 'check_interval' in data:
+        try:
+            check_interval = int(data['check_interval'])
+        except (TypeError, ValueError):
+            return jsonify({'error': 'check_interval must be a number of seconds'}), 400
+    if 'is_active' in data and not isinstance(data['is_active'], bool):
+        return jsonify({'error': 'is_active must be true or false'}), 400
+
+    if 'name' in data:
+        website.name = data['name']
+    if 'url' in data:
+        website.url = data['url']
+    if 'is_active' in data:
+        website.is_active = data['is_active']
+    if 'check_interval' in data:
+        min_check_interval = api_user.subscription['min_check_interval']
+        website.check_interval = max(check_interval, min_check_interval)
+
+    # Re-time the worker's deadline so the change takes effect without waiting out the old interval
+    if website.last_checked:
+        website.next_check_at = next_check_time(website.id, website.check_interval, website.last_checked)
+    else:
+        website.next_check_at = datetime.utcnow()
+
+    db.session.commit()
+
+    return jsonify({
+        'id': website.id,
+        'name': website.name,
+        'url': website.url,
+        'check_interval': website.check_interval,
+        'is_active': website.is_active,
+        'message': 'Website updated successfully'
+    })
+
 @monitoring_bp.route('/websites/<int:website_id>/history', methods=['GET'])
+@require_api_key
 def get_website_history(website_id):
     """Get uptime history for a website"""
-    api_key = request.headers.get('X-API-Key')
-    if not api_key:
-        return jsonify({'error': 'API key required'}), 401
-    
-    user = User.query.filter_by(api_key=api_key).first()
-    if not user:
-        return jsonify({'error': 'Invalid API key'}), 401
+    api_user = g.api_user
     
-    website = Website.query.filter_by(id=website_id, user_id=user.id).first()
+    website = read_session.query(Website).filter_by(id=website_id, user_id=api_user.user_id).first()
     if not website:
         return jsonify({'error': 'Website not found'}), 404
     
     # Get history based on subscription
-    subscription = user.subscription or Subscription(plan='free', history_days=7)
-    since_date = datetime.utcnow() - timedelta(days=subscription.history_days)
+    now = datetime.utcnow()
+    since_date = now - timedelta(days=api_user.subscription['history_days'])
+    
+    # Bucketed history comes from the rollups instead of raw checks
+    resolution = request.args.get('resolution')
+    if resolution:
+        if resolution not in GRANULARITIES:
+            return jsonify({'error': f"resolution must be one of {', '.join(GRANULARITIES)}"}), 400
+        return jsonify({
+            'resolution': resolution,
+            'summary': uptime_summary(read_session, [website.id], since_date, now),
+            'latency_percentiles': latency_percentiles(read_session, website.id, since_date, now),
+            'buckets': uptime_series(read_session, website.id, since_date, now, resolution)
+        })
     
-    checks = UptimeCheck.query.filter(
+    try:
+        limit = min(max(int(request.args.get('limit', 100)), 1), MAX_HISTORY_PAGE)
+        cursor = decode_history_cursor(request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'error': 'Invalid limit or cursor'}), 400
+    
+    # Keyset page, newest first; the (website_id, timestamp, id) index serves the filter, seek and sort
+    query = read_session.query(
+        UptimeCheck.id,
+        UptimeCheck.timestamp,
+        UptimeCheck.status,
+        UptimeCheck.response_time,
+        UptimeCheck.status_code,
+        UptimeCheck.error_message,
+        UptimeCheck.dns_time,
+        UptimeCheck.connect_time,
+        UptimeCheck.tls_time,
+        UptimeCheck.ttfb,
+        UptimeCheck.bytes_received
+    ).filter(
         UptimeCheck.website_id == website_id,
         UptimeCheck.timestamp >= since_date
-    ).order_by(UptimeCheck.timestamp.desc()).limit(100).all()
+    )
+    if cursor:
+        cursor_timestamp, cursor_id = cursor
+        query = query.filter(or_(
+            UptimeCheck.timestamp < cursor_timestamp,
+            and_(UptimeCheck.timestamp == cursor_timestamp, UptimeCheck.id < cursor_id)
+        ))
+    checks = query.order_by(UptimeCheck.timestamp.desc(), UptimeCheck.id.desc()).limit(limit).all()
+    
+    response = jsonify([check_to_dict(check) for check in checks])
+    if len(checks) == limit:
+        # The body stays a plain list; the next page is advertised in a header
+        response.headers['X-Next-Cursor'] = encode_history_cursor(checks[-1])
+    return response
+
+@monitoring_bp.route('/websites/<int:website_id>/latency', methods=['GET'])
+@require_api_key
+def get_latency_percentiles(website_id):
+    """p50/p95/p99 response time over the last day, week or month, merged from the bucket sketches"""
+    api_user = g.api_user
     
-    return jsonify([{
-        'timestamp': check.timestamp.isoformat(),
-        'status': check.status,
-        'response_time': check.response_time,
-        'status_code': check.status_code,
-        'error_message': check.error_message
-    } for check in checks])
+    website = read_session.query(Website.id).filter_by(id=website_id, user_id=api_user.user_id).first()
+    if not website:
+        return jsonify({'error': 'Website not found'}), 404
+    
+    window = request.args.get('window', 'day')
+    if window not in LATENCY_WINDOWS:
+        return jsonify({'error': f"window must be one of {', '.join(LATENCY_WINDOWS)}"}), 400
+    
+    # Never reach further back than the plan keeps history
+    days = min(LATENCY_WINDOWS[window], api_user.subscription['history_days'])
+    now = datetime.utcnow()
+    result = latency_percentiles(read_session, website_id, now - timedelta(days=days), now)
+    result['window'] = window
+    return jsonify(result)
+
+@monitoring_bp.route('/websites/<int:website_id>/recent', methods=['GET'])
+@require_api_key
+def get_recent_checks(website_id):
+    """Latest checks for a website (sparklines), served from the in-memory ring buffer"""
+    api_user = g.api_user
+    
+    website = Website.query.filter_by(id=website_id, user_id=api_user.user_id).first()
+    if not website:
+        return jsonify({'error': 'Website not found'}), 404
+    
+    limit = request.args.get('limit', type=int)
+    return jsonify(recent_checks.recent(db.session, website_id, limit))
+
+@monitoring_bp.route('/recent/stats', methods=['GET'])
+@require_scrape_access
+def get_recent_checks_stats():
+    """Ring buffer occupancy and memory use for this process, and the check tail feeding it"""
+    return jsonify(dict(recent_checks.stats(), tail=check_tail.stats()))
+
+@monitoring_bp.route('/events/token', methods=['POST'])
+@require_api_key
+def issue_status_stream_token():
+    """Short-lived token for opening the status stream from an EventSource"""
+    return jsonify({
+        'token': status_broker.issue_token(g.api_user.user_id),
+        'expires_in': STATUS_STREAM_TOKEN_TTL
+    })
+
+@monitoring_bp.route('/events', methods=['GET'])
+def stream_status_events():
+    """Server-Sent Events stream of status transitions and website counts for the caller"""
+    # EventSource cannot set headers, so browsers pass a short-lived ?token= from /events/token;
+    # API keys are only accepted as a header, never in the URL where access logs would keep them
+    api_key = request.headers.get('X-API-Key')
+    token = request.args.get('token')
+    if api_key:
+        api_user = authenticate(api_key)
+        if api_user is None:
+            return jsonify({'error': 'Invalid API key'}), 401
+        user_id = api_user.user_id
+    elif token:
+        user_id = status_broker.read_token(token)
+        if user_id is None:
+            return jsonify({'error': 'Invalid or expired stream token'}), 401
+    else:
+        return jsonify({'error': 'API key or stream token required'}), 401
+    
+    # Each open stream holds a server thread, so their number is capped
+    subscriber = status_broker.subscribe(db.session, user_id)
+    if subscriber is None:
+        return jsonify({'error': 'Too many open status streams, try again later'}), 503, {'Retry-After': '30'}
+    
+    def generate():
+        # No app context is held while the connection idles; the broker does all DB reads
+        yield 'retry: 5000\n\n'
+        while True:
+            frames = subscriber.drain(STATUS_STREAM_KEEPALIVE)
+            yield ''.join(frames) if frames else ': keepalive\n\n'
+    
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    response.call_on_close(lambda: status_broker.unsubscribe(subscriber))
+    return response
+
+@monitoring_bp.route('/cache/stats', methods=['GET'])
+@require_scrape_access
+def get_response_cache_stats():
+    """Response cache hit, miss and 304 counts for this process"""
+    return jsonify(response_cache.stats())
+
+@monitoring_bp.route('/events/stats', methods=['GET'])
+@require_scrape_access
+def get_status_event_stats():
+    """Open status streams and events published by this process"""
+    return jsonify(status_broker.stats())
+
+@monitoring_bp.route('/profile/stats', methods=['GET'])
+@require_api_key
+@require_local_profiler
+def get_profile_stats():
+    """Per-route wall time, SQL and ORM load figures for this process (PROFILE_REQUESTS=true)"""
+    return jsonify(request_profiler.stats())
+
+@monitoring_bp.route('/profile/slow', methods=['GET'])
+@require_api_key
+@require_local_profiler
+def get_slow_log():
+    """Recent slow requests with their slowest statements, and slow statements on their own"""
+    return jsonify({
+        'requests': list(request_profiler.slow_requests),
+        'queries': list(request_profiler.slow_queries)
+    })
+
+@monitoring_bp.route('/profile/stacks', methods=['GET'])
+@require_api_key
+@require_local_profiler
+def get_profile_stacks():
+    """Collapsed stack samples for the sampled endpoint, one `stack count` per line"""
+    return Response(request_profiler.sampler.collapsed(), mimetype='text/plain')
+
+@monitoring_bp.route('/profile/sample', methods=['PUT'])
+@require_api_key
+@require_local_profiler
+def set_profile_sample():
+    """Switch stack sampling to one endpoint (e.g. monitoring.get_dashboard_stats), or off with null"""
+    data = request.get_json(silent=True)
+    endpoint = data.get('endpoint') if isinstance(data, dict) else None
+    if not isinstance(data, dict) or not (endpoint is None or isinstance(endpoint, str)):
+        return jsonify({'error': 'Send {"endpoint": "<blueprint.view>"} or {"endpoint": null}'}), 400
+    if endpoint is not None and endpoint not in current_app.view_functions:
+        return jsonify({'error': f'Unknown endpoint {endpoint}'}), 400
+
+    request_profiler.sample(endpoint)
+    return jsonify({'sample_endpoint': request_profiler.sample_endpoint})
+
+@monitoring_bp.route('/websites/<int:website_id>/export', methods=['GET'])
+@require_api_key
+def export_website_history(website_id):
+    """Stream the full history window for a website as NDJSON or CSV"""
+    api_user = g.api_user
+    
+    website = read_session.query(Website).filter_by(id=website_id, user_id=api_user.user_id).first()
+    if not website:
+        return jsonify({'error': 'Website not found'}), 404
+    
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    
+    since_date = datetime.utcnow() - timedelta(days=api_user.subscription['history_days'])
+    
+    def generate():
+        # Rows are serialized as they come off the cursor, oldest first, so memory stays flat
+        rows = read_session.query(
+            UptimeCheck.id,
+            UptimeCheck.timestamp,
+            UptimeCheck.status,
+            UptimeCheck.response_time,
+            UptimeCheck.status_code,
+            UptimeCheck.error_message,
+            UptimeCheck.dns_time,
+            UptimeCheck.connect_time,
+            UptimeCheck.tls_time,
+            UptimeCheck.ttfb,
+            UptimeCheck.bytes_received
+        ).filter(
+            UptimeCheck.website_id == website_id,
+            UptimeCheck.timestamp >= since_date
+        ).order_by(
+            UptimeCheck.timestamp, UptimeCheck.id
+        ).execution_options(stream_results=True).yield_per(EXPORT_CHUNK_SIZE)
+        
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if export_format == 'csv' else None
+        if writer:
+            writer.writerow(EXPORT_FIELDS)
+        
+        pending = 0
+        for check in rows:
+            record = check_to_dict(check)
+            if writer:
+                writer.writerow([record[field] for field in EXPORT_FIELDS])
+            else:
+                buffer.write(json.dumps(record))
+                buffer.write('\n')
+            pending += 1
+            if pending >= EXPORT_CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        if buffer.tell():
+            yield buffer.getvalue()
+    
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    extension = 'csv' if export_format == 'csv' else 'ndjson'
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=website-{website_id}-history.{extension}'}
+    )
 
 @monitoring_bp.route('/websites/<int:website_id>/check', methods=['POST'])
+@require_api_key
 def check_website_now(website_id):
     """Manually trigger a check for a specific website"""
-    api_key = request.headers.get('X-API-Key')
-    if not api_key:
-        return jsonify({'error': 'API key required'}), 401
-    
-    user = User.query.filter_by(api_key=api_key).first()
-    if not user:
-        return jsonify({'error': 'Invalid API key'}), 401
+    api_user = g.api_user
     
-    website = Website.query.filter_by(id=website_id, user_id=user.id).first()
+    website = Website.query.filter_by(id=website_id, user_id=api_user.user_id).first()
     if not website:
         return jsonify({'error': 'Website not found'}), 404
     
     result = check_website_status(website.url)
     
-    # Save check result
-    check = UptimeCheck(
-        website_id=website.id,
-        status=result['status'],
-        response_time=result['response_time'],
-        status_code=result['status_code'],
-        error_message=result['error_message']
+    # Queue the check result; the writer flushes it with other checks in one transaction
+    now = datetime.utcnow()
+    check_writer.add(
+        website.id,
+        result,
+        checked_at=now,
+        next_check_at=next_check_time(website.id, website.check_interval, now)
     )
     
-    website.current_status = result['status']
-    website.last_checked = datetime.utcnow()
-    
-    db.session.add(check)
-    db.session.commit()
-    
     return jsonify(result)
 
-@monitoring_bp.route('/dashboard/stats', methods=['GET'])
-def get_dashboard_stats():
-    """Get dashboard statistics for user"""
-    api_key = request.headers.get('X-API-Key')
-    if not api_key:
-        return jsonify({'error': 'API key required'}), 401
+@monitoring_bp.route('/websites/check', methods=['POST'])
+@require_api_key
+def check_websites_bulk():
+    """Check all (or the listed) websites of the user concurrently; ?stream=1 returns NDJSON as results land"""
+    api_user = g.api_user
+    
+    data = request.get_json(silent=True) or {}
+    website_ids = data.get('website_ids') if isinstance(data, dict) else None
+    if website_ids is not None and not (
+        isinstance(website_ids, list)
+        and all(isinstance(website_id, int) and not isinstance(website_id, bool) for website_id in website_ids)
+    ):
+        return jsonify({'error': 'website_ids must be a list of website ids'}), 400
+    
+    query = db.session.query(Website.id, Website.url, Website.check_interval).filter(
+        Website.user_id == api_user.user_id
+    )
+    if website_ids:
+        query = query.filter(Website.id.in_(website_ids))
+    else:
+        query = query.filter(Website.is_active == True)
+    websites = {website_id: (url, check_interval) for website_id, url, check_interval in query}
+    stream = request.args.get('stream') in ('1', 'true')
+    if not stream and len(websites) > MAX_BULK_CHECK_WAIT:
+        return jsonify({'error': f'More than {MAX_BULK_CHECK_WAIT} websites; use ?stream=1 to check them all'}), 400
+    
+    def record(website_id, result):
+        now = datetime.utcnow()
+        check_writer.add(
+            website_id,
+            result,
+            checked_at=now,
+            next_check_at=next_check_time(website_id, websites[website_id][1], now)
+        )
+        return dict(result, website_id=website_id)
     
-    user = User.query.filter_by(api_key=api_key).first()
-    if not user:
-        return jsonify({'error': 'Invalid API key'}), 401
+    targets = [(website_id, url) for website_id, (url, _) in websites.items()]
+    if not stream:
+        results, _ = bulk_probe_engine.run(targets, record)
+        return jsonify([dict(result, website_id=website_id) for website_id, result in results])
     
-    websites = Website.query.filter_by(user_id=user.id).all()
-    total_websites = len(websites)
-    up_websites = len([w for w in websites if w.current_status == 'up'])
-    down_websites = len([w for w in websites if w.current_status == 'down'])
+    # Probes run on their own thread and results are written out as each one completes
+    landed = queue.Queue()
+    done = object()
     
-    # Calculate average uptime for last 24 hours
-    since_24h = datetime.utcnow() - timedelta(hours=24)
-    total_checks = 0
-    up_checks = 0
+    def probe_all():
+        try:
+            bulk_probe_engine.run(targets, lambda website_id, result: landed.put(record(website_id, result)))
+        finally:
+            landed.put(done)
     
-    for website in websites:
-        checks = UptimeCheck.query.filter(
-            UptimeCheck.website_id == website.id,
-            UptimeCheck.timestamp >= since_24h
-        ).all()
-        total_checks += len(checks)
-        up_checks += len([c for c in checks if c.status == 'up'])
+    threading.Thread(target=probe_all, name='bulk-check', daemon=True).start()
     
-    uptime_percentage = (up_checks / total_checks * 100) if total_checks > 0 else 100
+    def generate():
+        while True:
+            item = landed.get()
+            if item is done:
+                return
+            yield json.dumps(item) + '\n'
     
-    return jsonify({
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def compute_dashboard_stats(session, user_id):
+    """Website status counts and 24h uptime for a user in two aggregate queries"""
+    total_websites, up_websites, down_websites = session.query(
+        func.count(Website.id),
+        func.coalesce(func.sum(case((Website.current_status == 'up', 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Website.current_status == 'down', 1), else_=0)), 0)
+    ).filter(Website.user_id == user_id).one()
+    
+    # Average uptime for the last 24 hours, read from the rollup buckets
+    now = datetime.utcnow()
+    user_websites = select(Website.id).where(Website.user_id == user_id)
+    summary = uptime_summary(session, user_websites, now - timedelta(hours=24), now)
+    
+    return {
         'total_websites': total_websites,
         'up_websites': up_websites,
         'down_websites': down_websites,
-        'uptime_percentage': round(uptime_percentage, 2),
-        'subscription': user.subscription.plan if user.subscription else 'free'
-    })
+        'uptime_percentage': round(summary['uptime_percentage'], 2)
+    }
 
+@monitoring_bp.route('/dashboard/stats', methods=['GET'])
+@require_api_key
+@cached_response('dashboard_stats')
+def get_dashboard_stats():
+    """Get dashboard statistics for user"""
+    api_user = g.api_user
+    
+    stats = compute_dashboard_stats(read_session, api_user.user_id)
+    stats['subscription'] = api_user.plan
+    return jsonify(stats)
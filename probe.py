@@ -0,0 +1,552 @@
+"""
+UptimePro Probe Engine
+Runs website checks concurrently with a bounded number of probes in flight
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from src.dns_cache import dns_cache
+from src.metrics import probe_duration, probes_in_flight
+
+logger = logging.getLogger(__name__)
+
+PROBE_CONCURRENCY = int(os.getenv('PROBE_CONCURRENCY', 100))
+PROBE_TIMEOUT = int(os.getenv('PROBE_TIMEOUT', 30))
+PROBE_TICK_INTERVAL = 1.0  # seconds between on_tick calls while a batch runs
+USER_AGENT = 'UptimePro Monitor/1.0'
+
+# Connection pool settings shared by the worker and the manual-check endpoints
+PROBE_POOL_HOSTS = int(os.getenv('PROBE_POOL_HOSTS', 500))  # hosts with a live pool
+PROBE_POOL_PER_HOST = int(os.getenv('PROBE_POOL_PER_HOST', 4))  # connections per host
+PROBE_POOL_IDLE_TIMEOUT = float(os.getenv('PROBE_POOL_IDLE_TIMEOUT', 120))  # seconds
+
+# Body handling: stop reading after this many bytes (0 = headers only, -1 = whole page)
+PROBE_MAX_BODY_BYTES = int(os.getenv('PROBE_MAX_BODY_BYTES', 64 * 1024))
+PROBE_USE_HEAD = os.getenv('PROBE_USE_HEAD', 'false').lower() == 'true'  # HEAD first, GET if refused
+HEAD_FALLBACK_STATUSES = frozenset({405, 501})
+PROBE_READ_CHUNK = 8192
+
+# Launch rate caps (probes per second); 0 disables a cap
+PROBE_RATE = float(os.getenv('PROBE_RATE', 100))
+PROBE_HOST_RATE = float(os.getenv('PROBE_HOST_RATE', 2))
+
+_phases = threading.local()
+
+
+def _record_phase(name, seconds):
+    timings = getattr(_phases, 'timings', None)
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+class PhaseTimer:
+    """Collects DNS, connect, TLS and time-to-first-byte durations of requests made by this thread.
+
+    Phases only happen on new connections; a request served by a pooled
+    keep-alive connection reports None for dns, connect and tls. Durations
+    of redirect hops are summed.
+    """
+
+    def __enter__(self):
+        self.timings = {}
+        _phases.timings = self.timings
+        return self
+
+    def __exit__(self, *exc_info):
+        _phases.timings = None
+
+    def to_dict(self):
+        def ms(name):
+            return int(self.timings[name] * 1000) if name in self.timings else None
+
+        ttfb = None
+        if 'send' in self.timings:
+            setup = sum(self.timings.get(name, 0.0) for name in ('dns', 'connect', 'tls'))
+            ttfb = max(0, int((self.timings['send'] - setup) * 1000))
+        return {
+            'dns_time': ms('dns'),
+            'connect_time': ms('connect'),
+            'tls_time': ms('tls'),
+            'ttfb': ttfb
+        }
+
+
+class TimedConnectionMixin:
+    """Resolves through dns_cache and times DNS and TCP connect separately"""
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        try:
+            addresses = dns_cache.resolve(self._dns_host)
+        except socket.gaierror as e:
+            raise NewConnectionError(self, f"Failed to resolve '{self.host}' ({e})") from e
+        finally:
+            resolved = time.perf_counter()
+            _record_phase('dns', resolved - start)
+
+        # Connect to each address in turn, letting urllib3 map socket errors as usual
+        host = self._dns_host
+        try:
+            for n, (_, address) in enumerate(addresses):
+                self._dns_host = address
+                try:
+                    return super()._new_conn()
+                except (ConnectTimeoutError, NewConnectionError):
+                    if n == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = host
+            connected = time.perf_counter()
+            _record_phase('connect', connected - resolved)
+            self._socket_seconds = connected - start
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        self._socket_seconds = 0.0
+        start = time.perf_counter()
+        super().connect()
+        _record_phase('tls', max(0.0, time.perf_counter() - start - self._socket_seconds))
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that expires idle host pools and counts connection reuse.
+
+    urllib3 keeps one pool per (scheme, host, port) holding at most
+    `pool_maxsize` keep-alive connections; with `pool_block` set, extra
+    concurrent requests to the same host wait for a free connection instead
+    of opening more. A request served by an existing connection is a pool
+    hit, one that had to open a new connection is a miss.
+    """
+
+    def __init__(self, idle_timeout=PROBE_POOL_IDLE_TIMEOUT, **kwargs):
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self._last_prune = time.monotonic()
+        self._retired_requests = 0
+        self._retired_connections = 0
+        self._expired_pools = 0
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        # Connections resolve through the DNS cache and report their phase timings
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool
+        }
+        # Keep the counters of pools evicted by the pool manager's LRU
+        dispose = self.poolmanager.pools.dispose_func
+
+        def retire(pool):
+            self._retire(pool)
+            if dispose is not None:
+                dispose(pool)
+
+        self.poolmanager.pools.dispose_func = retire
+
+    def _retire(self, pool):
+        self._retired_requests += pool.num_requests
+        self._retired_connections += pool.num_connections
+
+    def send(self, request, **kwargs):
+        start = time.perf_counter()
+        response = super().send(request, **kwargs)
+        _record_phase('send', time.perf_counter() - start)
+        now = time.monotonic()
+        parsed = urlparse(request.url)
+        with self._lock:
+            self._last_used[(parsed.scheme, parsed.hostname, parsed.port)] = now
+        if now - self._last_prune >= self.idle_timeout / 2:
+            self.prune_idle(now)
+        return response
+
+    def prune_idle(self, now=None):
+        """Close the pools of hosts that have not been probed for idle_timeout seconds"""
+        now = now or time.monotonic()
+        with self._lock:
+            self._last_prune = now
+            expired = {key for key, used in self._last_used.items() if now - used >= self.idle_timeout}
+            if not expired:
+                return 0
+
+            closed = 0
+            pools = self.poolmanager.pools
+            for pool_key in list(pools.keys()):
+                default_port = 443 if pool_key.key_scheme == 'https' else 80
+                port = pool_key.key_port if pool_key.key_port != default_port else None
+                if (pool_key.key_scheme, pool_key.key_host, port) in expired:
+                    del pools[pool_key]  # disposes (and retires) the pool
+                    closed += 1
+
+            for key in expired:
+                del self._last_used[key]
+            self._expired_pools += closed
+            return closed
+
+    def stats(self):
+        with self._lock:
+            requests_made = self._retired_requests
+            connections = self._retired_connections
+            live_pools = 0
+            for pool_key in list(self.poolmanager.pools.keys()):
+                pool = self.poolmanager.pools.get(pool_key)
+                if pool is None:
+                    continue
+                live_pools += 1
+                requests_made += pool.num_requests
+                connections += pool.num_connections
+
+        hits = max(0, requests_made - connections)
+        return {
+            'requests': requests_made,
+            'hits': hits,
+            'misses': connections,
+            'hit_rate': round(hits / requests_made, 4) if requests_made else 0.0,
+            'live_pools': live_pools,
+            'expired_pools': self._expired_pools
+        }
+
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """Process-wide keep-alive session used for every probe"""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                session = requests.Session()
+                adapter = PooledHTTPAdapter(
+                    pool_connections=PROBE_POOL_HOSTS,
+                    pool_maxsize=PROBE_POOL_PER_HOST,
+                    pool_block=True
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['User-Agent'] = USER_AGENT
+                # Probes must not carry cookies from one site check to the next
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                _http_session = session
+    return _http_session
+
+
+def pool_stats():
+    """Connection pool hit/miss counters for this process"""
+    return get_http_session().get_adapter('https://').stats()
+
+
+def dns_stats():
+    """DNS cache hit/miss counters for this process"""
+    return dns_cache.stats()
+
+
+def _header_bytes(response):
+    """Approximate size of the status line and headers as sent on the wire"""
+    return 17 + len(response.reason or '') + sum(len(k) + len(v) + 4 for k, v in response.headers.items())
+
+
+def fetch(url, timeout=PROBE_TIMEOUT, max_body=PROBE_MAX_BODY_BYTES, use_head=PROBE_USE_HEAD):
+    """Request `url` reading at most `max_body` bytes of the body; returns (response, bytes_received).
+
+    The body is streamed and dropped, never kept. Pages that end within the
+    cap leave their connection in the pool; a page cut off at the cap costs
+    its connection. With `use_head`, a HEAD is tried first and GET is only
+    sent if the server refuses HEAD (405/501).
+    """
+    session = get_http_session()
+    received = 0
+    if use_head:
+        response = session.head(url, timeout=timeout, allow_redirects=True)
+        received += sum(_header_bytes(hop) for hop in response.history + [response])
+        if response.status_code not in HEAD_FALLBACK_STATUSES:
+            return response, received
+
+    response = session.get(url, timeout=timeout, stream=True)
+    try:
+        # Redirect hops have already been read in full by requests
+        received += sum(_header_bytes(hop) + len(hop.content or b'') for hop in response.history)
+        received += _header_bytes(response)
+        if max_body != 0:
+            chunk_size = PROBE_READ_CHUNK if max_body < 0 else min(PROBE_READ_CHUNK, max_body)
+            for _ in response.iter_content(chunk_size):
+                if 0 < max_body <= response.raw.tell():
+                    break
+        received += response.raw.tell()  # compressed bytes as transferred
+    finally:
+        response.close()
+    return response, received
+
+
+def probe_url(url, timeout=PROBE_TIMEOUT):
+    """Probe a single URL and return status, response_time and status_message"""
+    start_time = time.time()
+    status_code = None
+    bytes_received = None
+    timer = PhaseTimer()
+    try:
+        with timer:
+            response, bytes_received = fetch(url, timeout)
+        response_time = int((time.time() - start_time) * 1000)  # Convert to milliseconds
+        status_code = response.status_code
+
+        if response.status_code == 200:
+            status = 'up'
+            status_message = 'OK'
+        else:
+            status = 'down'
+            status_message = f'HTTP {response.status_code}'
+
+    except requests.exceptions.Timeout:
+        status = 'down'
+        status_message = 'Timeout'
+        response_time = timeout * 1000
+
+    except requests.exceptions.ConnectionError:
+        status = 'down'
+        status_message = 'Connection Error'
+        response_time = 0
+
+    except Exception as e:
+        status = 'down'
+        status_message = str(e)[:255]
+        response_time = 0
+
+    return dict({
+        'status': status,
+        'response_time': response_time,
+        'status_code': status_code,
+        'status_message': status_message,
+        'bytes_received': bytes_received
+    }, **timer.to_dict())
+
+
+class CycleStats:
+    """Throughput figures for one batch of probes"""
+
+    def __init__(self, checks, up, down, duration, bytes_received=0, skipped=0):
+        self.checks = checks
+        self.up = up
+        self.down = down
+        self.duration = duration
+        self.bytes_received = bytes_received
+        self.skipped = skipped  # targets refused by `accept` or abandoned by `on_tick`
+
+    @property
+    def checks_per_second(self):
+        return self.checks / self.duration if self.duration > 0 else 0.0
+
+    def to_dict(self):
+        return {
+            'checks': self.checks,
+            'up': self.up,
+            'down': self.down,
+            'duration': round(self.duration, 3),
+            'checks_per_second': round(self.checks_per_second, 2),
+            'bytes_received': self.bytes_received,
+            'skipped': self.skipped
+        }
+
+    def __repr__(self):
+        return (f'<CycleStats {self.checks} checks in {self.duration:.2f}s '
+                f'({self.checks_per_second:.2f}/s)>')
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`.
+
+    `reserve` always takes a token, letting the balance go negative, and
+    returns how long the caller must wait for it; callers that reserve in
+    order are released in that order at exactly `rate` per second.
+    """
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def reserve(self, now=None):
+        now = now or time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class ProbeRateLimiter:
+    """A global token bucket plus one per destination host (LRU-bounded)"""
+
+    def __init__(self, rate=PROBE_RATE, host_rate=PROBE_HOST_RATE, max_hosts=PROBE_POOL_HOSTS):
+        self.bucket = TokenBucket(rate) if rate > 0 else None
+        self.host_rate = host_rate
+        self.max_hosts = max_hosts
+        self._hosts = OrderedDict()
+        self._lock = threading.Lock()
+        self.delayed = 0
+
+    def reserve(self, url):
+        """Seconds to wait before probing `url`"""
+        now = time.monotonic()
+        with self._lock:
+            wait = self.bucket.reserve(now) if self.bucket is not None else 0.0
+            if self.host_rate > 0:
+                host = urlparse(url).hostname
+                bucket = self._hosts.get(host)
+                if bucket is None:
+                    bucket = self._hosts[host] = TokenBucket(self.host_rate)
+                    while len(self._hosts) > self.max_hosts:
+                        self._hosts.popitem(last=False)
+                self._hosts.move_to_end(host)
+                wait = max(wait, bucket.reserve(now))
+            if wait > 0:
+                self.delayed += 1
+            return wait
+
+
+class ProbeEngine:
+    """Asyncio driver that keeps at most `concurrency` probes in flight.
+
+    Probes are blocking calls run on a dedicated thread pool; the event loop
+    only schedules them and hands each result back to the caller's thread as
+    it completes, so callers can keep using a non thread-safe DB session.
+    An optional ProbeRateLimiter spaces out probe launches; each result
+    carries the wall-clock time its probe started as `started_at`.
+    """
+
+    def __init__(self, concurrency=PROBE_CONCURRENCY, timeout=PROBE_TIMEOUT, probe=probe_url, limiter=None):
+        self.concurrency = max(1, int(concurrency))
+        self.timeout = timeout
+        self.probe = probe
+        self.limiter = limiter
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.concurrency,
+            thread_name_prefix='probe'
+        )
+
+    async def _probe_one(self, semaphore, key, url, accept=None):
+        if self.limiter is not None:
+            wait = self.limiter.reserve(url)
+            if wait > 0:
+                await asyncio.sleep(wait)
+        async with semaphore:
+            if accept is not None and not accept(key):
+                return key, None
+            loop = asyncio.get_running_loop()
+            started_at = time.time()
+            probes_in_flight.inc()
+            try:
+                result = await loop.run_in_executor(self._executor, self.probe, url, self.timeout)
+            except Exception as e:
+                result = {
+                    'status': 'down',
+                    'response_time': 0,
+                    'status_code': None,
+                    'status_message': str(e)[:255]
+                }
+            finally:
+                probes_in_flight.dec()
+            probe_duration.observe(time.time() - started_at, result['status'])
+            result['started_at'] = started_at
+            return key, result
+
+    async def _tick(self, on_tick, tasks):
+        while True:
+            await asyncio.sleep(PROBE_TICK_INTERVAL)
+            try:
+                keep_going = on_tick()
+            except Exception as e:
+                logger.error(f"Probe batch tick failed: {str(e)}")
+                continue
+            if keep_going is False:
+                for task in tasks:
+                    task.cancel()  # probes already on the thread pool finish there, unreported
+                return
+
+    async def probe_many(self, targets, on_result=None, on_tick=None, accept=None):
+        """Probe (key, url) pairs concurrently, calling on_result(key, result) as each lands.
+
+        Returns (results, CycleStats) for this call only; the engine keeps no
+        per-run state, so concurrent callers never share one.
+        `accept(key)` is asked right before each probe launches and can veto
+        it. `on_tick()` is called every PROBE_TICK_INTERVAL seconds on the
+        caller's thread while probes are pending; returning False abandons
+        whatever has not reported yet. All three run on the caller's thread.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = [asyncio.ensure_future(self._probe_one(semaphore, key, url, accept)) for key, url in targets]
+        ticker = asyncio.ensure_future(self._tick(on_tick, tasks)) if on_tick is not None and tasks else None
+
+        start_time = time.monotonic()
+        results = []
+        up = 0
+        skipped = 0
+        for future in asyncio.as_completed(tasks):
+            try:
+                key, result = await future
+            except asyncio.CancelledError:
+                skipped += 1
+                continue
+            if result is None:
+                skipped += 1
+                continue
+            if result['status'] == 'up':
+                up += 1
+            results.append((key, result))
+            if on_result is not None:
+                try:
+                    on_result(key, result)
+                except Exception as e:
+                    logger.error(f"Error handling probe result for {key}: {str(e)}")
+
+        if ticker is not None:
+            ticker.cancel()
+
+        stats = CycleStats(
+            checks=len(results),
+            up=up,
+            down=len(results) - up,
+            duration=time.monotonic() - start_time,
+            bytes_received=sum(result.get('bytes_received') or 0 for _, result in results),
+            skipped=skipped
+        )
+        return results, stats
+
+    def run(self, targets, on_result=None, on_tick=None, accept=None):
+        """Blocking entry point for synchronous callers such as the worker loop"""
+        return asyncio.run(self.probe_many(list(targets), on_result, on_tick, accept))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
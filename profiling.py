@@ -0,0 +1,282 @@
+"""
+UptimePro Request Profiling
+Opt-in per-route wall time, SQL and ORM load figures, slow logs and a stack sampler
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from functools import wraps
+
+from flask import g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Mapper
+
+logger = logging.getLogger(__name__)
+
+PROFILE_REQUESTS = os.getenv('PROFILE_REQUESTS', 'false').lower() == 'true'
+PROFILE_WINDOW = int(os.getenv('PROFILE_WINDOW', 1000))  # requests kept per route for percentiles
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 500))
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))
+SLOW_LOG_SIZE = int(os.getenv('SLOW_LOG_SIZE', 100))  # entries kept in each slow log
+SLOW_LOG_STATEMENTS = 10  # statements kept with a slow request, slowest first
+PROFILE_SAMPLE_ENDPOINT = os.getenv('PROFILE_SAMPLE_ENDPOINT', '')  # e.g. monitoring.get_dashboard_stats
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.005))  # seconds between stack samples
+PROFILE_SAMPLE_STACKS = 5000  # distinct stacks kept
+PROFILE_LOCAL_ADDRS = ('127.0.0.1', '::1')  # clients allowed to read profiles
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class RouteStats:
+    """Bounded recent history for one route: (wall_ms, queries, sql_ms, objects) per request"""
+
+    __slots__ = ('requests', 'recent')
+
+    def __init__(self, window):
+        self.requests = 0
+        self.recent = deque(maxlen=window)
+
+    def add(self, sample):
+        self.requests += 1
+        self.recent.append(sample)
+
+    def to_dict(self):
+        recent = list(self.recent)
+        walls = [sample[0] for sample in recent]
+        count = len(recent) or 1
+        return {
+            'requests': self.requests,
+            'wall_ms_p50': round(_percentile(walls, 0.50), 2),
+            'wall_ms_p95': round(_percentile(walls, 0.95), 2),
+            'wall_ms_max': round(max(walls, default=0.0), 2),
+            'queries_avg': round(sum(sample[1] for sample in recent) / count, 2),
+            'queries_max': max((sample[1] for sample in recent), default=0),
+            'sql_ms_avg': round(sum(sample[2] for sample in recent) / count, 2),
+            'objects_loaded_avg': round(sum(sample[3] for sample in recent) / count, 2),
+            'objects_loaded_max': max((sample[3] for sample in recent), default=0)
+        }
+
+
+class StackSampler:
+    """Periodically records the Python stack of threads serving the sampled endpoint.
+
+    Only threads registered through `track` are sampled, so the cost is one
+    sys._current_frames() call per interval while such a request is running
+    and nothing otherwise. Stacks are kept in collapsed form
+    ("module:function;module:function"), ready for flamegraph tooling.
+    """
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL, max_stacks=PROFILE_SAMPLE_STACKS):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.stacks = Counter()
+        self.samples = 0
+        self._threads = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def track(self, thread_id):
+        with self._lock:
+            self._threads.add(thread_id)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def untrack(self, thread_id):
+        with self._lock:
+            self._threads.discard(thread_id)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                threads = set(self._threads)
+            if not threads:
+                self._wakeup.clear()
+                self._wakeup.wait()
+                continue
+            frames = sys._current_frames()
+            for thread_id in threads:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = ';'.join(f'{summary.filename.rsplit(os.sep, 1)[-1]}:{summary.name}'
+                                 for summary in traceback.extract_stack(frame))
+                with self._lock:
+                    if stack in self.stacks or len(self.stacks) < self.max_stacks:
+                        self.stacks[stack] += 1
+                    self.samples += 1
+            time.sleep(self.interval)
+
+    def collapsed(self):
+        with self._lock:
+            return '\n'.join(f'{stack} {count}' for stack, count in self.stacks.most_common()) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self.stacks.clear()
+            self.samples = 0
+
+
+class RequestProfiler:
+    """Per-route request figures for the API process, off unless PROFILE_REQUESTS=true.
+
+    Each request records its wall time, the number and total time of SQL
+    statements it ran and how many ORM objects it loaded. Requests slower
+    than `slow_request_ms` are logged with their slowest statements, and
+    any statement slower than `slow_query_ms` is logged on its own. One
+    endpoint at a time can additionally be stack-sampled, chosen with
+    PROFILE_SAMPLE_ENDPOINT or switched at runtime through `sample`.
+    """
+
+    def __init__(self, enabled=PROFILE_REQUESTS, window=PROFILE_WINDOW, slow_request_ms=SLOW_REQUEST_MS,
+                 slow_query_ms=SLOW_QUERY_MS, sample_endpoint=PROFILE_SAMPLE_ENDPOINT):
+        self.enabled = enabled
+        self.window = window
+        self.slow_request_ms = slow_request_ms
+        self.slow_query_ms = slow_query_ms
+        self.sample_endpoint = sample_endpoint or None
+        self.sampler = StackSampler()
+        self.slow_requests = deque(maxlen=SLOW_LOG_SIZE)
+        self.slow_queries = deque(maxlen=SLOW_LOG_SIZE)
+        self._routes = {}  # (method, rule) -> RouteStats
+        self._lock = threading.Lock()
+        self._installed = False
+
+    def init_app(self, app):
+        if not self.enabled:
+            return
+
+        if not self._installed:
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            event.listen(Engine, 'handle_error', self._handle_error)
+            event.listen(Mapper, 'load', self._count_load)
+            self._installed = True
+
+        @app.before_request
+        def _start_profile():
+            g._profile = {'start': time.perf_counter(), 'queries': 0, 'sql_ms': 0.0, 'objects': 0, 'statements': []}
+            if self.sample_endpoint and request.endpoint == self.sample_endpoint:
+                g._profile['sampled'] = threading.get_ident()
+                self.sampler.track(g._profile['sampled'])
+
+        @app.teardown_request
+        def _finish_profile(exc):
+            profile = g.pop('_profile', None)
+            if profile is None:
+                return
+            if 'sampled' in profile:
+                self.sampler.untrack(profile['sampled'])
+            self.record(request.method, request.url_rule.rule if request.url_rule is not None else 'unmatched',
+                        (time.perf_counter() - profile['start']) * 1000, profile)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_profile_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('_profile_start')
+        if not started:
+            return
+        elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+        profile = g.get('_profile') if has_request_context() else None
+        if profile is not None:
+            profile['queries'] += 1
+            profile['sql_ms'] += elapsed_ms
+            profile['statements'].append((elapsed_ms, statement))
+        if elapsed_ms >= self.slow_query_ms:
+            route = request.path if has_request_context() else None
+            self.slow_queries.append({
+                'ms': round(elapsed_ms, 2),
+                'statement': statement,
+                'route': route,
+                'at': time.time()
+            })
+            logger.warning(f"Slow query ({elapsed_ms:.1f} ms) on {route}: {statement}")
+
+    def _handle_error(self, context):
+        # A failed statement never reaches after_cursor_execute; drop its start time
+        started = context.connection.info.get('_profile_start') if context.connection is not None else None
+        if started:
+            started.pop()
+
+    def _count_load(self, target, context):
+        if has_request_context():
+            profile = g.get('_profile')
+            if profile is not None:
+                profile['objects'] += 1
+
+    def sample(self, endpoint):
+        """Stack-sample `endpoint` from its next request on (None stops), starting from empty stacks"""
+        if endpoint != self.sample_endpoint:
+            self.sample_endpoint = endpoint
+            self.sampler.reset()
+
+    def record(self, method, rule, wall_ms, profile):
+        key = f'{method} {rule}'
+        with self._lock:
+            stats = self._routes.get(key)
+            if stats is None:
+                stats = self._routes[key] = RouteStats(self.window)
+            stats.add((wall_ms, profile['queries'], profile['sql_ms'], profile['objects']))
+
+        if wall_ms >= self.slow_request_ms:
+            slowest = sorted(profile['statements'], key=lambda item: item[0], reverse=True)[:SLOW_LOG_STATEMENTS]
+            self.slow_requests.append({
+                'route': key,
+                'wall_ms': round(wall_ms, 2),
+                'queries': profile['queries'],
+                'sql_ms': round(profile['sql_ms'], 2),
+                'objects_loaded': profile['objects'],
+                'statements': [{'ms': round(ms, 2), 'statement': statement} for ms, statement in slowest],
+                'at': time.time()
+            })
+            logger.warning(f"Slow request {key}: {wall_ms:.1f} ms, {profile['queries']} queries "
+                           f"({profile['sql_ms']:.1f} ms), {profile['objects']} objects loaded")
+
+    def stats(self):
+        with self._lock:
+            routes = {key: stats.to_dict() for key, stats in self._routes.items()}
+        return {
+            'enabled': self.enabled,
+            'slow_request_ms': self.slow_request_ms,
+            'slow_query_ms': self.slow_query_ms,
+            'sample_endpoint': self.sample_endpoint,
+            'stack_samples': self.sampler.samples,
+            'routes': dict(sorted(routes.items(), key=lambda item: item[1]['sql_ms_avg'], reverse=True))
+        }
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+        self.slow_requests.clear()
+        self.slow_queries.clear()
+        self.sampler.reset()
+
+
+# Request profiling for the API process, installed in main.py
+request_profiler = RequestProfiler()
+
+
+def require_local_profiler(view):
+    """Serve a profiling view only while profiling is on and only to loopback clients"""
+    @wraps(view)
+    def decorated(*args, **kwargs):
+        if not request_profiler.enabled:
+            return jsonify({'error': 'Profiling is disabled'}), 404
+        if request.remote_addr not in PROFILE_LOCAL_ADDRS:
+            return jsonify({'error': 'Profiles are only served to local clients'}), 403
+        return view(*args, **kwargs)
+    return decorated
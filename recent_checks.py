@@ -0,0 +1,167 @@
+"""
+UptimePro Recent Checks
+Fixed-size, array-backed ring buffers of the latest checks per website
+"""
+
+import os
+import sys
+import threading
+from array import array
+from calendar import timegm
+from collections import OrderedDict
+from datetime import datetime
+
+from src.models.website import UptimeCheck
+
+RECENT_CHECKS_PER_SITE = int(os.getenv('RECENT_CHECKS_PER_SITE', 120))
+RECENT_CHECKS_MEMORY_BUDGET = int(os.getenv('RECENT_CHECKS_MEMORY_BUDGET', 64 * 1024 * 1024))  # bytes
+
+
+def _epoch(timestamp):
+    return timegm(timestamp.utctimetuple()) + timestamp.microsecond / 1e6
+
+
+class CheckRing:
+    """Last `capacity` checks of one website in parallel typed arrays.
+
+    Each slot costs 8 bytes of timestamp, 4 of latency, 2 of status code
+    and one bit of up/down status, on top of ~350 bytes of fixed overhead.
+    """
+
+    __slots__ = ('capacity', 'timestamps', 'latencies', 'status_codes', 'up_bits', 'head', 'size')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.latencies = array('I', bytes(4 * capacity))
+        self.status_codes = array('H', bytes(2 * capacity))
+        self.up_bits = bytearray((capacity + 7) // 8)
+        self.head = 0  # next slot to write
+        self.size = 0
+
+    @property
+    def last_timestamp(self):
+        if not self.size:
+            return None
+        return self.timestamps[(self.head - 1) % self.capacity]
+
+    def append(self, timestamp, up, latency, status_code):
+        slot = self.head
+        self.timestamps[slot] = timestamp
+        self.latencies[slot] = max(0, min(latency or 0, 0xFFFFFFFF))
+        self.status_codes[slot] = status_code or 0
+        if up:
+            self.up_bits[slot >> 3] |= 1 << (slot & 7)
+        else:
+            self.up_bits[slot >> 3] &= ~(1 << (slot & 7)) & 0xFF
+        self.head = (slot + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def latest(self, limit=None):
+        """Newest-first list of check dicts"""
+        count = self.size if limit is None else min(limit, self.size)
+        checks = []
+        for n in range(1, count + 1):
+            slot = (self.head - n) % self.capacity
+            up = bool(self.up_bits[slot >> 3] & (1 << (slot & 7)))
+            checks.append({
+                'timestamp': datetime.utcfromtimestamp(self.timestamps[slot]).isoformat(),
+                'status': 'up' if up else 'down',
+                'response_time': self.latencies[slot],
+                'status_code': self.status_codes[slot] or None
+            })
+        return checks
+
+    @property
+    def nbytes(self):
+        """Memory held by the ring, including Python object headers"""
+        return (sys.getsizeof(self) + sys.getsizeof(self.timestamps) + sys.getsizeof(self.latencies) +
+                sys.getsizeof(self.status_codes) + sys.getsizeof(self.up_bits))
+
+
+class RecentChecks:
+    """Per-website CheckRings kept within a memory budget (least recently used sites are evicted).
+
+    Rings are fed from CheckWriter flushes in this process and from the
+    CheckTail thread, which is how checks written by the worker arrive;
+    reads never query for new checks. Each ring only accepts checks newer
+    than its latest one, so a check seen by both paths is kept once. A
+    website read for the first time is warmed with one indexed query.
+    """
+
+    def __init__(self, capacity=RECENT_CHECKS_PER_SITE, memory_budget=RECENT_CHECKS_MEMORY_BUDGET):
+        self.capacity = capacity
+        self.memory_budget = memory_budget
+        self.ring_bytes = CheckRing(capacity).nbytes
+        self.max_sites = max(1, memory_budget // self.ring_bytes)
+        self._rings = OrderedDict()  # website_id -> CheckRing
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _append(self, website_id, timestamp, status, latency, status_code):
+        ring = self._rings.get(website_id)
+        if ring is None:
+            return  # not resident; warmed from the DB on first read
+        epoch = _epoch(timestamp)
+        last = ring.last_timestamp
+        if last is not None and epoch <= last:
+            return
+        ring.append(epoch, status == 'up', latency, status_code)
+
+    def feed(self, checks):
+        """CheckWriter and CheckTail listener: add freshly written check mappings"""
+        with self._lock:
+            for check in checks:
+                self._append(check['website_id'], check['timestamp'], check['status'],
+                             check.get('response_time'), check.get('status_code'))
+
+    def _warm(self, session, website_id):
+        rows = session.query(
+            UptimeCheck.timestamp,
+            UptimeCheck.status,
+            UptimeCheck.response_time,
+            UptimeCheck.status_code
+        ).filter(
+            UptimeCheck.website_id == website_id
+        ).order_by(UptimeCheck.timestamp.desc(), UptimeCheck.id.desc()).limit(self.capacity).all()
+
+        ring = CheckRing(self.capacity)
+        for timestamp, status, latency, status_code in reversed(rows):
+            ring.append(_epoch(timestamp), status == 'up', latency, status_code)
+        return ring
+
+    def recent(self, session, website_id, limit=None):
+        """Newest-first recent checks for a website, touching the DB only to warm its ring"""
+        with self._lock:
+            ring = self._rings.get(website_id)
+            if ring is not None:
+                self._rings.move_to_end(website_id)
+                return ring.latest(limit)
+
+        ring = self._warm(session, website_id)
+        with self._lock:
+            self._rings.setdefault(website_id, ring)
+            self._rings.move_to_end(website_id)
+            while len(self._rings) > self.max_sites:
+                self._rings.popitem(last=False)
+                self.evictions += 1
+            return self._rings[website_id].latest(limit)
+
+    def stats(self):
+        with self._lock:
+            sites = len(self._rings)
+            checks = sum(ring.size for ring in self._rings.values())
+        return {
+            'sites': sites,
+            'max_sites': self.max_sites,
+            'capacity_per_site': self.capacity,
+            'checks': checks,
+            'ring_bytes': self.ring_bytes,
+            'memory_bytes': sites * self.ring_bytes,
+            'memory_budget': self.memory_budget,
+            'evictions': self.evictions
+        }
+
+
+# Recent-check cache for the API process, fed by check_writer and check_tail in main.py
+recent_checks = RecentChecks()
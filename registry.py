@@ -0,0 +1,152 @@
+"""
+UptimePro Website Registry
+Compact in-memory copy of the websites a worker monitors, kept current from an updated_at watermark
+"""
+
+import os
+import sys
+import time
+from datetime import timedelta
+
+from src.models.website import Website
+
+REGISTRY_OVERLAP = float(os.getenv('REGISTRY_OVERLAP', 30))  # seconds re-read behind the watermark (clock skew, late commits)
+REGISTRY_RECONCILE_INTERVAL = float(os.getenv('REGISTRY_RECONCILE_INTERVAL', 60))  # seconds between id sweeps
+
+
+class SiteEntry:
+    """What the worker needs to probe a website, write its check and alert on it"""
+
+    __slots__ = ('id', 'user_id', 'name', 'url', 'check_interval', 'current_status', 'next_check_at', 'updated_at')
+
+    def __init__(self, id, user_id, name, url, check_interval, current_status, next_check_at, updated_at):
+        self.id = id
+        self.user_id = user_id
+        self.name = name
+        self.url = url
+        self.check_interval = check_interval
+        self.current_status = current_status
+        self.next_check_at = next_check_at
+        self.updated_at = updated_at
+
+
+class WebsiteRegistry:
+    """Active websites in this worker's shards, as plain slotted entries instead of ORM rows.
+
+    The first refresh loads every active website; later ones read only
+    rows whose Website.updated_at passed the watermark (configuration
+    edits and manual checks made through the API), re-reading the last
+    `overlap` seconds so rows committed late or stamped by a skewed clock
+    are not missed. Deleted rows leave no trace in that feed, so every
+    `reconcile_interval` seconds the ids of active websites are compared
+    with the registry. The worker updates status and deadlines in place
+    as it records checks; nothing here holds a session's identity map.
+    """
+
+    def __init__(self, session, website_filter=None, overlap=REGISTRY_OVERLAP,
+                 reconcile_interval=REGISTRY_RECONCILE_INTERVAL):
+        self.session = session
+        self.website_filter = website_filter  # optional callable returning an extra SQL criterion
+        self.overlap = timedelta(seconds=overlap)
+        self.reconcile_interval = reconcile_interval
+        self._entries = {}  # website_id -> SiteEntry
+        self._watermark = None  # newest updated_at applied
+        self._last_reconcile = 0.0
+        self.loads = 0
+        self.changes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, website_id):
+        return self._entries.get(website_id)
+
+    def reset(self):
+        """Forget everything and reload on the next refresh, e.g. after shards moved"""
+        self._entries = {}
+        self._watermark = None
+        self._last_reconcile = 0.0
+
+    def _query(self, *criteria):
+        query = self.session.query(
+            Website.id,
+            Website.user_id,
+            Website.name,
+            Website.url,
+            Website.check_interval,
+            Website.current_status,
+            Website.next_check_at,
+            Website.updated_at,
+            Website.is_active
+        ).filter(*criteria)
+        if self.website_filter is not None:
+            query = query.filter(self.website_filter())
+        return query
+
+    def refresh(self, now):
+        """Apply changes since the last call; returns the entries that were added or changed"""
+        if self._watermark is None:
+            criteria = [Website.is_active == True]
+            self.loads += 1
+        else:
+            criteria = [Website.updated_at >= self._watermark - self.overlap]
+
+        changed = []
+        for row in self._query(*criteria):
+            if row.updated_at is not None and (self._watermark is None or row.updated_at > self._watermark):
+                self._watermark = row.updated_at
+            entry = self._entries.get(row.id)
+            if not row.is_active:
+                self._entries.pop(row.id, None)
+                continue
+            if entry is not None and entry.updated_at == row.updated_at:
+                continue  # already applied; re-read inside the overlap
+            entry = self._entries[row.id] = SiteEntry(
+                row.id, row.user_id, row.name, row.url, row.check_interval,
+                row.current_status, row.next_check_at or now, row.updated_at
+            )
+            changed.append(entry)
+        if self._watermark is None:
+            self._watermark = now  # empty table: start the feed from here
+
+        self.changes += len(changed)
+        if time.monotonic() - self._last_reconcile >= self.reconcile_interval:
+            changed.extend(self.reconcile(now))
+        return changed
+
+    def reconcile(self, now):
+        """Drop deleted websites and load any the feed missed; returns the loaded entries"""
+        self._last_reconcile = time.monotonic()
+        query = self.session.query(Website.id).filter(Website.is_active == True)
+        if self.website_filter is not None:
+            query = query.filter(self.website_filter())
+        active = {website_id for (website_id,) in query}
+
+        for website_id in [website_id for website_id in self._entries if website_id not in active]:
+            del self._entries[website_id]
+
+        missing = active.difference(self._entries)
+        if not missing:
+            return []
+        loaded = []
+        for row in self._query(Website.id.in_(missing)):
+            entry = self._entries[row.id] = SiteEntry(
+                row.id, row.user_id, row.name, row.url, row.check_interval,
+                row.current_status, row.next_check_at or now, row.updated_at
+            )
+            loaded.append(entry)
+        return loaded
+
+    def due_within(self, until):
+        """(website_id, next_check_at) for every entry due by `until`"""
+        return [(entry.id, entry.next_check_at) for entry in self._entries.values() if entry.next_check_at <= until]
+
+    def stats(self):
+        return {
+            'websites': len(self._entries),
+            'full_loads': self.loads,
+            'changes_applied': self.changes,
+            'watermark': self._watermark.isoformat() if self._watermark else None,
+            'approx_bytes': sum(sys.getsizeof(entry) + sys.getsizeof(entry.url) + sys.getsizeof(entry.name)
+                                for entry in self._entries.values())
+        }
@@ -0,0 +1,182 @@
+"""
+UptimePro Response Cache
+Per-user versioned JSON bodies with ETags for the dashboard's read endpoints
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, g, make_response, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from src.models.user import User
+from src.models.website import Website, Subscription
+
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() != 'false'
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 30000))  # cached bodies (endpoint x user)
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 30))  # seconds; bounds windowed stats and edits in other processes
+
+
+class ResponseCache:
+    """LRU of (endpoint, user_id) -> (version, etag, body), valid while the user's data version holds.
+
+    The version is an in-process counter per user, read from memory before
+    the body. It is bumped only after the change is committed: by the
+    CheckTail listener for checks written by any process (the worker,
+    probe agents, manual checks), and by session events for website,
+    subscription and account changes made in this process. So a body is
+    never stored under a version newer than what it shows, and a repeat
+    poll costs no query at all. Edits made through other API processes,
+    the sliding 24h figures and, with a lagging read replica, bodies read
+    just after an edit here show up within `ttl`. A cached body younger
+    than `ttl` is served while the version matches; requests carrying its
+    ETag in If-None-Match get a 304.
+    """
+
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, enabled=RESPONSE_CACHE_ENABLED):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self._entries = OrderedDict()  # (endpoint, user_id) -> (version, expires, etag, body)
+        self._versions = {}  # user_id -> int
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def bump(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def version(self, user_id):
+        """The user's current data version; read it before the body"""
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def feed(self, checks):
+        """CheckTail listener: bump the owners of freshly written checks"""
+        self.bump(*{check['user_id'] for check in checks if check.get('user_id') is not None})
+
+    def get(self, endpoint, user_id, version):
+        """(etag, body) if an entry for `version` exists, else None"""
+        key = (endpoint, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            entry_version, expires, etag, body = entry
+            if entry_version != version or expires < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return etag, body
+
+    def put(self, endpoint, user_id, version, body):
+        etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        with self._lock:
+            self._entries[(endpoint, user_id)] = (version, time.monotonic() + self.ttl, etag, body)
+            self._entries.move_to_end((endpoint, user_id))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return etag
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+response_cache = ResponseCache()
+
+
+def cached_response(endpoint):
+    """Serve a require_api_key view's JSON from response_cache with an ETag.
+
+    Goes below @require_api_key. Only 200 responses are cached.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not response_cache.enabled:
+                return view(*args, **kwargs)
+
+            user_id = g.api_user.user_id
+            # Read before the body, so the body is at least as new as the version it is stored under
+            version = response_cache.version(user_id)
+            cached = response_cache.get(endpoint, user_id, version)
+            if cached is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                body = response.get_data()
+                etag = response_cache.put(endpoint, user_id, version, body)
+            else:
+                etag, body = cached
+
+            response = Response(body, mimetype='application/json')
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response = response.make_conditional(request)
+            if response.status_code == 304:
+                response_cache.not_modified += 1
+            return response
+        return wrapper
+    return decorator
+
+
+# Website, plan and account changes bump their users once the change commits
+# (mapper events fire at flush time, when other requests still read the old rows)
+def _note_bump(target, user_id):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('response_cache_bumps', set()).add(user_id)
+
+
+@event.listens_for(Website, 'after_insert')
+@event.listens_for(Website, 'after_update')
+@event.listens_for(Website, 'after_delete')
+@event.listens_for(Subscription, 'after_insert')
+@event.listens_for(Subscription, 'after_update')
+@event.listens_for(Subscription, 'after_delete')
+def _bump_owner(mapper, connection, target):
+    _note_bump(target, target.user_id)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _bump_user(mapper, connection, target):
+    _note_bump(target, target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_bumps(session):
+    user_ids = session.info.pop('response_cache_bumps', None)
+    if user_ids:
+        response_cache.bump(*user_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_bumps(session):
+    session.info.pop('response_cache_bumps', None)
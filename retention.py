@@ -0,0 +1,192 @@
+"""
+UptimePro Retention Engine
+Deletes expired check history in small, index-driven chunks on its own schedule
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select
+
+from src.models.website import Website, UptimeCheck, UptimeRollup, Subscription, JobState
+
+logger = logging.getLogger(__name__)
+
+RETENTION_INTERVAL = float(os.getenv('RETENTION_INTERVAL', 3600))  # seconds between runs
+RETENTION_CHUNK_SIZE = int(os.getenv('RETENTION_CHUNK_SIZE', 5000))
+RETENTION_CHUNK_PAUSE = float(os.getenv('RETENTION_CHUNK_PAUSE', 0.05))  # lets writers in between chunks
+
+# Days of history kept per plan; None keeps everything
+PLAN_RETENTION_DAYS = {
+    'free': 7,
+    'pro': 90,
+    'business': 365,
+    'enterprise': None
+}
+
+# Minute rollups only serve the ragged edges of recent windows
+MINUTE_ROLLUP_RETENTION_DAYS = 7
+
+JOB_NAME = 'retention'
+
+
+class RetentionEngine:
+    """Purges expired UptimeCheck and UptimeRollup rows plan by plan.
+
+    Each chunk is one short transaction deleting at most `chunk_size` rows
+    picked through the timestamp index, so the database is never locked
+    for long. Progress (the plan being purged) is kept in the JobState
+    row: a run that was interrupted is resumed from that plan as soon as
+    the engine starts again, and completed runs repeat every `interval`.
+    """
+
+    def __init__(self, session_factory, interval=RETENTION_INTERVAL, chunk_size=RETENTION_CHUNK_SIZE,
+                 chunk_pause=RETENTION_CHUNK_PAUSE, is_leader=None):
+        self.session_factory = session_factory
+        self.is_leader = is_leader  # optional callable; only the leader of a worker fleet purges
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+        self.last_report = None
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def _plan_websites(self, plan):
+        # Users without a subscription are on the free plan
+        return select(Website.id).outerjoin(
+            Subscription, Subscription.user_id == Website.user_id
+        ).where(func.coalesce(Subscription.plan, 'free') == plan)
+
+    def _purge(self, session, model, time_column, *criteria):
+        """Delete matching rows chunk by chunk; returns the number deleted"""
+        deleted = 0
+        while not self._stopping.is_set():
+            chunk = select(model.id).where(*criteria).order_by(time_column).limit(self.chunk_size)
+            result = session.execute(delete(model).where(model.id.in_(chunk.scalar_subquery())))
+            session.commit()
+            deleted += result.rowcount
+            if result.rowcount < self.chunk_size:
+                break
+            if self.chunk_pause:
+                time.sleep(self.chunk_pause)
+        return deleted
+
+    def _job_state(self, session):
+        state = session.get(JobState, JOB_NAME)
+        if state is None:
+            state = JobState(name=JOB_NAME)
+            session.add(state)
+            session.commit()
+        return state
+
+    def is_due(self, session, now=None):
+        now = now or datetime.utcnow()
+        state = self._job_state(session)
+        if state.last_started_at is None:
+            return True
+        if state.last_completed_at is None or state.last_completed_at < state.last_started_at:
+            return True  # interrupted; resume
+        return (now - state.last_started_at).total_seconds() >= self.interval
+
+    def run_once(self):
+        """Run (or resume) one full purge and return a report of rows deleted"""
+        session = self.session_factory()
+        try:
+            state = self._job_state(session)
+            resuming = state.last_completed_at is None or (
+                state.last_started_at is not None and state.last_completed_at < state.last_started_at
+            )
+            plans = [plan for plan, days in PLAN_RETENTION_DAYS.items() if days is not None]
+            if resuming and state.progress in plans:
+                plans = plans[plans.index(state.progress):]
+                logger.info(f"Resuming retention purge at {state.progress} plan")
+            else:
+                state.last_started_at = datetime.utcnow()
+
+            start_time = time.monotonic()
+            now = datetime.utcnow()
+            checks_deleted = 0
+            rollups_deleted = 0
+
+            for plan in plans:
+                state.progress = plan
+                session.commit()
+
+                cutoff = now - timedelta(days=PLAN_RETENTION_DAYS[plan])
+                websites = self._plan_websites(plan)
+                checks_deleted += self._purge(
+                    session, UptimeCheck, UptimeCheck.timestamp,
+                    UptimeCheck.timestamp < cutoff,
+                    UptimeCheck.website_id.in_(websites)
+                )
+                rollups_deleted += self._purge(
+                    session, UptimeRollup, UptimeRollup.bucket_start,
+                    UptimeRollup.bucket_start < cutoff,
+                    UptimeRollup.website_id.in_(websites)
+                )
+                if self._stopping.is_set():
+                    break
+
+            if not self._stopping.is_set():
+                minute_cutoff = now - timedelta(days=MINUTE_ROLLUP_RETENTION_DAYS)
+                rollups_deleted += self._purge(
+                    session, UptimeRollup, UptimeRollup.bucket_start,
+                    UptimeRollup.granularity == 'minute',
+                    UptimeRollup.bucket_start < minute_cutoff
+                )
+                state.progress = None
+                state.last_completed_at = datetime.utcnow()
+                session.commit()
+
+            duration = time.monotonic() - start_time
+            total = checks_deleted + rollups_deleted
+            self.last_report = {
+                'checks_deleted': checks_deleted,
+                'rollups_deleted': rollups_deleted,
+                'duration': round(duration, 3),
+                'rows_per_second': round(total / duration, 1) if duration > 0 else 0.0,
+                'completed': not self._stopping.is_set()
+            }
+            logger.info(f"Retention purge: {self.last_report}")
+            return self.last_report
+
+        except Exception as e:
+            logger.error(f"Retention purge failed: {str(e)}")
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='retention', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            if self.is_leader is not None and not self.is_leader():
+                self._stopping.wait(min(60, self.interval))
+                continue
+            try:
+                session = self.session_factory()
+                try:
+                    due = self.is_due(session)
+                finally:
+                    session.close()
+                if due:
+                    self.run_once()
+            except Exception as e:
+                logger.error(f"Error in retention loop: {str(e)}")
+            # Re-check well within the interval so a missed run is never more than a minute late
+            self._stopping.wait(min(60, self.interval))
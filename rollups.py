@@ -0,0 +1,339 @@
+"""
+UptimePro Uptime Rollups
+Minute, hour and day aggregates of check results per website
+"""
+
+from datetime import timedelta
+
+from sqlalchemy import and_, or_, func, select, update, bindparam, tuple_
+
+from src.models.website import UptimeCheck, UptimeRollup
+from src.sketch import LatencySketch
+
+GRANULARITIES = ('minute', 'hour', 'day')
+SKETCH_GRANULARITIES = ('hour', 'day')  # minute sketches would cost about a row's worth per check
+SKETCH_LOOKUP_CHUNK = 500  # bucket keys per SELECT
+
+_BUCKET_SIZES = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1)
+}
+
+
+def bucket_start(timestamp, granularity):
+    """Truncate a timestamp to the start of its bucket"""
+    if granularity == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f'Unknown rollup granularity: {granularity}')
+
+
+def _ceil(timestamp, granularity):
+    start = bucket_start(timestamp, granularity)
+    return start if start == timestamp else start + _BUCKET_SIZES[granularity]
+
+
+def cover(since, until):
+    """Split [since, until) into the fewest (granularity, start, end) bucket ranges.
+
+    Whole days are read from day buckets, the leftover whole hours from hour
+    buckets and only the ragged edges from minute buckets, so a window costs
+    at most ~2*(60+24) buckets plus one per day.
+    """
+    start = bucket_start(since, 'minute')
+    end = _ceil(until, 'minute')
+    hour_start = _ceil(start, 'hour')
+    hour_end = bucket_start(end, 'hour')
+    if hour_start >= hour_end:
+        return [('minute', start, end)] if start < end else []
+
+    day_start = _ceil(hour_start, 'day')
+    day_end = bucket_start(hour_end, 'day')
+    if day_start >= day_end:
+        ranges = [('minute', start, hour_start), ('hour', hour_start, hour_end), ('minute', hour_end, end)]
+    else:
+        ranges = [
+            ('minute', start, hour_start),
+            ('hour', hour_start, day_start),
+            ('day', day_start, day_end),
+            ('hour', day_end, hour_end),
+            ('minute', hour_end, end)
+        ]
+    return [(granularity, a, b) for granularity, a, b in ranges if a < b]
+
+
+def aggregate(checks):
+    """Fold check mappings into per-bucket deltas keyed by (website_id, granularity, bucket_start)"""
+    buckets = {}
+    starts_by_minute = {}  # a batch spans few minutes, so hour and day starts are derived once per minute
+    for check in checks:
+        up = check['status'] == 'up'
+        latency = check.get('response_time') if up else None
+        minute = bucket_start(check['timestamp'], 'minute')
+        starts = starts_by_minute.get(minute)
+        if starts is None:
+            starts = starts_by_minute[minute] = tuple(
+                (granularity, bucket_start(minute, granularity)) for granularity in GRANULARITIES
+            )
+        for granularity, start in starts:
+            key = (check['website_id'], granularity, start)
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = {
+                    'check_count': 0,
+                    'up_count': 0,
+                    'latency_sum': 0,
+                    'latency_min': None,
+                    'latency_max': None
+                }
+            bucket['check_count'] += 1
+            if up:
+                bucket['up_count'] += 1
+            if latency is not None:
+                bucket['latency_sum'] += latency
+                if bucket['latency_min'] is None or latency < bucket['latency_min']:
+                    bucket['latency_min'] = latency
+                if bucket['latency_max'] is None or latency > bucket['latency_max']:
+                    bucket['latency_max'] = latency
+    return buckets
+
+
+def apply_checks(session, checks):
+    """Add a batch of check mappings to the rollups inside the caller's transaction"""
+    buckets = aggregate(checks)
+    if not buckets:
+        return 0
+
+    rows = [
+        dict(values, website_id=website_id, granularity=granularity, bucket_start=start)
+        for (website_id, granularity, start), values in buckets.items()
+    ]
+
+    dialect = session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        least, greatest = func.min, func.max  # multi-argument scalar forms
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        least, greatest = func.least, func.greatest
+    else:
+        _apply_rows_portable(session, rows)
+        session.flush()
+        apply_sketches(session, checks)
+        return len(rows)
+
+    table = UptimeRollup.__table__
+    stmt = insert(table)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['website_id', 'granularity', 'bucket_start'],
+        set_={
+            'check_count': table.c.check_count + excluded.check_count,
+            'up_count': table.c.up_count + excluded.up_count,
+            'latency_sum': table.c.latency_sum + excluded.latency_sum,
+            'latency_min': least(
+                func.coalesce(table.c.latency_min, excluded.latency_min),
+                func.coalesce(excluded.latency_min, table.c.latency_min)
+            ),
+            'latency_max': greatest(
+                func.coalesce(table.c.latency_max, excluded.latency_max),
+                func.coalesce(excluded.latency_max, table.c.latency_max)
+            )
+        }
+    )
+    session.execute(stmt, rows)
+    apply_sketches(session, checks)
+    return len(rows)
+
+
+def _apply_rows_portable(session, rows):
+    """Read-modify-write fallback for backends without ON CONFLICT upserts"""
+    for row in rows:
+        rollup = session.query(UptimeRollup).filter_by(
+            website_id=row['website_id'],
+            granularity=row['granularity'],
+            bucket_start=row['bucket_start']
+        ).with_for_update().first()
+        if rollup is None:
+            session.add(UptimeRollup(**row))
+            continue
+        rollup.check_count += row['check_count']
+        rollup.up_count += row['up_count']
+        rollup.latency_sum += row['latency_sum']
+        if row['latency_min'] is not None:
+            if rollup.latency_min is None or row['latency_min'] < rollup.latency_min:
+                rollup.latency_min = row['latency_min']
+            if rollup.latency_max is None or row['latency_max'] > rollup.latency_max:
+                rollup.latency_max = row['latency_max']
+
+
+def sketch_deltas(checks):
+    """Fold up-check latencies into one LatencySketch per (website_id, granularity, bucket_start)"""
+    deltas = {}
+    for check in checks:
+        latency = check.get('response_time')
+        if check['status'] != 'up' or latency is None:
+            continue
+        for granularity in SKETCH_GRANULARITIES:
+            key = (check['website_id'], granularity, bucket_start(check['timestamp'], granularity))
+            sketch = deltas.get(key)
+            if sketch is None:
+                sketch = deltas[key] = LatencySketch()
+            sketch.add(latency)
+    return deltas
+
+
+def apply_sketches(session, checks):
+    """Merge a batch into the stored bucket sketches inside the caller's transaction.
+
+    Runs after the rollup upsert, so every bucket row already exists. The
+    merge is read-modify-write: PostgreSQL locks the rows it reads, and on
+    SQLite the check insert that precedes this already holds the write lock.
+    """
+    deltas = sketch_deltas(checks)
+    if not deltas:
+        return 0
+
+    table = UptimeRollup.__table__
+    lock = session.get_bind().dialect.name == 'postgresql'
+    keys = list(deltas)
+    updates = []
+    for offset in range(0, len(keys), SKETCH_LOOKUP_CHUNK):
+        query = select(
+            table.c.id, table.c.website_id, table.c.granularity, table.c.bucket_start, table.c.latency_sketch
+        ).where(tuple_(table.c.website_id, table.c.granularity, table.c.bucket_start).in_(
+            keys[offset:offset + SKETCH_LOOKUP_CHUNK]
+        ))
+        if lock:
+            query = query.with_for_update()
+        for rollup_id, website_id, granularity, start, data in session.execute(query):
+            sketch = LatencySketch.from_bytes(data).merge(deltas[(website_id, granularity, start)])
+            updates.append({'rollup_id': rollup_id, 'sketch': sketch.to_bytes()})
+
+    if updates:
+        session.execute(
+            update(table).where(table.c.id == bindparam('rollup_id')).values(latency_sketch=bindparam('sketch')),
+            updates
+        )
+    return len(updates)
+
+
+def _window_filter(since, until):
+    return or_(*[
+        and_(
+            UptimeRollup.granularity == granularity,
+            UptimeRollup.bucket_start >= start,
+            UptimeRollup.bucket_start < end
+        )
+        for granularity, start, end in cover(since, until)
+    ])
+
+
+def uptime_summary(session, website_ids, since, until):
+    """Check totals, uptime and latency over a window for one or more websites.
+
+    `website_ids` may be a list or a SQL subquery of website ids.
+    """
+    checks, up, latency_sum, latency_min, latency_max = session.query(
+        func.coalesce(func.sum(UptimeRollup.check_count), 0),
+        func.coalesce(func.sum(UptimeRollup.up_count), 0),
+        func.coalesce(func.sum(UptimeRollup.latency_sum), 0),
+        func.min(UptimeRollup.latency_min),
+        func.max(UptimeRollup.latency_max)
+    ).filter(
+        UptimeRollup.website_id.in_(website_ids),
+        _window_filter(since, until)
+    ).one()
+
+    return {
+        'checks': checks,
+        'up_checks': up,
+        'uptime_percentage': (up / checks * 100) if checks > 0 else 100,
+        'avg_response_time': round(latency_sum / up) if up > 0 else None,
+        'min_response_time': latency_min,
+        'max_response_time': latency_max
+    }
+
+
+def uptime_series(session, website_id, since, until, granularity='hour'):
+    """Per-bucket uptime and latency for one website, oldest first"""
+    rollups = session.query(UptimeRollup).filter(
+        UptimeRollup.website_id == website_id,
+        UptimeRollup.granularity == granularity,
+        UptimeRollup.bucket_start >= bucket_start(since, granularity),
+        UptimeRollup.bucket_start < until
+    ).order_by(UptimeRollup.bucket_start).all()
+
+    return [{
+        'bucket_start': rollup.bucket_start.isoformat(),
+        'checks': rollup.check_count,
+        'up_checks': rollup.up_count,
+        'uptime_percentage': round(rollup.up_count / rollup.check_count * 100, 2) if rollup.check_count else 100,
+        'avg_response_time': round(rollup.latency_sum / rollup.up_count) if rollup.up_count else None,
+        'min_response_time': rollup.latency_min,
+        'max_response_time': rollup.latency_max
+    } for rollup in rollups]
+
+
+def latency_percentiles(session, website_id, since, until, quantiles=(0.5, 0.95, 0.99)):
+    """Latency quantiles of up checks over a window, merged from hour and day sketches.
+
+    The window is widened to whole hours. At most ~48 hour sketches plus
+    one per day are read, each bounded in size, whatever the check volume.
+    """
+    start = bucket_start(since, 'hour')
+    end = _ceil(until, 'hour')
+    merged = LatencySketch()
+    for (data,) in session.query(UptimeRollup.latency_sketch).filter(
+        UptimeRollup.website_id == website_id,
+        UptimeRollup.latency_sketch.isnot(None),
+        _window_filter(start, end)
+    ):
+        merged.merge(LatencySketch.from_bytes(data))
+
+    result = {
+        'window_start': start.isoformat(),
+        'window_end': end.isoformat(),
+        'checks': merged.count,
+        'relative_accuracy': merged.relative_accuracy
+    }
+    for q in quantiles:
+        value = merged.quantile(q)
+        result[f'p{round(q * 100, 1):g}'] = round(value) if value is not None else None
+    return result
+
+
+def backfill(session, since=None, batch_size=5000):
+    """Build rollups from existing raw checks; run once against an empty rollup table"""
+    query = session.query(
+        UptimeCheck.website_id,
+        UptimeCheck.timestamp,
+        UptimeCheck.status,
+        UptimeCheck.response_time
+    )
+    if since is not None:
+        query = query.filter(UptimeCheck.timestamp >= since)
+
+    total = 0
+    batch = []
+    for website_id, timestamp, status, response_time in query.yield_per(batch_size):
+        batch.append({
+            'website_id': website_id,
+            'timestamp': timestamp,
+            'status': status,
+            'response_time': response_time
+        })
+        if len(batch) >= batch_size:
+            apply_checks(session, batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        apply_checks(session, batch)
+        total += len(batch)
+
+    session.commit()
+    return total
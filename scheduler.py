@@ -0,0 +1,173 @@
+"""
+UptimePro Check Scheduler
+Deadline-ordered queue of website checks keyed on Website.next_check_at
+"""
+
+import heapq
+import math
+import os
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+
+SCHEDULER_REFRESH_INTERVAL = float(os.getenv('SCHEDULER_REFRESH_INTERVAL', 5))
+LAG_WINDOW = 10000  # probes kept for the scheduling lag percentiles
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def phase_offset(website_id, interval):
+    """Stable offset in [0, interval) seconds; multiplicative hashing spreads consecutive ids evenly"""
+    return ((website_id * 2654435761) % 4294967296) / 4294967296 * interval
+
+
+def next_check_time(website_id, interval, after):
+    """The website's next slot (k * interval + its phase offset) at least half an interval after `after`.
+
+    Deadlines land on the same fixed slots however late a check ran, so
+    sites created together stay spread out instead of drifting back into
+    bursts, and a late check is never followed by an early one.
+    """
+    interval = max(1, interval)
+    offset = phase_offset(website_id, interval)
+    earliest = (after - EPOCH).total_seconds() + interval / 2
+    slot = math.ceil((earliest - offset) / interval)
+    return EPOCH + timedelta(seconds=slot * interval + offset)
+
+
+class CheckScheduler:
+    """In-memory min-heap of (next_check_at, website_id) for checks due soon.
+
+    The persisted, indexed Website.next_check_at column is the source of
+    truth. The heap only mirrors the rows that fall due within `horizon`
+    seconds, and is topped up with a range query on that index every
+    `refresh_interval` seconds, which is how websites added or re-timed
+    through the API are picked up. Entries are never removed in place: a
+    newer deadline for the same website simply shadows the old one, and
+    stale entries are skipped when popped.
+
+    With `source` (a callable taking the horizon end and returning
+    (website_id, next_check_at) pairs, e.g. WebsiteRegistry.due_within) the
+    refresh reads deadlines from memory instead of the index.
+    """
+
+    def __init__(self, session, refresh_interval=SCHEDULER_REFRESH_INTERVAL, horizon=None, website_filter=None,
+                 source=None):
+        self.session = session
+        self.website_filter = website_filter  # optional callable returning an extra SQL criterion
+        self.source = source
+        self.refresh_interval = refresh_interval
+        self.horizon = horizon if horizon is not None else refresh_interval * 2
+        self._heap = []
+        self._deadlines = {}  # website_id -> deadline of its live heap entry
+        self._last_refresh = None
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def needs_refresh(self, now=None):
+        now = now or datetime.utcnow()
+        if self._last_refresh is None:
+            return True
+        return (now - self._last_refresh).total_seconds() >= self.refresh_interval
+
+    def reset(self):
+        """Forget every queued deadline and reload on the next refresh"""
+        self._heap = []
+        self._deadlines = {}
+        self._last_refresh = None
+
+    def refresh(self, now=None):
+        """Load every active website that falls due within the horizon"""
+        now = now or datetime.utcnow()
+        until = now + timedelta(seconds=self.horizon)
+        if self.source is not None:
+            rows = self.source(until)
+        else:
+            from src.models.website import Website  # the probe agent uses this module without the app's models
+
+            query = self.session.query(Website.id, Website.next_check_at).filter(
+                Website.is_active == True,
+                or_(Website.next_check_at.is_(None), Website.next_check_at <= until)
+            )
+            if self.website_filter is not None:
+                query = query.filter(self.website_filter())
+            rows = query.all()
+
+        for website_id, next_check_at in rows:
+            self.schedule(website_id, next_check_at or now)
+
+        self._last_refresh = now
+        return len(rows)
+
+    def schedule(self, website_id, deadline):
+        """Queue (or re-time) a website; deadlines beyond the horizon wait for a refresh"""
+        if self._deadlines.get(website_id) == deadline:
+            return
+        if self._last_refresh is not None:
+            if deadline > self._last_refresh + timedelta(seconds=self.horizon):
+                self._deadlines.pop(website_id, None)
+                return
+        self._deadlines[website_id] = deadline
+        heapq.heappush(self._heap, (deadline, website_id))
+
+    def discard(self, website_id):
+        self._deadlines.pop(website_id, None)
+
+    def pop_due(self, now=None):
+        """Remove and return the ids of every website whose deadline has passed"""
+        now = now or datetime.utcnow()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, website_id = heapq.heappop(self._heap)
+            if self._deadlines.get(website_id) != deadline:
+                continue  # superseded or discarded
+            del self._deadlines[website_id]
+            due.append(website_id)
+        return due
+
+    def seconds_until_next(self, now=None):
+        """How long the caller can sleep before a check or a refresh is due"""
+        now = now or datetime.utcnow()
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+        wait = self.refresh_interval
+        if self._last_refresh is not None:
+            wait = self.refresh_interval - (now - self._last_refresh).total_seconds()
+        if self._heap:
+            wait = min(wait, (self._heap[0][0] - now).total_seconds())
+        return max(0.0, wait)
+
+
+class SchedulingLag:
+    """How late probes start relative to their deadlines, over the last `window` probes"""
+
+    def __init__(self, window=LAG_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.observed = 0
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(max(0.0, seconds))
+            self.observed += 1
+
+    def stats(self):
+        with self._lock:
+            samples = sorted(self._samples)
+            observed = self.observed
+        if not samples:
+            return {'observed': observed, 'p50': None, 'p99': None, 'max': None}
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3)
+
+        return {
+            'observed': observed,
+            'p50': percentile(0.5),
+            'p99': percentile(0.99),
+            'max': round(samples[-1], 3)
+        }
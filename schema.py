@@ -0,0 +1,61 @@
+"""
+UptimePro Schema
+Brings tables created by an older release up to the current models at startup
+"""
+
+import logging
+
+from sqlalchemy import inspect, text
+
+from src.models.user import db
+
+logger = logging.getLogger(__name__)
+
+
+def upgrade(engine, metadata=db.metadata):
+    """Add the columns and indexes the models define but existing tables lack; returns what was added.
+
+    db.create_all() only creates missing tables, so a database created by an
+    earlier release keeps its old `website` and `uptime_check` layout and the
+    first query selecting a new column fails. New columns are nullable, so
+    they are added in place and rows that predate them get the column's
+    Python default when it has one (e.g. next_check_at = now). A NOT NULL
+    column without a server default cannot be added to a populated table;
+    that stops startup with an error naming it instead of failing later.
+    """
+    preparer = engine.dialect.identifier_preparer
+    added = []
+
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        existing_tables = set(inspector.get_table_names())
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue  # create_all makes it with the current layout
+
+            columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in columns:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} to an existing table; "
+                                       f"migrate it by hand")
+                connection.execute(text(
+                    f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} "
+                    f"{column.type.compile(dialect=engine.dialect)}"
+                ))
+                default = column.default
+                if default is not None and (default.is_scalar or default.is_callable):
+                    value = default.arg(None) if default.is_callable else default.arg
+                    connection.execute(table.update().values({column.name: value}))
+                added.append(f'{table.name}.{column.name}')
+
+            indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(connection)
+                    added.append(index.name)
+
+    for name in added:
+        logger.warning(f"Schema upgrade: added {name}")
+    return added
@@ -0,0 +1,138 @@
+"""
+UptimePro Latency Sketch
+Mergeable, relative-error quantile sketch (DDSketch style) with a compact binary encoding
+"""
+
+import math
+import os
+
+SKETCH_RELATIVE_ACCURACY = float(os.getenv('SKETCH_RELATIVE_ACCURACY', 0.01))  # 1% of the true value
+SKETCH_MAX_BINS = int(os.getenv('SKETCH_MAX_BINS', 1024))  # lowest bins are folded together beyond this
+SKETCH_ENCODING_VERSION = 1
+ACCURACY_UNIT = 1e-6  # relative accuracy is stored in millionths
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, position):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
+
+
+class LatencySketch:
+    """Counts of latencies in logarithmic bins, so any quantile is within `relative_accuracy` of the truth.
+
+    Bin i holds values in (gamma^(i-1), gamma^i] with gamma = (1+a)/(1-a);
+    values below 1 ms go to a separate zero bin. Two sketches built with
+    the same accuracy merge exactly by adding bin counts, which is what
+    makes per-bucket sketches combinable into any window; a sketch with a
+    different accuracy is re-binned through its bin midpoints first, which
+    adds at most its own error. Memory is at most `max_bins` counters
+    whatever the number of values; when that is exceeded the lowest bins
+    are folded into one, which only affects the accuracy of the very lowest
+    quantiles.
+    """
+
+    __slots__ = ('relative_accuracy', 'gamma', 'log_gamma', 'max_bins', 'bins', 'zero_count', 'count')
+
+    def __init__(self, relative_accuracy=SKETCH_RELATIVE_ACCURACY, max_bins=SKETCH_MAX_BINS):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_bins = max_bins
+        self.bins = {}  # bin index -> count
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value, count=1):
+        if value < 1:
+            self.zero_count += count
+        else:
+            index = math.ceil(math.log(value) / self.log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + count
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+        self.count += count
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            for index, count in other.bins.items():
+                self.add(2 * other.gamma ** index / (other.gamma + 1), count)
+            self.zero_count += other.zero_count
+            self.count += other.zero_count
+            return self
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+        return self
+
+    def _collapse(self):
+        indexes = sorted(self.bins)
+        excess = indexes[:len(indexes) - self.max_bins + 1]
+        folded = sum(self.bins.pop(index) for index in excess)
+        target = indexes[len(excess)]
+        self.bins[target] += folded
+
+    def quantile(self, q):
+        """Estimated value at quantile q in [0, 1], or None for an empty sketch"""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_bytes(self):
+        """version, accuracy, zero count, bin count, then (index delta, count) varint pairs in index order"""
+        out = bytearray([SKETCH_ENCODING_VERSION])
+        _write_varint(out, round(self.relative_accuracy / ACCURACY_UNIT))
+        _write_varint(out, self.zero_count)
+        _write_varint(out, len(self.bins))
+        previous = 0
+        for index in sorted(self.bins):
+            _write_varint(out, index - previous)
+            _write_varint(out, self.bins[index])
+            previous = index
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data, relative_accuracy=SKETCH_RELATIVE_ACCURACY, max_bins=SKETCH_MAX_BINS):
+        """Decode a sketch, converted to `relative_accuracy` if it was written with another one"""
+        if not data:
+            return cls(relative_accuracy, max_bins)
+        if data[0] != SKETCH_ENCODING_VERSION:
+            raise ValueError(f'Unknown sketch encoding version {data[0]}')
+        stored_accuracy, position = _read_varint(data, 1)
+        sketch = cls(stored_accuracy * ACCURACY_UNIT, max_bins)
+        sketch.zero_count, position = _read_varint(data, position)
+        bins, position = _read_varint(data, position)
+        index = 0
+        for _ in range(bins):
+            delta, position = _read_varint(data, position)
+            count, position = _read_varint(data, position)
+            index += delta
+            sketch.bins[index] = count
+        sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        if stored_accuracy != round(relative_accuracy / ACCURACY_UNIT):
+            return cls(relative_accuracy, max_bins).merge(sketch)
+        return sketch
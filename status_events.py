@@ -0,0 +1,266 @@
+"""
+UptimePro Status Events
+Fans website status transitions out to Server-Sent Events subscribers
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import deque
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from src.models.website import Website, HOME_LOCATION
+
+logger = logging.getLogger(__name__)
+
+STATUS_STREAM_QUEUE = int(os.getenv('STATUS_STREAM_QUEUE', 100))  # undelivered events kept per connection
+STATUS_STREAM_KEEPALIVE = float(os.getenv('STATUS_STREAM_KEEPALIVE', 15))  # seconds between idle pings
+STATUS_STREAM_MAX_CONNECTIONS = int(os.getenv('STATUS_STREAM_MAX_CONNECTIONS', 100))  # keep below the WSGI thread count
+STATUS_STREAM_MAX_PER_USER = int(os.getenv('STATUS_STREAM_MAX_PER_USER', 5))  # open tabs per user
+STATUS_STREAM_TOKEN_TTL = int(os.getenv('STATUS_STREAM_TOKEN_TTL', 60))  # seconds a stream token can be used to connect
+
+
+def format_event(name, data):
+    """One SSE frame"""
+    return f'event: {name}\ndata: {json.dumps(data)}\n\n'
+
+
+class Subscriber:
+    """One connected stream: a bounded event queue and a wakeup flag, nothing else.
+
+    If a slow client lets the queue overflow, the oldest events are dropped
+    and the next read starts with a `resync` event telling it to refetch.
+    """
+
+    __slots__ = ('user_id', 'events', 'wakeup', 'overflowed')
+
+    def __init__(self, user_id, queue_size):
+        self.user_id = user_id
+        self.events = deque(maxlen=queue_size)
+        self.wakeup = threading.Event()
+        self.overflowed = False
+
+    def publish(self, frame):
+        if len(self.events) == self.events.maxlen:
+            self.overflowed = True
+        self.events.append(frame)
+        self.wakeup.set()
+
+    def drain(self, timeout):
+        """Frames published since the last call, waiting up to `timeout` seconds for the first"""
+        if not self.events:
+            self.wakeup.clear()
+            if not self.events:
+                self.wakeup.wait(timeout)
+        frames = []
+        if self.overflowed:
+            self.overflowed = False
+            frames.append(format_event('resync', {}))
+        while self.events:
+            frames.append(self.events.popleft())
+        return frames
+
+
+class StatusBroker:
+    """Tracks the status of every website whose owner has a stream open.
+
+    Checks arrive from CheckWriter flushes in this process and from the
+    CheckTail thread, which is how checks written by the worker are seen;
+    no connection ever queries the DB after it subscribed. Each up/down transition is published once to every stream of
+    the owner as a `status` event followed by the new `counts`.
+
+    The broker's own state per connection is one small deque and an Event,
+    but under a threaded WSGI server every open stream also pins a worker
+    thread for as long as it stays connected (a greenlet under gevent). So
+    connections are capped at `max_connections` per process, and
+    `max_per_user` per user, and `subscribe` refuses beyond that. Keep the
+    cap below the server's thread count so streams cannot starve ordinary
+    requests, or run the API under gevent and raise it.
+    """
+
+    def __init__(self, queue_size=STATUS_STREAM_QUEUE, max_connections=STATUS_STREAM_MAX_CONNECTIONS,
+                 max_per_user=STATUS_STREAM_MAX_PER_USER):
+        self.queue_size = queue_size
+        self.max_connections = max_connections
+        self.max_per_user = max_per_user
+        self.serializer = None
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user_id -> set of Subscriber
+        self._sites = {}  # website_id -> [user_id, status, last checked]
+        self._user_sites = {}  # user_id -> set of website ids
+        self._connections = 0
+        self.events_published = 0
+        self.refused = 0
+
+    def init_app(self, app):
+        """Sign stream tokens with the app's secret key"""
+        self.serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='status-stream')
+
+    def issue_token(self, user_id):
+        """Short-lived signed token that opens a stream for `user_id` (EventSource cannot send headers)"""
+        return self.serializer.dumps({'user_id': user_id})
+
+    def read_token(self, token):
+        """The user id a stream token was issued for, or None if it is forged or expired"""
+        try:
+            return self.serializer.loads(token, max_age=STATUS_STREAM_TOKEN_TTL)['user_id']
+        except (BadSignature, SignatureExpired, KeyError, TypeError):
+            return None
+
+    def has_room(self, user_id):
+        return (self._connections < self.max_connections and
+                len(self._subscribers.get(user_id, ())) < self.max_per_user)
+
+    def _counts(self, user_id):
+        statuses = [self._sites[website_id][1] for website_id in self._user_sites.get(user_id, ())]
+        return {
+            'total_websites': len(statuses),
+            'up_websites': statuses.count('up'),
+            'down_websites': statuses.count('down')
+        }
+
+    def _publish(self, user_id, frame):
+        for subscriber in self._subscribers.get(user_id, ()):
+            subscriber.publish(frame)
+            self.events_published += 1
+
+    def subscribe(self, session, user_id):
+        """Register a stream for `user_id`; its first event is the current counts. None when at capacity."""
+        subscriber = Subscriber(user_id, self.queue_size)
+        rows = None
+        with self._lock:
+            if not self.has_room(user_id):
+                self.refused += 1
+                return None
+            tracked = user_id in self._subscribers
+        if not tracked:
+            rows = session.query(Website.id, Website.current_status, Website.last_checked).filter(
+                Website.user_id == user_id
+            ).all()
+
+        with self._lock:
+            if not self.has_room(user_id):
+                self.refused += 1
+                return None
+            if user_id not in self._subscribers:
+                self._subscribers[user_id] = set()
+                self._user_sites[user_id] = set()
+                for website_id, status, last_checked in rows or ():
+                    self._sites[website_id] = [user_id, status, last_checked]
+                    self._user_sites[user_id].add(website_id)
+            self._subscribers[user_id].add(subscriber)
+            self._connections += 1
+            subscriber.publish(format_event('counts', self._counts(user_id)))
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.user_id)
+            if subscribers is None or subscriber not in subscribers:
+                return
+            subscribers.discard(subscriber)
+            self._connections -= 1
+            if not subscribers:
+                del self._subscribers[subscriber.user_id]
+                for website_id in self._user_sites.pop(subscriber.user_id, ()):
+                    self._sites.pop(website_id, None)
+
+    def _apply(self, website_id, user_id, timestamp, status, response_time):
+        site = self._sites.get(website_id)
+        if site is None:
+            if user_id is None or user_id not in self._subscribers:
+                return
+            site = self._sites[website_id] = [user_id, None, None]  # added since the stream opened
+            self._user_sites[user_id].add(website_id)
+        if site[2] is not None and timestamp <= site[2]:
+            return  # already seen through the other path
+        previous = site[1]
+        site[1], site[2] = status, timestamp
+        if status == previous:
+            return
+        self._publish(site[0], format_event('status', {
+            'website_id': website_id,
+            'status': status,
+            'previous_status': previous,
+            'last_checked': timestamp.isoformat(),
+            'response_time': response_time
+        }))
+        self._publish(site[0], format_event('counts', self._counts(site[0])))
+
+    def feed(self, checks):
+        """CheckWriter and CheckTail listener: publish transitions in freshly written checks"""
+        with self._lock:
+            if not self._subscribers:
+                return
+            for check in checks:
+                if check.get('location') not in (None, HOME_LOCATION):
+                    continue  # agent checks are history only; status follows the home worker
+                self._apply(check['website_id'], check.get('user_id'), check['timestamp'], check['status'],
+                            check.get('response_time'))
+
+    def track_website(self, website_id, user_id, status):
+        with self._lock:
+            if user_id not in self._subscribers or website_id in self._sites:
+                return
+            self._sites[website_id] = [user_id, status, None]
+            self._user_sites[user_id].add(website_id)
+            self._publish(user_id, format_event('counts', self._counts(user_id)))
+
+    def forget_website(self, website_id):
+        with self._lock:
+            site = self._sites.pop(website_id, None)
+            if site is None:
+                return
+            self._user_sites.get(site[0], set()).discard(website_id)
+            self._publish(site[0], format_event('counts', self._counts(site[0])))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._subscribers),
+                'connections': self._connections,
+                'max_connections': self.max_connections,
+                'refused': self.refused,
+                'websites': len(self._sites),
+                'events_published': self.events_published
+            }
+
+
+# Status stream fan-out for the API process, fed by check_writer and check_tail in main.py
+status_broker = StatusBroker()
+
+
+# Websites added or removed through the API change the owner's counts once the change commits;
+# the mapper events fire at flush time, so they only note it and rolled-back changes are never sent
+def _note_website_change(target, change):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('status_stream_changes', []).append(change)
+
+
+@event.listens_for(Website, 'after_insert')
+def _track_website(mapper, connection, target):
+    _note_website_change(target, ('track', target.id, target.user_id, target.current_status))
+
+
+@event.listens_for(Website, 'after_delete')
+def _forget_website(mapper, connection, target):
+    _note_website_change(target, ('forget', target.id))
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_website_changes(session):
+    for change in session.info.pop('status_stream_changes', ()):
+        if change[0] == 'track':
+            status_broker.track_website(*change[1:])
+        else:
+            status_broker.forget_website(change[1])
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_website_changes(session):
+    session.info.pop('status_stream_changes', None)
@@ -0,0 +1,37 @@
+"""
+UptimePro Probe Agents tests
+Validation of the results agents post
+"""
+
+import json
+
+from src.routes.agents import AGENT_MAX_CLOCK_SKEW, parse_result
+
+NOW = 1772366400.0
+
+
+def result(**fields):
+    item = {'website_id': 7, 'checked_at': NOW - 5, 'status': 'up', 'response_time': 120.4, 'status_code': 200}
+    item.update(fields)
+    return item
+
+
+def test_valid_result_becomes_a_check():
+    check = parse_result(result(), 'eu-west', NOW)
+
+    assert check['website_id'] == 7
+    assert check['location'] == 'eu-west'
+    assert (check['response_time'], check['status_code'], check['ttfb']) == (120, 200, None)
+
+
+def test_malformed_and_out_of_range_results_are_rejected():
+    assert parse_result(result(status='degraded'), 'eu-west', NOW) is None
+    assert parse_result(result(website_id='seven'), 'eu-west', NOW) is None
+    assert parse_result(result(checked_at=NOW + AGENT_MAX_CLOCK_SKEW + 1), 'eu-west', NOW) is None
+
+
+def test_non_finite_numbers_are_rejected():
+    for field, raw in (('checked_at', 'NaN'), ('checked_at', '1e999'), ('response_time', 'Infinity'),
+                       ('ttfb', '-Infinity'), ('response_time', 'NaN')):
+        item = json.loads(json.dumps(result())[:-1] + f', "{field}": {raw}}}')
+        assert parse_result(item, 'eu-west', NOW) is None, (field, raw)
@@ -0,0 +1,139 @@
+"""
+UptimePro Alert Dispatcher tests
+Retries with backoff, skipped channels and SMTP connection reuse
+"""
+
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src import alerts
+from src.alerts import AlertDispatcher, SMTPPool
+
+WEBSITE = {'id': 1, 'name': 'site', 'url': 'https://site.example.com', 'user_id': 1}
+
+
+@pytest.fixture
+def webhook():
+    """Local webhook receiver answering 500 to the first `failures` requests, then 200"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            with server.lock:
+                server.requests += 1
+                failed = server.requests <= server.failures
+            self.send_response(500 if failed else 200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.failures = 0
+    server.url = f'http://127.0.0.1:{server.server_port}/hook'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_failed_webhook_is_retried_until_it_succeeds(webhook):
+    webhook.failures = 2
+    dispatcher = AlertDispatcher(workers=2, retry_base=0.01)
+    dispatcher.start()
+    try:
+        assert dispatcher.enqueue('webhook', webhook.url, WEBSITE, 'timeout')
+        wait_for(lambda: dispatcher.stats()['channels']['webhook']['sent'] == 1)
+    finally:
+        dispatcher.stop()
+
+    assert webhook.requests == 3
+    assert dispatcher.stats()['channels']['webhook']['retried'] == 2
+
+
+def test_webhook_gives_up_after_max_attempts(webhook):
+    webhook.failures = 100
+    dispatcher = AlertDispatcher(workers=1, max_attempts=3, retry_base=0.01)
+    dispatcher.start()
+    try:
+        dispatcher.enqueue('webhook', webhook.url, WEBSITE, 'timeout')
+        wait_for(lambda: dispatcher.stats()['channels']['webhook']['failed'] == 1)
+    finally:
+        dispatcher.stop()
+
+    assert webhook.requests == 3
+    assert dispatcher.pending() == 0
+
+
+def test_unconfigured_channels_are_skipped():
+    dispatcher = AlertDispatcher(smtp_pool=SMTPPool('smtp.example.com', 587, None, None), sms_gateway_url=None)
+
+    assert not dispatcher.enqueue('email', 'owner@example.com', WEBSITE, 'timeout')
+    assert not dispatcher.enqueue('sms', '+15550100', WEBSITE, 'timeout')
+
+    channels = dispatcher.stats()['channels']
+    assert channels['email']['skipped'] == channels['sms']['skipped'] == 1
+    assert dispatcher.pending() == 0
+
+
+class FakeSMTP:
+    instances = []
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = 0
+        self.fail = False
+        self.closed = False
+        FakeSMTP.instances.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        pass
+
+    def noop(self):
+        return (250, b'OK')
+
+    def send_message(self, message):
+        if self.fail:
+            raise smtplib.SMTPServerDisconnected('connection lost')
+        self.sent += 1
+
+    def close(self):
+        self.closed = True
+
+    def quit(self):
+        self.closed = True
+
+
+def test_smtp_pool_reuses_connections_and_drops_broken_ones(monkeypatch):
+    FakeSMTP.instances = []
+    monkeypatch.setattr(alerts.smtplib, 'SMTP', FakeSMTP)
+    pool = SMTPPool('smtp.example.com', 587, 'alerts@example.com', 'secret', size=1)
+
+    for _ in range(3):
+        pool.send(EmailMessage())
+    assert (pool.connects, pool.reuses) == (1, 2)
+
+    FakeSMTP.instances[0].fail = True
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        pool.send(EmailMessage())
+    assert FakeSMTP.instances[0].closed
+
+    pool.send(EmailMessage())
+    assert pool.connects == 2
+    assert FakeSMTP.instances[1].sent == 1
@@ -0,0 +1,79 @@
+"""
+UptimePro API Authentication tests
+Cached API keys are dropped when a change to the user or plan commits, and only then
+"""
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from src.api_auth import ApiKeyCache, ApiUser, api_key_cache
+from src.models.user import db, User
+from src.models.website import Subscription
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    api_key_cache.clear()
+    with Session(engine) as session:
+        user = User(username='owner', email='owner@example.com', password_hash='x')
+        session.add(user)
+        session.add(Subscription(user=user, plan='free', max_websites=5, min_check_interval=1800, history_days=7))
+        session.commit()
+        yield session
+    api_key_cache.clear()
+    engine.dispose()
+
+
+def cache_owner(session):
+    user = session.query(User).one()
+    api_key_cache.put(ApiUser(user, user.subscription))
+    return user
+
+
+def test_plan_change_invalidates_after_commit(session):
+    user = cache_owner(session)
+
+    user.subscription.plan = 'pro'
+    session.flush()
+    assert api_key_cache.get(user.api_key) is not None  # other requests still read the old row
+
+    session.commit()
+    assert api_key_cache.get(user.api_key) is None
+
+
+def test_rolled_back_change_keeps_the_entry(session):
+    user = cache_owner(session)
+
+    user.subscription.plan = 'pro'
+    session.flush()
+    session.rollback()
+
+    assert api_key_cache.get(user.api_key).plan == 'free'
+
+
+def test_lookup_started_before_an_invalidation_is_not_cached(session):
+    user = session.query(User).one()
+    generation = api_key_cache.generation
+    api_key_cache.invalidate_user(user.id)
+
+    api_key_cache.put(ApiUser(user, user.subscription), generation)
+
+    assert api_key_cache.get(user.api_key) is None
+
+
+def test_entries_expire_and_are_evicted_oldest_first(session):
+    user = session.query(User).one()
+    expired = ApiKeyCache(ttl=0)
+    expired.put(ApiUser(user, None))
+    assert expired.get(user.api_key) is None
+
+    small = ApiKeyCache(maxsize=1)
+    other = User(username='other', email='other@example.com', password_hash='x')
+    small.put(ApiUser(user, None))
+    small.put(ApiUser(other, None))
+    assert small.get(user.api_key) is None
+    assert small.get(other.api_key).plan == 'free'
+    assert small.stats()['evictions'] == 1
@@ -0,0 +1,68 @@
+"""
+UptimePro Check Tail tests
+Rows committed out of id order are still delivered, and gaps that never fill expire
+"""
+
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from src.check_tail import CheckTail
+from src.models.user import db, User
+from src.models.website import Website, UptimeCheck
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    with Session(engine) as session:
+        user = User(username='owner', email='owner@example.com', password_hash='x')
+        session.add(user)
+        session.flush()
+        session.add(Website(id=1, user_id=user.id, name='site', url='https://site.example.com'))
+        session.commit()
+        yield session
+    engine.dispose()
+
+
+def add_check(session, check_id):
+    session.add(UptimeCheck(id=check_id, website_id=1, timestamp=datetime(2026, 3, 1, 12, 0), status='up',
+                            response_time=100))
+    session.commit()
+
+
+def test_late_commits_below_the_watermark_are_delivered(session):
+    delivered = []
+    tail = CheckTail(gap_timeout=60)
+    tail.add_listener(lambda checks: delivered.extend(checks))
+    add_check(session, 5)
+    assert tail.poll(session) == 0  # starts at the current maximum
+
+    add_check(session, 8)
+    assert tail.poll(session) == 1
+    assert tail.stats()['gaps'] == 2  # 6 and 7 not committed yet
+
+    add_check(session, 7)
+    assert tail.poll(session) == 1
+    assert tail.stats()['gaps_filled'] == 1
+    assert tail.poll(session) == 0
+
+    assert len(delivered) == 2
+    assert delivered[0]['website_id'] == 1 and delivered[0]['user_id'] is not None
+
+
+def test_gaps_that_never_fill_expire(session):
+    tail = CheckTail(gap_timeout=0.01)
+    tail.poll(session)
+    add_check(session, 3)
+    tail.poll(session)
+    assert tail.stats()['gaps'] == 2
+
+    time.sleep(0.02)
+    tail.poll(session)
+    assert tail.stats()['gaps'] == 0
+    assert tail.stats()['gaps_expired'] == 2
@@ -0,0 +1,74 @@
+"""
+UptimePro Check Writer tests
+Deleted websites and failing flushes must not wedge the write-behind buffer
+"""
+
+from contextlib import nullcontext
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from src.check_writer import CheckWriter
+from src.models.user import db, User
+from src.models.website import Website, UptimeCheck
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    with Session(engine) as session:
+        user = User(username='owner', email='owner@example.com', password_hash='x')
+        session.add(user)
+        session.flush()
+        session.add_all([Website(user_id=user.id, name=f'site {n}', url=f'https://{n}.example.com') for n in range(2)])
+        session.commit()
+        yield session
+    engine.dispose()
+
+
+def result(status='up'):
+    return {'status': status, 'response_time': 42, 'status_code': 200 if status == 'up' else 503}
+
+
+def test_flush_discards_checks_for_a_deleted_website(session):
+    writer = CheckWriter(session_scope=lambda: nullcontext(session))
+    kept, deleted = session.query(Website).order_by(Website.id).all()
+    now = datetime.utcnow()
+    writer.add(kept.id, result('down'), checked_at=now, next_check_at=now)
+    writer.add(deleted.id, result(), checked_at=now, next_check_at=now)
+
+    session.delete(deleted)
+    session.commit()
+
+    assert writer.flush() == 1
+    assert len(writer) == 0
+    assert writer.discarded == 1
+    assert session.query(UptimeCheck.website_id).all() == [(kept.id,)]
+    session.expire_all()
+    assert session.get(Website, kept.id).current_status == 'down'
+
+    # Later checks keep flowing
+    writer.add(kept.id, result(), checked_at=datetime.utcnow())
+    assert writer.flush() == 1
+
+
+def test_batch_is_dropped_after_max_retries(session):
+    writer = CheckWriter(session_scope=lambda: nullcontext(session), max_delay=0, max_retries=2)
+    website = session.query(Website).first()
+    writer.add(website.id, result(), checked_at=datetime.utcnow())
+    writer.add(website.id, {'status': None}, checked_at=datetime.utcnow())  # violates UptimeCheck.status NOT NULL
+
+    with pytest.raises(Exception):
+        writer.flush()
+    assert len(writer) == 2  # kept for a retry
+
+    with pytest.raises(Exception):
+        writer.flush()
+    assert len(writer) == 0
+    assert writer.dropped == 2
+
+    writer.add(website.id, result(), checked_at=datetime.utcnow())
+    assert writer.flush() == 1
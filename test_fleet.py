@@ -0,0 +1,56 @@
+"""
+UptimePro Worker Fleet tests
+Shard leases are split fairly, never shared, and move once their owner stops renewing
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from src.fleet import ShardCoordinator
+from src.models.user import db
+from src.models.website import ShardLease
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "fleet.db"}')  # one connection per worker session
+    db.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_shards_are_split_between_live_workers(engine):
+    now = datetime(2026, 3, 1, 12, 0)
+    with Session(engine) as session_a, Session(engine) as session_b:
+        a = ShardCoordinator(session_a, worker_id='a', num_shards=4, lease_ttl=30)
+        b = ShardCoordinator(session_b, worker_id='b', num_shards=4, lease_ttl=30)
+
+        assert a.heartbeat(now) == ({0, 1, 2, 3}, set())
+        assert b.heartbeat(now + timedelta(seconds=1)) == (set(), set())  # nothing free until A gives back
+
+        a.heartbeat(now + timedelta(seconds=2))
+        b.heartbeat(now + timedelta(seconds=3))
+
+        assert len(a.owned) == len(b.owned) == 2
+        assert not a.owned & b.owned
+        owners = {lease.shard: lease.owner for lease in session_a.query(ShardLease)}
+        assert owners == {shard: 'a' if shard in a.owned else 'b' for shard in range(4)}
+
+
+def test_expired_leases_move_to_a_live_worker(engine):
+    now = datetime(2026, 3, 1, 12, 0)
+    with Session(engine) as session_a, Session(engine) as session_b:
+        a = ShardCoordinator(session_a, worker_id='a', num_shards=4, lease_ttl=30)
+        b = ShardCoordinator(session_b, worker_id='b', num_shards=4, lease_ttl=30)
+        a.heartbeat(now)
+
+        assert a.owns(1, now + timedelta(seconds=23))
+        assert not a.owns(1, now + timedelta(seconds=24))  # stops probing before the lease can move
+
+        b.heartbeat(now + timedelta(seconds=29))
+        assert b.owned == frozenset()
+        b.heartbeat(now + timedelta(seconds=31))
+        assert b.owned == {0, 1, 2, 3}
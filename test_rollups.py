@@ -0,0 +1,72 @@
+"""
+UptimePro Rollups tests
+Window covers and incremental bucket upserts
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from src.models.user import db, User
+from src.models.website import Website, UptimeRollup
+from src.rollups import apply_checks, cover, uptime_summary
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    with Session(engine) as session:
+        user = User(username='owner', email='owner@example.com', password_hash='x')
+        session.add(user)
+        session.flush()
+        session.add(Website(user_id=user.id, name='site', url='https://site.example.com'))
+        session.commit()
+        yield session
+    engine.dispose()
+
+
+def test_cover_is_contiguous_and_uses_the_coarsest_buckets():
+    since = datetime(2026, 3, 1, 22, 17, 30)
+    until = datetime(2026, 3, 4, 1, 5, 10)
+
+    ranges = cover(since, until)
+
+    assert [granularity for granularity, _, _ in ranges] == ['minute', 'hour', 'day', 'hour', 'minute']
+    assert ranges[0][1] == datetime(2026, 3, 1, 22, 17)
+    assert ranges[-1][2] == datetime(2026, 3, 4, 1, 6)
+    for (_, _, end), (_, start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+    assert ranges[2][1:] == (datetime(2026, 3, 2), datetime(2026, 3, 4))
+
+
+def test_cover_of_a_short_window_is_minutes_only():
+    since = datetime(2026, 3, 1, 10, 5)
+    assert cover(since, since + timedelta(minutes=20)) == [('minute', since, since + timedelta(minutes=20))]
+    assert cover(since, since) == []
+
+
+def test_apply_checks_adds_to_existing_buckets(session):
+    website = session.query(Website).one()
+    start = datetime(2026, 3, 1, 10, 0, 5)
+
+    def check(offset, status, latency):
+        return {'website_id': website.id, 'timestamp': start + timedelta(seconds=offset),
+                'status': status, 'response_time': latency}
+
+    apply_checks(session, [check(0, 'up', 100), check(30, 'down', 5000)])
+    apply_checks(session, [check(70, 'up', 40), check(90, 'up', 300)])
+    session.commit()
+
+    minutes = session.query(UptimeRollup).filter_by(granularity='minute').order_by(UptimeRollup.bucket_start).all()
+    assert [(rollup.check_count, rollup.up_count) for rollup in minutes] == [(2, 1), (2, 2)]
+    hour = session.query(UptimeRollup).filter_by(granularity='hour').one()
+    assert (hour.check_count, hour.up_count, hour.latency_sum) == (4, 3, 440)
+    assert (hour.latency_min, hour.latency_max) == (40, 300)  # down checks carry no latency
+
+    summary = uptime_summary(session, [website.id], start - timedelta(minutes=1), start + timedelta(hours=2))
+    assert summary['checks'] == 4
+    assert summary['uptime_percentage'] == 75
+    assert summary['avg_response_time'] == round(440 / 3)
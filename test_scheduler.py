@@ -0,0 +1,53 @@
+"""
+UptimePro Check Scheduler tests
+Deadline heap ordering, re-timing and stable phase offsets
+"""
+
+from datetime import datetime, timedelta
+
+from src.scheduler import CheckScheduler, next_check_time, phase_offset
+
+
+def test_pop_due_returns_due_websites_in_deadline_order():
+    now = datetime(2026, 3, 1, 12, 0)
+    scheduler = CheckScheduler(session=None)
+    scheduler.schedule(1, now + timedelta(seconds=30))
+    scheduler.schedule(2, now - timedelta(seconds=5))
+    scheduler.schedule(3, now - timedelta(seconds=20))
+
+    assert scheduler.pop_due(now) == [3, 2]
+    assert len(scheduler) == 1
+    assert scheduler.seconds_until_next(now) == 5.0  # refresh is due first
+    assert scheduler.pop_due(now + timedelta(seconds=30)) == [1]
+
+
+def test_rescheduled_and_discarded_entries_are_skipped():
+    now = datetime(2026, 3, 1, 12, 0)
+    scheduler = CheckScheduler(session=None)
+    scheduler.schedule(1, now - timedelta(seconds=10))
+    scheduler.schedule(1, now + timedelta(seconds=60))  # re-timed; the old heap entry is stale
+    scheduler.schedule(2, now - timedelta(seconds=10))
+    scheduler.discard(2)
+
+    assert scheduler.pop_due(now) == []
+    assert scheduler.pop_due(now + timedelta(seconds=60)) == [1]
+    assert len(scheduler) == 0
+
+
+def test_phase_offsets_are_stable_and_within_the_interval():
+    offsets = [phase_offset(website_id, 60) for website_id in range(1, 61)]
+
+    assert all(0 <= offset < 60 for offset in offsets)
+    assert offsets == [phase_offset(website_id, 60) for website_id in range(1, 61)]
+    assert len({int(offset) for offset in offsets}) > 30  # consecutive ids spread out
+
+
+def test_next_check_time_lands_on_the_websites_slot():
+    after = datetime(2026, 3, 1, 12, 0, 7)
+    for website_id in (1, 2, 3, 1000):
+        deadline = next_check_time(website_id, 60, after)
+        slots = ((deadline - datetime(1970, 1, 1)).total_seconds() - phase_offset(website_id, 60)) / 60
+
+        assert abs(slots - round(slots)) < 1e-6
+        assert after + timedelta(seconds=30) <= deadline < after + timedelta(seconds=90)
+        assert next_check_time(website_id, 60, after + timedelta(seconds=70)) > deadline
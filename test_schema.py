@@ -0,0 +1,37 @@
+"""
+UptimePro Schema tests
+A database created by an older release gains the new columns and indexes in place
+"""
+
+from sqlalchemy import create_engine, inspect, text
+
+from src import schema
+from src.models.user import db
+from src.models.website import Website
+
+
+def test_upgrade_adds_missing_columns_and_indexes():
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        # Rebuild the website table without next_check_at, as an older release left it
+        connection.execute(text('DROP TABLE website'))
+        connection.execute(text(
+            'CREATE TABLE website (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, '
+            'url VARCHAR(500) NOT NULL, check_interval INTEGER, is_active BOOLEAN, created_at DATETIME, '
+            'last_checked DATETIME, current_status VARCHAR(20))'
+        ))
+        connection.execute(text("INSERT INTO website (id, user_id, name, url) VALUES (1, 1, 'old', 'https://old.example.com')"))
+
+    added = schema.upgrade(engine)
+
+    assert 'website.next_check_at' in added
+    assert 'ix_website_next_check_at' in {index['name'] for index in inspect(engine).get_indexes('website')}
+    with engine.connect() as connection:
+        name, next_check_at = connection.execute(
+            Website.__table__.select().with_only_columns(Website.name, Website.next_check_at)
+        ).one()
+    assert name == 'old'
+    assert next_check_at is not None  # backfilled from the column default
+
+    assert schema.upgrade(engine) == []
@@ -0,0 +1,67 @@
+"""
+UptimePro Latency Sketch tests
+Quantile accuracy, merging and the stored encoding
+"""
+
+import random
+
+import pytest
+
+from src.sketch import LatencySketch
+
+
+def exact_quantile(values, q):
+    return sorted(values)[int(q * (len(values) - 1))]
+
+
+@pytest.fixture
+def latencies():
+    rng = random.Random(7)
+    return [rng.lognormvariate(5, 1) for _ in range(5000)] + [0.5] * 50
+
+
+def test_quantiles_are_within_the_relative_accuracy(latencies):
+    sketch = LatencySketch(relative_accuracy=0.01)
+    for value in latencies:
+        sketch.add(value)
+
+    assert sketch.count == len(latencies)
+    assert sketch.quantile(0.001) == 0.0  # below 1 ms
+    for q in (0.5, 0.9, 0.99):
+        assert sketch.quantile(q) == pytest.approx(exact_quantile(latencies, q), rel=0.01)
+    assert LatencySketch().quantile(0.5) is None
+
+
+def test_merged_sketches_match_one_sketch_of_all_values(latencies):
+    whole, first, second = LatencySketch(), LatencySketch(), LatencySketch()
+    for n, value in enumerate(latencies):
+        whole.add(value)
+        (first if n % 2 else second).add(value)
+
+    first.merge(second)
+
+    assert (first.bins, first.zero_count, first.count) == (whole.bins, whole.zero_count, whole.count)
+
+
+def test_encoding_round_trips(latencies):
+    sketch = LatencySketch()
+    for value in latencies:
+        sketch.add(value)
+
+    decoded = LatencySketch.from_bytes(sketch.to_bytes())
+
+    assert (decoded.bins, decoded.zero_count, decoded.count) == (sketch.bins, sketch.zero_count, sketch.count)
+    assert LatencySketch.from_bytes(None).count == 0
+
+
+def test_sketches_stored_with_another_accuracy_are_converted(latencies):
+    coarse = LatencySketch(relative_accuracy=0.02)
+    for value in latencies:
+        coarse.add(value)
+
+    decoded = LatencySketch.from_bytes(coarse.to_bytes(), relative_accuracy=0.01)
+
+    assert decoded.relative_accuracy == 0.01
+    assert decoded.count == len(latencies)
+    for q in (0.5, 0.9, 0.99):
+        assert decoded.quantile(q) == pytest.approx(exact_quantile(latencies, q), rel=0.03)
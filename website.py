@@ -1,10 +1,14 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from src.models.user import db
+from sqlalchemy import event
+import secrets
+
+HOME_LOCATION = 'US-East'  # where the central worker probes from; probe agents report their own
 
 class Website(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     url = db.Column(db.String(500), nullable=False)
     check_interval = db.Column(db.Integer, default=1800)  # seconds, default 30 minutes
@@ -12,12 +16,25 @@ class Website(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_checked = db.Column(db.DateTime)
     current_status = db.Column(db.String(20), default='unknown')  # up, down, unknown
+    next_check_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # worker scheduling deadline
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # change feed for worker registries
     
     # Relationships
     checks = db.relationship('UptimeCheck', backref='website', lazy=True, cascade='all, delete-orphan')
     alerts = db.relationship('Alert', backref='website', lazy=True, cascade='all, delete-orphan')
+    rollups = db.relationship('UptimeRollup', backref='website', lazy=True, cascade='all, delete-orphan')
+
+@event.listens_for(Website, 'before_update')
+def touch_website(mapper, connection, target):
+    """Edits through the ORM bump updated_at; the worker's bulk status writes bypass this on purpose"""
+    target.updated_at = datetime.utcnow()
 
 class UptimeCheck(db.Model):
+    __table_args__ = (
+        db.Index('ix_uptime_check_website_timestamp', 'website_id', 'timestamp', 'id'),  # per-site windows and keyset pages
+        db.Index('ix_uptime_check_timestamp', 'timestamp'),  # retention cutoffs
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     website_id = db.Column(db.Integer, db.ForeignKey('website.id'), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
@@ -25,11 +42,34 @@ class UptimeCheck(db.Model):
     response_time = db.Column(db.Integer)  # milliseconds
     status_code = db.Column(db.Integer)
     error_message = db.Column(db.Text)
-    location = db.Column(db.String(50), default='US-East')
+    location = db.Column(db.String(50), default=HOME_LOCATION)
+    
+    # Phase breakdown in milliseconds; dns/connect/tls are NULL when a kept-alive connection was reused
+    dns_time = db.Column(db.Integer)
+    connect_time = db.Column(db.Integer)
+    tls_time = db.Column(db.Integer)
+    ttfb = db.Column(db.Integer)
+    bytes_received = db.Column(db.Integer)  # headers plus the (possibly capped) body as transferred
+
+class UptimeRollup(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('website_id', 'granularity', 'bucket_start', name='uq_uptime_rollup_bucket'),
+    )
 
-class Alert(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     website_id = db.Column(db.Integer, db.ForeignKey('website.id'), nullable=False)
+    granularity = db.Column(db.String(10), nullable=False)  # minute, hour, day
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    check_count = db.Column(db.Integer, nullable=False, default=0)
+    up_count = db.Column(db.Integer, nullable=False, default=0)
+    latency_sum = db.Column(db.BigInteger, nullable=False, default=0)  # milliseconds, up checks only
+    latency_min = db.Column(db.Integer)
+    latency_max = db.Column(db.Integer)
+    latency_sketch = db.Column(db.LargeBinary)  # encoded LatencySketch of up-check latencies; hour and day buckets
+
+class Alert(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    website_id = db.Column(db.Integer, db.ForeignKey('website.id'), nullable=False, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     alert_type = db.Column(db.String(20), nullable=False)  # email, sms, webhook
     is_enabled = db.Column(db.Boolean, default=True)
@@ -38,7 +78,7 @@ class Alert(db.Model):
 
 class Subscription(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     plan = db.Column(db.String(20), nullable=False)  # free, pro, business, enterprise
     status = db.Column(db.String(20), default='active')  # active, cancelled, expired
     started_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -53,3 +93,33 @@ class Subscription(db.Model):
     sms_alerts = db.Column(db.Boolean, default=False)
     api_access = db.Column(db.Boolean, default=False)
 
+class JobState(db.Model):
+    name = db.Column(db.String(50), primary_key=True)  # e.g. retention
+    last_started_at = db.Column(db.DateTime)
+    last_completed_at = db.Column(db.DateTime)
+    progress = db.Column(db.String(200))  # job-specific resume point
+
+class WorkerNode(db.Model):
+    id = db.Column(db.String(100), primary_key=True)  # worker id, e.g. hostname-pid
+    hostname = db.Column(db.String(100))
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    heartbeat_at = db.Column(db.DateTime, index=True)
+
+class ShardLease(db.Model):
+    shard = db.Column(db.Integer, primary_key=True)  # Website.id % number of shards
+    owner = db.Column(db.String(100), index=True)  # WorkerNode.id, NULL when free
+    expires_at = db.Column(db.DateTime)
+
+class ProbeAgent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    location = db.Column(db.String(50), nullable=False, index=True)  # stored on every check it reports
+    api_key = db.Column(db.String(64), unique=True, nullable=False)
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_seen_at = db.Column(db.DateTime)  # last assignment pull; agents not seen lately hand over their share
+
+    def __init__(self, **kwargs):
+        super(ProbeAgent, self).__init__(**kwargs)
+        if not self.api_key:
+            self.api_key = secrets.token_urlsafe(32)
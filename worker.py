@@ -6,21 +6,31 @@ Handles website monitoring checks and alert notifications
 
 import time
 import logging
-import requests
-import smtplib
-from datetime import datetime, timedelta
-from email.mime.text import MimeText
-from email.mime.multipart import MimeMultipart
+from datetime import datetime
 import os
 import sys
-from sqlalchemy import create_engine
+import argparse
+import signal
+import socket
+import subprocess
+from contextlib import nullcontext
 from sqlalchemy.orm import sessionmaker
 
-# Add the src directory to the path
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Add the project root to the path so the src package resolves like it does for main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from models.user import User
-from models.website import Website, MonitoringCheck
+from src import database
+from src.models.user import User
+from src.models.website import Alert, Subscription
+from src.api_auth import FREE_PLAN_LIMITS
+from src.probe import ProbeEngine, ProbeRateLimiter, probe_url, pool_stats, dns_stats, PROBE_CONCURRENCY
+from src.scheduler import CheckScheduler, SchedulingLag, next_check_time, EPOCH
+from src.check_writer import CheckWriter
+from src.registry import WebsiteRegistry
+from src.retention import RetentionEngine
+from src.fleet import ShardCoordinator
+from src.alerts import AlertDispatcher, SMTPPool
+from src import metrics
 
 # Configure logging
 logging.basicConfig(
@@ -34,13 +44,14 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+WORKER_DB_POOL_SIZE = int(os.getenv('WORKER_DB_POOL_SIZE', 4))
+
 class UptimeWorker:
-    def __init__(self):
-        # Database setup
-        database_url = os.getenv('DATABASE_URL', 'sqlite:///uptimepro.db')
-        self.engine = create_engine(database_url)
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+    def __init__(self, worker_id=None, database_url=None):
+        # Database setup: same database and engine settings as the API; the loop and retention thread need few connections
+        self.engine = database.create_engine(database_url, pool_size=WORKER_DB_POOL_SIZE, max_overflow=2)
+        self.Session = sessionmaker(bind=self.engine)
+        self.session = self.Session()
         
         # Email configuration
         self.smtp_server = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
@@ -48,211 +59,227 @@ class UptimeWorker:
         self.smtp_username = os.getenv('MAIL_USERNAME')
         self.smtp_password = os.getenv('MAIL_PASSWORD')
         
-        logger.info("UptimeWorker initialized")
+        # Alerts are delivered on their own threads so probing never waits on SMTP or webhooks
+        self.alerts = AlertDispatcher(SMTPPool(
+            self.smtp_server, self.smtp_port, self.smtp_username, self.smtp_password
+        ))
+        
+        # Probe engine; launches are capped globally and per destination host
+        self.probe_engine = ProbeEngine(
+            concurrency=int(os.getenv('WORKER_CONCURRENCY', PROBE_CONCURRENCY)),
+            limiter=ProbeRateLimiter()
+        )
+        self.last_cycle_stats = None
+        self.scheduling_lag = SchedulingLag()
+        
+        # Batched writes of check results, flushed from the worker loop
+        self.check_writer = CheckWriter(session_scope=lambda: nullcontext(self.session))
+        
+        # Shard leases decide which websites this worker owns
+        self.coordinator = ShardCoordinator(self.session, worker_id=worker_id or os.getenv('WORKER_ID'))
+        
+        # Owned websites as compact entries, refreshed from the Website.updated_at change feed
+        self.registry = WebsiteRegistry(self.session, website_filter=self.coordinator.website_filter)
+        
+        # Deadline scheduler over the registry's next_check_at deadlines
+        self.scheduler = CheckScheduler(self.session, website_filter=self.coordinator.website_filter,
+                                        source=self.registry.due_within)
+        
+        # Chunked purge of expired history on its own thread and session; the owner of shard 0 runs it
+        self.retention = RetentionEngine(self.Session, is_leader=lambda: self.coordinator.owns_shard(0))
+        
+        # Gauges read at scrape time
+        metrics.scheduler_queue_depth.set_function(lambda: len(self.scheduler))
+        metrics.alert_queue_depth.set_function(self.alerts.pending)
+        
+        logger.info(f"UptimeWorker {self.coordinator.worker_id} initialized "
+                    f"(concurrency={self.probe_engine.concurrency})")
 
     def check_website(self, website):
         """Check a single website's status"""
-        try:
-            logger.info(f"Checking website: {website.url}")
-            
-            start_time = time.time()
-            response = requests.get(
-                website.url,
-                timeout=30,
-                headers={'User-Agent': 'UptimePro Monitor/1.0'}
-            )
-            response_time = int((time.time() - start_time) * 1000)  # Convert to milliseconds
-            
-            # Determine status
-            if response.status_code == 200:
-                status = 'up'
-                status_message = 'OK'
-            else:
-                status = 'down'
-                status_message = f'HTTP {response.status_code}'
-                
-        except requests.exceptions.Timeout:
-            status = 'down'
-            status_message = 'Timeout'
-            response_time = 30000
-            
-        except requests.exceptions.ConnectionError:
-            status = 'down'
-            status_message = 'Connection Error'
-            response_time = 0
-            
-        except Exception as e:
-            status = 'down'
-            status_message = str(e)[:255]
-            response_time = 0
-            
-        # Create monitoring check record
-        check = MonitoringCheck(
-            website_id=website.id,
-            status=status,
-            response_time=response_time,
-            status_message=status_message,
-            checked_at=datetime.utcnow()
+        logger.info(f"Checking website: {website.url}")
+        return self.record_check(website, probe_url(website.url))
+
+    def record_check(self, website, result):
+        """Buffer a probe result for the batched writer and alert on an up -> down transition.
+
+        `website` is a registry entry (or anything with the same attributes);
+        its status and deadline are updated in place.
+        """
+        status = result['status']
+        status_message = result['status_message']
+        response_time = result['response_time']
+        now = datetime.utcnow()
+        next_check_at = next_check_time(website.id, website.check_interval, now)
+
+        # Compare against any status still waiting in the write buffer, not just the stored one
+        previous_status = self.check_writer.current_status(website.id, website.current_status)
+
+        self.check_writer.add(
+            website.id,
+            dict(result, error_message=status_message if status != 'up' else None),
+            checked_at=now,
+            next_check_at=next_check_at
         )
-        
-        self.session.add(check)
-        
-        # Update website current status
-        previous_status = website.current_status
+        self.scheduler.schedule(website.id, next_check_at)
         website.current_status = status
-        website.last_checked = datetime.utcnow()
-        
-        if status == 'up':
-            website.last_up = datetime.utcnow()
-        else:
-            website.last_down = datetime.utcnow()
-            
-        self.session.commit()
+        website.next_check_at = next_check_at
         
-        # Send alert if status changed from up to down
+        # Send alert if status changed from up to down; this does not wait for the flush
         if previous_status == 'up' and status == 'down':
             self.send_alert(website, status_message)
             
         logger.info(f"Website {website.url} status: {status} ({response_time}ms)")
-        return check
+        return status
 
     def send_alert(self, website, error_message):
-        """Send email alert for website downtime"""
+        """Queue down alerts for every enabled Alert endpoint of the website that the owner's plan allows"""
         try:
-            if not self.smtp_username or not self.smtp_password:
-                logger.warning("Email credentials not configured, skipping alert")
-                return
-                
-            user = self.session.query(User).filter_by(id=website.user_id).first()
-            if not user:
-                logger.error(f"User not found for website {website.id}")
-                return
-                
-            # Create email
-            msg = MimeMultipart()
-            msg['From'] = self.smtp_username
-            msg['To'] = user.email
-            msg['Subject'] = f"🚨 Website Down Alert: {website.name}"
+            targets = self.session.query(Alert.alert_type, Alert.endpoint).filter(
+                Alert.website_id == website.id,
+                Alert.is_enabled == True
+            ).all()
             
-            body = f"""
-            <html>
-            <body>
-                <h2>Website Down Alert</h2>
-                <p>Your website <strong>{website.name}</strong> is currently down.</p>
-                
-                <table border="1" cellpadding="10" cellspacing="0">
-                    <tr><td><strong>Website:</strong></td><td>{website.name}</td></tr>
-                    <tr><td><strong>URL:</strong></td><td><a href="{website.url}">{website.url}</a></td></tr>
-                    <tr><td><strong>Error:</strong></td><td>{error_message}</td></tr>
-                    <tr><td><strong>Time:</strong></td><td>{datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC</td></tr>
-                </table>
-                
-                <p>We'll continue monitoring and notify you when it's back online.</p>
-                
-                <p>Best regards,<br>UptimePro Team</p>
-            </body>
-            </html>
-            """
-            
-            msg.attach(MimeText(body, 'html'))
+            # Email and SMS follow the owner's plan flags; users without a subscription are on the free plan
+            plan = self.session.query(Subscription.email_alerts, Subscription.sms_alerts).filter_by(
+                user_id=website.user_id
+            ).first()
+            email_alerts, sms_alerts = plan if plan else (FREE_PLAN_LIMITS['email_alerts'], FREE_PLAN_LIMITS['sms_alerts'])
+            allowed = {'email': bool(email_alerts), 'sms': bool(sms_alerts)}
+            targets = [(alert_type, endpoint) for alert_type, endpoint in targets if allowed.get(alert_type, True)]
             
-            # Send email
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.smtp_username, self.smtp_password)
-            server.send_message(msg)
-            server.quit()
+            # Without configured alerts, email the account owner as before
+            if allowed['email'] and not any(alert_type == 'email' for alert_type, _ in targets):
+                email = self.session.query(User.email).filter_by(id=website.user_id).scalar()
+                if email:
+                    targets.append(('email', email))
+                else:
+                    logger.error(f"User not found for website {website.id}")
             
-            logger.info(f"Alert sent to {user.email} for website {website.name}")
+            snapshot = {'id': website.id, 'name': website.name, 'url': website.url, 'user_id': website.user_id}
+            occurred_at = datetime.utcnow()
+            for alert_type, endpoint in targets:
+                if endpoint:
+                    self.alerts.enqueue(alert_type, endpoint, snapshot, error_message, occurred_at)
             
         except Exception as e:
-            logger.error(f"Failed to send alert: {str(e)}")
+            logger.error(f"Failed to queue alert: {str(e)}")
 
-    def cleanup_old_checks(self):
-        """Remove old monitoring checks to keep database size manageable"""
+    def renew_leases(self, now=None):
+        """Heartbeat the shard leases if due; returns whether they can still be trusted"""
+        now = now or datetime.utcnow()
+        if self.coordinator.heartbeat_due(now):
+            # Deadlines must be persisted before a shard can move to another worker
+            self.check_writer.flush()
+            gained, lost = self.coordinator.heartbeat(now)
+            if gained or lost:
+                self.registry.reset()
+                self.scheduler.reset()
+        return self.coordinator.leases_valid(now)
+
+    def _renew_leases_during_batch(self):
+        """ProbeEngine tick: keep leases alive while a batch runs, abandon it once they lapse"""
         try:
-            # Keep checks for different periods based on plan
-            cutoff_dates = {
-                'free': datetime.utcnow() - timedelta(days=7),
-                'pro': datetime.utcnow() - timedelta(days=90),
-                'business': datetime.utcnow() - timedelta(days=365),
-                'enterprise': None  # Keep all data
-            }
-            
-            for plan, cutoff_date in cutoff_dates.items():
-                if cutoff_date is None:
-                    continue
-                    
-                # Get users with this plan
-                users = self.session.query(User).filter_by(subscription_plan=plan).all()
-                
-                for user in users:
-                    # Get user's websites
-                    websites = self.session.query(Website).filter_by(user_id=user.id).all()
-                    
-                    for website in websites:
-                        # Delete old checks
-                        old_checks = self.session.query(MonitoringCheck).filter(
-                            MonitoringCheck.website_id == website.id,
-                            MonitoringCheck.checked_at < cutoff_date
-                        )
-                        
-                        deleted_count = old_checks.count()
-                        old_checks.delete()
-                        
-                        if deleted_count > 0:
-                            logger.info(f"Deleted {deleted_count} old checks for website {website.name}")
-            
-            self.session.commit()
-            
+            if self.renew_leases():
+                return True
         except Exception as e:
-            logger.error(f"Failed to cleanup old checks: {str(e)}")
+            logger.error(f"Lease heartbeat during probe batch failed: {str(e)}")
             self.session.rollback()
+            if self.coordinator.leases_valid():
+                return True
+        logger.warning("Shard leases lapsed mid-batch; abandoning the probes still pending")
+        return False
 
     def run_monitoring_cycle(self):
-        """Run one complete monitoring cycle"""
+        """Probe every website whose next_check_at deadline has passed"""
         try:
-            # Get all active websites
-            websites = self.session.query(Website).filter_by(is_active=True).all()
+            self.check_writer.maybe_flush()
             
-            logger.info(f"Starting monitoring cycle for {len(websites)} websites")
+            now = datetime.utcnow()
+            if not self.renew_leases(now):
+                return  # lost contact with the DB long enough that our leases may have moved
             
-            for website in websites:
+            if self.scheduler.needs_refresh(now):
+                # Rows re-read from the change feed must already carry our buffered statuses and deadlines
+                self.check_writer.flush()
+                for entry in self.registry.refresh(now):
+                    self.scheduler.schedule(entry.id, entry.next_check_at)
+                self.scheduler.refresh(now)
+            
+            due_ids = self.scheduler.pop_due(now)
+            if not due_ids:
+                return
+            
+            # Websites deleted, paused or re-timed since they were queued drop out here
+            due = {}
+            deadlines = {}
+            for website_id in due_ids:
+                website = self.registry.get(website_id)
+                if website is None or not self.coordinator.owns(website.id, now):
+                    continue
+                if website.next_check_at > now:
+                    self.scheduler.schedule(website.id, website.next_check_at)
+                    continue
+                due[website.id] = website
+                deadlines[website.id] = website.next_check_at - EPOCH
+            
+            if not due:
+                return
+            
+            logger.info(f"Starting monitoring cycle for {len(due)} websites")
+            
+            # Probes run concurrently; results are recorded here as each one completes. Leases are
+            # renewed between results, and a shard handed over mid-batch is neither probed nor recorded
+            def on_result(website_id, result):
+                if not self.coordinator.owns(website_id):
+                    logger.warning(f"Dropping result for website {website_id}: its shard lease lapsed or moved")
+                    return
+                website = due[website_id]
+                lag = result['started_at'] - deadlines[website_id].total_seconds()
+                self.scheduling_lag.observe(lag)
+                metrics.scheduling_lag.observe(max(0.0, lag))
                 try:
-                    # Check if it's time to monitor this website
-                    if website.last_checked:
-                        time_since_check = datetime.utcnow() - website.last_checked
-                        if time_since_check.total_seconds() < website.check_interval:
-                            continue
-                    
-                    self.check_website(website)
-                    
-                    # Small delay between checks to avoid overwhelming servers
-                    time.sleep(1)
-                    
+                    self.record_check(website, result)
                 except Exception as e:
                     logger.error(f"Error checking website {website.url}: {str(e)}")
+            
+            targets = [(website.id, website.url) for website in due.values()]
+            _, self.last_cycle_stats = self.probe_engine.run(
+                targets, on_result,
+                on_tick=self._renew_leases_during_batch,
+                accept=self.coordinator.owns
+            )
+            self.check_writer.maybe_flush()
                     
-            logger.info("Monitoring cycle completed")
+            logger.info(f"Monitoring cycle completed: {self.last_cycle_stats}, pool {pool_stats()}, "
+                        f"dns {dns_stats()}, lag {self.scheduling_lag.stats()}, alerts {self.alerts.stats()}")
             
         except Exception as e:
             logger.error(f"Error in monitoring cycle: {str(e)}")
+            self.session.rollback()
 
-    def run(self):
-        """Main worker loop"""
+    def run(self, duration=None):
+        """Main worker loop; runs until interrupted, or for `duration` seconds (benchmarks)"""
         logger.info("Starting UptimePro worker...")
+        self.retention.start()
+        self.alerts.start()
+        stop_at = time.monotonic() + duration if duration else None
         
-        while True:
+        while stop_at is None or time.monotonic() < stop_at:
             try:
-                # Run monitoring cycle
+                # Run every check that is due
                 self.run_monitoring_cycle()
                 
-                # Cleanup old data (run once per hour)
-                if datetime.utcnow().minute == 0:
-                    self.cleanup_old_checks()
+                # Sleep until the next deadline, scheduler refresh, lease heartbeat or write flush
+                wait = min(self.scheduler.seconds_until_next(), self.coordinator.seconds_until_heartbeat())
+                if len(self.check_writer):
+                    wait = min(wait, self.check_writer.max_delay)
+                if stop_at is not None:
+                    wait = min(wait, max(0.0, stop_at - time.monotonic()))
                 
-                # Wait before next cycle (60 seconds)
-                time.sleep(60)
+                # Don't sleep inside a read transaction: it pins an old snapshot and holds back WAL checkpoints
+                self.session.commit()
+                time.sleep(wait)
                 
             except KeyboardInterrupt:
                 logger.info("Worker stopped by user")
@@ -261,8 +288,46 @@ class UptimeWorker:
             except Exception as e:
                 logger.error(f"Unexpected error in worker: {str(e)}")
                 time.sleep(60)  # Wait before retrying
+        
+        self.shutdown()
 
-if __name__ == '__main__':
-    worker = UptimeWorker()
-    worker.run()
+    def shutdown(self):
+        """Persist buffered checks and hand our shards back"""
+        self.retention.stop()
+        self.check_writer.flush()
+        self.coordinator.release_all()
+        self.alerts.stop()
+
+def spawn_workers(count, metrics_port=None):
+    """Run `count` worker processes against the same database until interrupted"""
+    processes = []
+    for n in range(count):
+        command = [sys.executable, os.path.abspath(__file__), '--worker-id', f'{socket.gethostname()}-w{n}']
+        if metrics_port:
+            command += ['--metrics-port', str(metrics_port + n)]  # one port per local worker
+        processes.append(subprocess.Popen(command))
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        for process in processes:
+            if process.poll() is None:
+                process.send_signal(signal.SIGINT)
+        for process in processes:
+            process.wait()
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='UptimePro background worker')
+    parser.add_argument('--worker-id', help='stable id for this worker in the fleet (default: hostname-pid)')
+    parser.add_argument('--spawn', type=int, metavar='N', help='launch N local workers sharing DATABASE_URL')
+    parser.add_argument('--metrics-port', type=int, default=int(os.getenv('WORKER_METRICS_PORT', 0)),
+                        help='serve Prometheus metrics on this port (0 disables)')
+    args = parser.parse_args()
+    
+    if args.spawn:
+        spawn_workers(args.spawn, args.metrics_port)
+    else:
+        worker = UptimeWorker(worker_id=args.worker_id)
+        if args.metrics_port:
+            metrics.start_http_server(args.metrics_port)
+        worker.run()